@@ -12,6 +12,21 @@ class Settings:
     # WebSocket Gateway
     WEBSOCKET_URL = os.getenv("WEBSOCKET_URL", "http://websocket-gateway:8000")
     
+    # Pools HTTP de larga vida (keep-alive) por upstream
+    TB_MAX_CONNECTIONS = int(os.getenv("TB_MAX_CONNECTIONS", "10"))
+    TB_HTTP2 = os.getenv("TB_HTTP2", "false").lower() == "true"
+    WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", "5"))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    
+    # Cola write-behind de telemetría
+    TELEMETRY_QUEUE_SIZE = int(os.getenv("TELEMETRY_QUEUE_SIZE", "1000"))
+    TELEMETRY_BATCH_SIZE = int(os.getenv("TELEMETRY_BATCH_SIZE", "100"))
+    TELEMETRY_MAX_AGE_MS = int(os.getenv("TELEMETRY_MAX_AGE_MS", "1000"))
+    TELEMETRY_MAX_BACKOFF = float(os.getenv("TELEMETRY_MAX_BACKOFF", "60"))
+    TELEMETRY_SPILL_DB = os.getenv("TELEMETRY_SPILL_DB", "")
+    TB_RATE_LIMIT = float(os.getenv("TB_RATE_LIMIT", "10"))
+    TB_RATE_BURST = float(os.getenv("TB_RATE_BURST", "20"))
+    
     # API
     HOST = os.getenv("HOST", "0.0.0.0")
     PORT = int(os.getenv("PORT", "8000"))
@@ -1,9 +1,12 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import logging
+from contextlib import asynccontextmanager
 from config import settings
 from services.thingsboard import ThingsBoardClient
 from services.websocket_client import WebSocketEmitter
+from services.http_pool import HTTPClientPool
+from services.telemetry_queue import TelemetryQueue
 from routers import amasado, fermentacion
 
 # Configurar logging
@@ -13,11 +16,36 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Un cliente HTTP de larga vida por upstream, abierto durante el lifespan
+http_pool = HTTPClientPool()
+http_pool.register(
+    "thingsboard",
+    timeout=10.0,
+    max_connections=settings.TB_MAX_CONNECTIONS,
+    keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    http2=settings.TB_HTTP2
+)
+http_pool.register(
+    "websocket",
+    timeout=5.0,
+    max_connections=settings.WS_MAX_CONNECTIONS,
+    keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await http_pool.start()
+    await telemetry_queue.start()
+    yield
+    await telemetry_queue.close()
+    await http_pool.close()
+
 # Crear app
 app = FastAPI(
     title="Ingestion API",
     description="API para recibir datos de Wokwi y enviar a ThingsBoard",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS
@@ -30,8 +58,18 @@ app.add_middleware(
 )
 
 # Clientes globales
-tb_client = ThingsBoardClient(settings.THINGSBOARD_URL)
-ws_emitter = WebSocketEmitter(settings.WEBSOCKET_URL)
+tb_client = ThingsBoardClient(settings.THINGSBOARD_URL, http_pool)
+ws_emitter = WebSocketEmitter(settings.WEBSOCKET_URL, http_pool)
+telemetry_queue = TelemetryQueue(
+    tb_client,
+    max_queue_per_token=settings.TELEMETRY_QUEUE_SIZE,
+    batch_size=settings.TELEMETRY_BATCH_SIZE,
+    max_age=settings.TELEMETRY_MAX_AGE_MS / 1000,
+    rate_limit=settings.TB_RATE_LIMIT,
+    rate_burst=settings.TB_RATE_BURST,
+    max_backoff=settings.TELEMETRY_MAX_BACKOFF,
+    spill_path=settings.TELEMETRY_SPILL_DB or None
+)
 
 # Registrar routers
 app.include_router(amasado.router)
@@ -49,6 +87,13 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.get("/stats")
+async def stats():
+    """
+    Métricas de conexiones por upstream y de la cola de telemetría.
+    """
+    return {"http": http_pool.stats(), "telemetry": telemetry_queue.stats()}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host=settings.HOST, port=settings.PORT)
\ No newline at end of file
@@ -20,21 +20,21 @@ async def receive_amasado(data: AmasadoData):
     """
     Recibe datos del proceso de amasado desde Wokwi.
     """
-    from main import tb_client, ws_emitter
+    from main import telemetry_queue, ws_emitter
     from config import settings
     
     logger.info(f"📥 Received amasado data: temp={data.temperature}°C")
     
-    # Enviar a ThingsBoard
-    success = await tb_client.send_telemetry(
+    # Encolar para ThingsBoard; el envío lo hace la cola en segundo plano
+    queued = telemetry_queue.enqueue(
         settings.TB_AMASADO_TOKEN,
         data.model_dump()
     )
     
-    if not success:
+    if not queued:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to send data to ThingsBoard"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Could not queue data for ThingsBoard"
         )
     
     # Emitir evento para el dashboard
@@ -42,6 +42,6 @@ async def receive_amasado(data: AmasadoData):
     
     return {
         "status": "success",
-        "message": "Data received and forwarded to ThingsBoard",
+        "message": "Data received and queued for ThingsBoard",
         "proceso": "amasado"
     }
@@ -22,21 +22,21 @@ async def receive_fermentacion(data: FermentacionData):
     """
     Recibe datos del proceso de fermentación desde Wokwi.
     """
-    from main import tb_client, ws_emitter
+    from main import telemetry_queue, ws_emitter
     from config import settings
     
     logger.info(f"📥 Received fermentacion data: temp={data.temperatura}°C, CO2={data.co2}")
     
-    # Enviar a ThingsBoard
-    success = await tb_client.send_telemetry(
+    # Encolar para ThingsBoard; el envío lo hace la cola en segundo plano
+    queued = telemetry_queue.enqueue(
         settings.TB_FERMENTACION_TOKEN,
         data.model_dump()
     )
     
-    if not success:
+    if not queued:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to send data to ThingsBoard"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Could not queue data for ThingsBoard"
         )
     
     # Emitir evento para el dashboard
@@ -44,6 +44,6 @@ async def receive_fermentacion(data: FermentacionData):
     
     return {
         "status": "success",
-        "message": "Data received and forwarded to ThingsBoard",
+        "message": "Data received and queued for ThingsBoard",
         "proceso": "fermentacion"
     }
@@ -0,0 +1,132 @@
+import httpx
+import logging
+import time
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionMetrics:
+    """
+    Contadores de reutilización de conexiones de un upstream.
+    """
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+        self.connect_seconds = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        reused = self.requests - self.connections_opened
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "tls_handshakes": self.tls_handshakes,
+            "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0,
+            "avg_connect_ms": round(self.connect_seconds / self.connections_opened * 1000, 2)
+            if self.connections_opened else 0.0
+        }
+
+
+class MeteredTransport(httpx.AsyncHTTPTransport):
+    """
+    Transporte httpx que cuenta peticiones, conexiones TCP nuevas y
+    handshakes TLS mediante el trace de httpcore.
+    """
+    def __init__(self, metrics: ConnectionMetrics, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.metrics.requests += 1
+        started: Dict[str, float] = {}
+
+        async def trace(event_name: str, info: Dict[str, Any]):
+            if event_name.endswith(".started"):
+                started[event_name[:-8]] = time.perf_counter()
+            elif event_name == "connection.connect_tcp.complete":
+                self.metrics.connections_opened += 1
+                self.metrics.connect_seconds += time.perf_counter() - started.get("connection.connect_tcp", time.perf_counter())
+            elif event_name == "connection.start_tls.complete":
+                self.metrics.tls_handshakes += 1
+                self.metrics.connect_seconds += time.perf_counter() - started.get("connection.start_tls", time.perf_counter())
+
+        request.extensions = {**request.extensions, "trace": trace}
+        return await super().handle_async_request(request)
+
+
+class HTTPClientPool:
+    """
+    Clientes httpx.AsyncClient de larga vida, uno por upstream.
+
+    Se registran al importar la app y se abren/cierran en el lifespan de
+    FastAPI, de modo que las conexiones keep-alive se reutilizan entre
+    peticiones en lugar de abrir un TCP (y TLS) nuevo por llamada.
+    """
+    def __init__(self):
+        self._config: Dict[str, Dict[str, Any]] = {}
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._metrics: Dict[str, ConnectionMetrics] = {}
+
+    def register(
+        self,
+        name: str,
+        timeout: float,
+        max_connections: int = 10,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False
+    ):
+        """
+        Declara un upstream.
+
+        Args:
+            name: Nombre del upstream (p. ej. "thingsboard")
+            timeout: Timeout por defecto de las peticiones
+            max_connections: Conexiones simultáneas máximas
+            max_keepalive_connections: Conexiones ociosas que se mantienen abiertas
+            keepalive_expiry: Segundos que una conexión ociosa sigue abierta
+            http2: Negociar HTTP/2 (requiere el paquete h2)
+        """
+        self._config[name] = {
+            "timeout": timeout,
+            "limits": httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections or max_connections,
+                keepalive_expiry=keepalive_expiry
+            ),
+            "http2": http2
+        }
+
+    async def start(self):
+        for name, config in self._config.items():
+            metrics = ConnectionMetrics()
+            transport = MeteredTransport(
+                metrics,
+                limits=config["limits"],
+                http2=config["http2"]
+            )
+            self._clients[name] = httpx.AsyncClient(
+                timeout=httpx.Timeout(config["timeout"]),
+                transport=transport
+            )
+            self._metrics[name] = metrics
+            logger.info(
+                f"✅ HTTP pool '{name}' ready "
+                f"(max_connections={config['limits'].max_connections}, http2={config['http2']})"
+            )
+
+    async def close(self):
+        for name, client in self._clients.items():
+            await client.aclose()
+            logger.info(f"HTTP pool '{name}' closed")
+        self._clients.clear()
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None:
+            raise RuntimeError(f"HTTP pool '{name}' not started")
+        return client
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: metrics.as_dict() for name, metrics in self._metrics.items()}
@@ -1,13 +1,24 @@
 import httpx
 import logging
 from typing import Dict, Any
+from services.http_pool import HTTPClientPool
 
 logger = logging.getLogger(__name__)
 
 class ThingsBoardClient:
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, http_pool: HTTPClientPool):
         self.base_url = base_url.rstrip('/')
-        self.timeout = httpx.Timeout(10.0)
+        self.http_pool = http_pool
+    
+    async def post_telemetry(self, access_token: str, payload: Any):
+        """
+        Envía telemetría (un objeto o un array de {ts, values}) y propaga
+        los errores HTTP para que el llamador decida si reintentar.
+        """
+        url = f"{self.base_url}/api/v1/{access_token}/telemetry"
+        client = self.http_pool.get("thingsboard")
+        response = await client.post(url, json=payload)
+        response.raise_for_status()
     
     async def send_telemetry(self, access_token: str, data: Dict[str, Any]) -> bool:
         """
@@ -23,12 +34,12 @@ class ThingsBoardClient:
         url = f"{self.base_url}/api/v1/{access_token}/telemetry"
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(url, json=data)
-                response.raise_for_status()
-                
-                logger.info(f"✅ Data sent to ThingsBoard: {data.get('proceso', 'unknown')}")
-                return True
+            client = self.http_pool.get("thingsboard")
+            response = await client.post(url, json=data)
+            response.raise_for_status()
+            
+            logger.info(f"✅ Data sent to ThingsBoard: {data.get('proceso', 'unknown')}")
+            return True
                 
         except httpx.HTTPStatusError as e:
             logger.error(f"❌ HTTP error sending to ThingsBoard: {e.response.status_code}")
@@ -1,26 +1,27 @@
-import httpx
 import logging
 from typing import Dict, Any
+from services.http_pool import HTTPClientPool
 
 logger = logging.getLogger(__name__)
 
 class WebSocketEmitter:
-    def __init__(self, websocket_url: str):
+    def __init__(self, websocket_url: str, http_pool: HTTPClientPool):
         self.websocket_url = websocket_url.rstrip('/')
+        self.http_pool = http_pool
     
     async def emit_event(self, event_type: str, data: Dict[str, Any]):
         """
         Emite un evento al WebSocket Gateway para enviar al dashboard.
         """
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                await client.post(
-                    f"{self.websocket_url}/emit",
-                    json={
-                        "event_type": event_type,
-                        "data": data
-                    }
-                )
-                logger.debug(f"Event emitted: {event_type}")
+            client = self.http_pool.get("websocket")
+            await client.post(
+                f"{self.websocket_url}/emit",
+                json={
+                    "event_type": event_type,
+                    "data": data
+                }
+            )
+            logger.debug(f"Event emitted: {event_type}")
         except Exception as e:
             logger.warning(f"Could not emit event to WebSocket: {e}")
@@ -0,0 +1,59 @@
+"""
+Compara los motores de inferencia "keras" y "numpy" del modelo de color.
+
+Para cada tamaño de lote verifica que las salidas coinciden dentro de la
+tolerancia y mide la latencia media de predict().
+
+Uso:
+    python benchmark_engines.py --model /models/modelo_color.h5
+"""
+import argparse
+import time
+
+import numpy as np
+
+from predictor import load_engine
+
+
+def time_predict(model, X: np.ndarray, repeats: int) -> float:
+    # Calentamiento (Keras compila la función de predicción en la primera llamada)
+    model.predict(X, verbose=0)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        model.predict(X, verbose=0)
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Keras vs NumPy (modelo de color)")
+    parser.add_argument("--model", default="/models/modelo_color.h5")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32, 1024])
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--atol", type=float, default=1e-5)
+    args = parser.parse_args()
+
+    numpy_model = load_engine(args.model, "numpy")
+    keras_model = load_engine(args.model, "keras")
+
+    rng = np.random.default_rng(0)
+    print(f"{'batch':>6} {'keras ms':>10} {'numpy ms':>10} {'speedup':>8} {'max |diff|':>12}")
+
+    for batch_size in args.batch_sizes:
+        # Las features son medias de color en [0, 255]
+        X = rng.uniform(0, 255, size=(batch_size, numpy_model.input_dim)).astype(np.float32)
+
+        diff = np.abs(keras_model.predict(X, verbose=0) - numpy_model.predict(X)).max()
+        if diff > args.atol:
+            raise SystemExit(f"Outputs differ at batch={batch_size}: max |diff| = {diff:.2e}")
+
+        keras_t = time_predict(keras_model, X, args.repeats)
+        numpy_t = time_predict(numpy_model, X, args.repeats)
+        print(
+            f"{batch_size:>6} {keras_t * 1000:>10.3f} {numpy_t * 1000:>10.3f} "
+            f"{keras_t / numpy_t:>7.1f}x {diff:>12.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import logging
+import struct
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# "reduced": decodifica a la menor escala que cumple la resolución del modelo
+# "full": decodifica siempre a resolución completa (para comparar precisión)
+DECODE_MODES = ("reduced", "full")
+
+# Factores de reducción de libjpeg (escalado en el dominio DCT)
+REDUCED_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+}
+
+# Marcadores SOF que llevan las dimensiones (excluye DHT, JPG y DAC)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def read_image_size(image_path: str) -> Optional[Tuple[int, int]]:
+    """
+    Lee ancho y alto de la cabecera JPEG o PNG sin decodificar la imagen.
+
+    Returns:
+        (width, height) o None si el formato no se reconoce
+    """
+    try:
+        with open(image_path, "rb") as f:
+            head = f.read(24)
+
+            if head[:8] == b"\x89PNG\r\n\x1a\n":
+                width, height = struct.unpack(">II", head[16:24])
+                return width, height
+
+            if head[:2] != b"\xff\xd8":
+                return None
+
+            # Recorrer los segmentos JPEG hasta el SOF
+            f.seek(2)
+            while True:
+                byte = f.read(1)
+                if not byte:
+                    return None
+                if byte != b"\xff":
+                    continue
+
+                marker = f.read(1)
+                while marker == b"\xff":
+                    marker = f.read(1)
+                if not marker:
+                    return None
+
+                code = marker[0]
+                # Marcadores sin longitud
+                if code == 0xD8 or 0xD0 <= code <= 0xD7 or code == 0x01:
+                    continue
+
+                length = struct.unpack(">H", f.read(2))[0]
+                if code in _SOF_MARKERS:
+                    height, width = struct.unpack(">xHH", f.read(5))
+                    return width, height
+                f.seek(length - 2, 1)
+
+    except (OSError, struct.error) as e:
+        logger.debug(f"Could not read image header {image_path}: {e}")
+        return None
+
+
+def pick_scale(width: int, height: int, min_side: int) -> int:
+    """
+    Elige el mayor factor de reducción que deja el lado corto en al menos
+    min_side píxeles.
+
+    Se usa el lado corto porque la orientación EXIF puede intercambiar
+    ancho y alto al decodificar.
+    """
+    short_side = min(width, height)
+    for scale in sorted(REDUCED_FLAGS, reverse=True):
+        if short_side // scale >= min_side:
+            return scale
+    return 1
+
+
+def imread_for_target(image_path: str, min_side: int, mode: str = "reduced") -> Optional[np.ndarray]:
+    """
+    Decodifica la imagen (BGR) a la menor resolución que sigue cumpliendo
+    el tamaño que necesita el modelo.
+
+    Args:
+        image_path: Ruta a la imagen
+        min_side: Lado corto mínimo que debe conservar la imagen decodificada
+        mode: "reduced" o "full"
+
+    Returns:
+        Imagen BGR o None si no se puede leer (igual que cv2.imread)
+    """
+    if mode == "full":
+        return cv2.imread(image_path)
+
+    size = read_image_size(image_path)
+    if size is None:
+        return cv2.imread(image_path)
+
+    scale = pick_scale(size[0], size[1], min_side)
+    if scale == 1:
+        return cv2.imread(image_path)
+    return cv2.imread(image_path, REDUCED_FLAGS[scale])
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from deadline import DeadlineExceeded, expired
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """
+    Se lanza cuando el servicio ya tiene el máximo de imágenes en curso.
+    """
+
+
+class InferenceExecutor:
+    """
+    Ejecuta la lectura, el preprocesado y la inferencia en un pool de hilos
+    acotado para no bloquear el event loop de uvicorn.
+
+    El control de admisión limita las imágenes en curso (en cola o en
+    ejecución); por encima de max_pending las peticiones se rechazan en vez
+    de acumularse.
+    """
+
+    def __init__(self, max_workers: int = 1, max_pending: int = 64):
+        """
+        Args:
+            max_workers: Hilos dedicados a inferencia
+            max_pending: Máximo de imágenes admitidas a la vez
+        """
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(1, max_pending)
+        self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="inference")
+
+        # Métricas
+        self.pending = 0
+        self.rejected = 0
+        self.completed = 0
+        self.expired = 0
+
+    @contextmanager
+    def admit(self, count: int = 1):
+        """
+        Reserva capacidad para count imágenes durante el bloque.
+
+        Raises:
+            Overloaded: si la capacidad está agotada
+        """
+        # Un lote mayor que el límite se admite cuando el servicio está libre
+        count = min(count, self.max_pending)
+        if self.pending + count > self.max_pending:
+            self.rejected += 1
+            raise Overloaded(
+                f"Too many images in flight ({self.pending}/{self.max_pending})"
+            )
+
+        self.pending += count
+        try:
+            yield
+        finally:
+            self.pending -= count
+
+    async def run(self, fn: Callable, *args, deadline: Optional[float] = None) -> Any:
+        """
+        Ejecuta fn(*args) en el pool de inferencia.
+
+        Si el deadline vence mientras espera un hilo libre, el trabajo se
+        descarta sin ejecutarse.
+
+        Raises:
+            DeadlineExceeded: si el deadline venció antes de empezar
+        """
+        def call():
+            if expired(deadline):
+                raise DeadlineExceeded("Deadline passed while waiting for an inference thread")
+            return fn(*args)
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._pool, call)
+        except DeadlineExceeded:
+            self.expired += 1
+            raise
+        finally:
+            self.completed += 1
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        logger.info("Inference executor stopped")
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.max_workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "expired": self.expired,
+        }
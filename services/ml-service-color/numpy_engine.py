@@ -0,0 +1,126 @@
+import json
+import logging
+from typing import List, Tuple
+
+import h5py
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _relu(x: np.ndarray) -> np.ndarray:
+    return np.maximum(x, 0, out=x)
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    # Forma estable: no desborda exp() con logits grandes
+    return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+
+def _softmax(x: np.ndarray) -> np.ndarray:
+    e = np.exp(x - x.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": _relu,
+    "sigmoid": _sigmoid,
+    "tanh": np.tanh,
+    "softmax": _softmax,
+}
+
+
+class NumpyMLP:
+    """
+    Ejecuta un modelo Keras Sequential de capas Dense con NumPy.
+
+    Lee la arquitectura y los pesos del .h5 una sola vez y hace el forward
+    pass como multiplicaciones de matrices, sin importar TensorFlow. Expone
+    predict(X, verbose=0) con la misma forma de salida que Keras.
+    """
+
+    def __init__(self, model_path: str):
+        """
+        Args:
+            model_path: Ruta al archivo .h5 guardado con model.save()
+        """
+        self.layers: List[Tuple[np.ndarray, np.ndarray, str]] = []
+
+        with h5py.File(model_path, "r") as f:
+            config = f.attrs["model_config"]
+            if isinstance(config, bytes):
+                config = config.decode("utf-8")
+            config = json.loads(config)
+
+            if config["class_name"] != "Sequential":
+                raise ValueError(f"Unsupported model class: {config['class_name']}")
+
+            weights = f["model_weights"]
+            for layer in config["config"]["layers"]:
+                class_name = layer["class_name"]
+                layer_config = layer["config"]
+
+                # Sin efecto en inferencia
+                if class_name in ("InputLayer", "Dropout"):
+                    continue
+                if class_name != "Dense":
+                    raise ValueError(f"Unsupported layer for NumPy engine: {class_name}")
+
+                activation = layer_config.get("activation", "linear")
+                if activation not in ACTIVATIONS:
+                    raise ValueError(f"Unsupported activation: {activation}")
+
+                kernel, bias = self._read_dense(weights[layer_config["name"]])
+                if not layer_config.get("use_bias", True):
+                    bias = np.zeros(kernel.shape[1], dtype=np.float32)
+                self.layers.append((kernel, bias, activation))
+
+        if not self.layers:
+            raise ValueError(f"No Dense layers found in {model_path}")
+
+        self.input_dim = self.layers[0][0].shape[0]
+        logger.info(
+            f"✅ NumPy engine loaded: "
+            f"{' -> '.join(str(k.shape[0]) for k, _, _ in self.layers)} -> {self.layers[-1][0].shape[1]}"
+        )
+
+    @staticmethod
+    def _read_dense(group: h5py.Group) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca kernel y bias dentro del grupo de la capa. Keras 2 los guarda
+        como "kernel:0"/"bias:0" y Keras 3 como "kernel"/"bias", anidados
+        bajo el nombre del modelo.
+        """
+        found = {}
+
+        def visit(name, obj):
+            if isinstance(obj, h5py.Dataset):
+                key = name.rsplit("/", 1)[-1].split(":")[0]
+                found[key] = np.asarray(obj, dtype=np.float32)
+
+        group.visititems(visit)
+
+        if "kernel" not in found:
+            raise ValueError(f"Kernel not found in layer group {group.name}")
+        bias = found.get("bias", np.zeros(found["kernel"].shape[1], dtype=np.float32))
+        return found["kernel"], bias
+
+    def predict(self, X: np.ndarray, verbose: int = 0) -> np.ndarray:
+        """
+        Forward pass para una fila o un lote.
+
+        Args:
+            X: Array (N, input_dim) o (input_dim,)
+
+        Returns:
+            Array (N, salidas) en float32, igual que model.predict
+        """
+        out = np.asarray(X, dtype=np.float32)
+        if out.ndim == 1:
+            out = out.reshape(1, -1)
+
+        for kernel, bias, activation in self.layers:
+            out = ACTIVATIONS[activation](out @ kernel + bias)
+
+        return out
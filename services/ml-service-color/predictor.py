@@ -1,90 +1,121 @@
-import cv2
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.models import load_model
-from tensorflow.keras.layers import Layer
 import logging
-from typing import Dict, Tuple
+from typing import Dict, List, Optional
 import os
 
+from decoder import DECODE_MODES, imread_for_target
+from tensor_cache import TensorCache
+
 logger = logging.getLogger(__name__)
 
 
+ENGINES = ("keras", "numpy")
+
+
+def load_engine(model_path: str, engine: str):
+    """
+    Carga el modelo con el motor indicado. Ambos exponen predict(X, verbose=0).
+
+    TensorFlow solo se importa con el motor "keras".
+    """
+    if engine == "numpy":
+        from numpy_engine import NumpyMLP
+        return NumpyMLP(model_path)
+
+    from tensorflow.keras.models import load_model
+    return load_model(model_path)
+
+
 class ColorPredictor:
-    def __init__(self, model_path: str):
+    def __init__(
+        self,
+        model_path: str,
+        engine: str = "keras",
+        decode_mode: str = "reduced",
+        decode_min_side: int = 48,
+        tensor_cache: Optional[TensorCache] = None
+    ):
         """
         Inicializa el predictor de color de pan.
 
         Args:
             model_path: Ruta al archivo modelo_pan.h5
+            engine: "keras" (TensorFlow) o "numpy" (forward pass sin TensorFlow)
+            decode_mode: "reduced" (decodificación JPEG reducida) o "full"
+            decode_min_side: Lado corto mínimo de la imagen decodificada; las
+                medias de 3x3 bloques apenas cambian por encima de unos
+                pocos píxeles por bloque
+            tensor_cache: Caché de medias por bloque ya calculadas (opcional)
         """
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"Model not found: {model_path}")
 
-        logger.info(f"Loading model from {model_path}")
-        self.model = load_model(model_path)
-        logger.info("✅ Model loaded successfully")
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine} (expected one of {ENGINES})")
 
-    def dividir_en_9(self, img: np.ndarray) -> list:
-        """
-        Divide la imagen en 9 partes (grid 3x3).
-        """
-        h, w, _ = img.shape
-        h_step = h // 3
-        w_step = w // 3
+        if decode_mode not in DECODE_MODES:
+            raise ValueError(f"Unknown decode mode: {decode_mode} (expected one of {DECODE_MODES})")
 
-        partes = []
-        for i in range(3):
-            for j in range(3):
-                crop = img[i * h_step : (i + 1) * h_step, j * w_step : (j + 1) * w_step]
-                partes.append(crop)
-        return partes
+        self.engine = engine
+        self.decode_mode = decode_mode
+        self.decode_min_side = decode_min_side
+        self.tensor_cache = tensor_cache
+        logger.info(f"Loading model from {model_path} (engine={engine})")
+        self.model = load_engine(model_path, engine)
+        logger.info("✅ Model loaded successfully")
 
-    def color_promedio(self, img: np.ndarray) -> np.ndarray:
-        """
-        Calcula el color promedio de una imagen.
-        Retorna BGR invertido a RGB.
+    def block_means(self, img: np.ndarray) -> np.ndarray:
         """
-        avg = img.mean(axis=(0, 1))
-        return avg[::-1]  # BGR -> RGB
+        Calcula el color promedio de los 9 bloques (grid 3x3) en una sola
+        pasada sobre la imagen.
 
-    def extract_features(self, img: np.ndarray) -> np.ndarray:
-        """
-        Extrae características de color de la imagen.
-        Divide en 9 partes y calcula color promedio de cada una.
+        Como en el recorte original, los píxeles sobrantes de h % 3 y w % 3
+        quedan fuera. Acepta una imagen (H, W, 3) o un lote (N, H, W, 3).
 
         Returns:
-            Array de 27 features (9 partes x 3 canales RGB)
+            Array (9, 3) o (N, 9, 3) con las medias en el orden de canales
+            de la imagen de entrada
         """
-        h, w, _ = img.shape
+        *lead, h, w, c = img.shape
         h_step = h // 3
         w_step = w // 3
 
-        features = []
+        # Sumar primero las filas de cada franja (vista sin copia) y luego
+        # las columnas de cada bloque
+        rows = img[..., : 3 * h_step, :, :].reshape(*lead, 3, h_step, w, c)
+        rows = rows.sum(axis=-3, dtype=np.float64)
+        blocks = rows[..., : 3 * w_step, :].reshape(*lead, 3, 3, w_step, c).sum(axis=-2)
+
+        return (blocks / (h_step * w_step)).reshape(*lead, 9, c)
+
+    def extract_features(self, means: np.ndarray) -> np.ndarray:
+        """
+        Construye la entrada del modelo a partir de las medias por bloque.
 
-        for i in range(3):
-            for j in range(3):
-                crop = img[i * h_step : (i + 1) * h_step, j * w_step : (j + 1) * w_step]
-                avg = crop.mean(axis=(0, 1))
-                avg = avg[::-1]  # BGR -> RGB
-                features.extend(avg.tolist())
+        El modelo espera los 9 bloques con los canales en orden BGR, tal como
+        salen de cv2.imread.
 
-        return np.array(features).reshape(1, -1)
+        Args:
+            means: Medias BGR (9, 3) o lote (N, 9, 3)
+
+        Returns:
+            Array (N, 27) de features (9 partes x 3 canales)
+        """
+        return means.reshape(-1, 27)
 
-    def extract_color_analysis(self, img: np.ndarray, estado: int) -> Dict:
+    def extract_color_analysis(self, means: np.ndarray, estado: int) -> Dict:
         """
         Extrae análisis detallado de colores de la imagen.
 
         Args:
-            img: Imagen en formato RGB
+            means: Medias BGR de los 9 bloques (9, 3)
             estado: 0 = Normal, 1 = Malo (quemado)
 
         Returns:
             Diccionario con análisis de colores
         """
-        partes = self.dividir_en_9(img)
-        colores = [self.color_promedio(p) for p in partes]
-        colores_arr = np.array(colores)
+        # BGR -> RGB
+        colores_arr = means[:, ::-1]
 
         # Calcular intensidades
         intensidades = colores_arr.mean(axis=1)
@@ -116,6 +147,62 @@ class ColorPredictor:
             "intensidad_promedio": float(intensidades.mean()),
         }
 
+    def preprocess(self, image_path: str) -> np.ndarray:
+        """
+        Lee la imagen y calcula las medias BGR de sus 9 bloques.
+
+        Es la única pasada sobre la imagen completa: de este resultado salen
+        tanto la entrada del modelo como el análisis de colores.
+
+        Returns:
+            Array (9, 3)
+        """
+        img = imread_for_target(image_path, self.decode_min_side, self.decode_mode)
+        if img is None:
+            raise ValueError(f"Could not read image: {image_path}")
+
+        return self.block_means(img)
+
+    def load_input(self, image_path: str) -> np.ndarray:
+        """
+        Devuelve la entrada del modelo para la imagen, desde la caché de
+        tensores si el archivo no cambió desde la última vez.
+        """
+        key = None
+        if self.tensor_cache is not None and self.tensor_cache.enabled:
+            key = self.tensor_cache.key_for(image_path, self.decode_mode)
+            if key is not None:
+                found, value = self.tensor_cache.get(key)
+                if found:
+                    return value
+
+        value = self.preprocess(image_path)
+        if key is not None:
+            self.tensor_cache.put(key, value)
+        return value
+
+    def build_result(self, image_path: str, prob: float, means: np.ndarray) -> Dict:
+        """
+        Construye la respuesta a partir de la probabilidad del modelo.
+        """
+        clase = int(prob > 0.9)
+
+        # Análisis de colores
+        color_analysis = self.extract_color_analysis(means, clase)
+
+        logger.info(
+            f"Prediction for {os.path.basename(image_path)}: "
+            f"clase={clase}, prob={prob:.4f}"
+        )
+
+        return {
+            "image": os.path.basename(image_path),
+            "prediction": float(clase),
+            "probability": float(prob),
+            "estado": "Quemado" if clase == 1 else "Normal",
+            **color_analysis,
+        }
+
     def predict(self, image_path: str) -> Dict:
         """Predice si el pan está quemado o normal.
 
@@ -125,37 +212,53 @@ class ColorPredictor:
         """
 
         try:
-            # Leer imagen
-            img = cv2.imread(image_path)
-            if img is None:
-                raise ValueError(f"Could not read image: {image_path}")
-
-            # Convertir BGR a RGB
-            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            means = self.load_input(image_path)
 
             # Extraer features
-            X = self.extract_features(img_rgb)
+            X = self.extract_features(means)
 
             # Predecir
             prob = self.model.predict(X, verbose=0)[0][0]
-            clase = int(prob > 0.9)
-
-            # Análisis de colores
-            color_analysis = self.extract_color_analysis(img_rgb, clase)
-
-            logger.info(
-                f"Prediction for {os.path.basename(image_path)}: "
-                f"clase={clase}, prob={prob:.4f}"
-            )
 
-            return {
-                "image": os.path.basename(image_path),
-                "prediction": float(clase),
-                "probability": float(prob),
-                "estado": "Quemado" if clase == 1 else "Normal",
-                **color_analysis,
-            }
+            return self.build_result(image_path, prob, means)
 
         except Exception as e:
             logger.error(f"Error predicting {image_path}: {e}")
             raise
+
+    def predict_batch(self, image_paths: List[str]) -> List[Dict]:
+        """
+        Predice un lote de imágenes con una sola llamada a model.predict.
+
+        Las imágenes que no se pueden leer no detienen el lote: su entrada
+        lleva la clave "error" en lugar de la predicción.
+
+        Args:
+            image_paths: Lista de rutas a las imágenes
+
+        Returns:
+            Lista de resultados en el mismo orden que image_paths
+        """
+        results: List[Dict] = [None] * len(image_paths)
+        indices, means = [], []
+
+        for i, image_path in enumerate(image_paths):
+            try:
+                means.append(self.load_input(image_path))
+                indices.append(i)
+            except Exception as e:
+                logger.error(f"Error preprocessing {image_path}: {e}")
+                results[i] = {"image": os.path.basename(image_path), "error": str(e)}
+
+        if not indices:
+            return results
+
+        # Una sola inferencia para todo el lote: (N, 9, 3) -> (N, 27)
+        means = np.stack(means)
+        probs = self.model.predict(self.extract_features(means), verbose=0)[:, 0]
+
+        for i, block, prob in zip(indices, means, probs):
+            results[i] = self.build_result(image_paths[i], prob, block)
+
+        logger.info(f"Batch prediction: {len(indices)}/{len(image_paths)} images")
+        return results
@@ -1,13 +1,21 @@
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, Header, HTTPException, status
 from pydantic import BaseModel, Field
+from typing import List, Optional, Tuple
 import logging
 import os
+from contextlib import asynccontextmanager
 import sys
 
 # Agregar directorio actual al path
 sys.path.insert(0, os.path.dirname(__file__))
 
 from predictor import SizePredictor
+from batcher import MicroBatcher
+from executor import InferenceExecutor, Overloaded
+from deadline import DEADLINE_EXCEEDED_HEADER, DEADLINE_HEADER, DeadlineExceeded, expired, parse_deadline
+from tensor_cache import TensorCache
+from result_cache import ResultCache
+from manifest import ManifestError, ManifestStore
 
 # Configurar logging
 logging.basicConfig(
@@ -20,21 +28,80 @@ logger = logging.getLogger(__name__)
 MODEL_PATH = os.getenv("MODEL_PATH", "/models/modelo_size.h5")
 CONFIG_PATH = os.getenv("CONFIG_PATH", "/models/config.json")
 SCALER_PATH = os.getenv("SCALER_PATH", "/models/output_scaler.pkl")
+# "reduced" o "full" (decodificación a resolución completa)
+DECODE_MODE = os.getenv("DECODE_MODE", "reduced")
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "256"))
+# Micro-batching de /predict
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+# Pool de inferencia fuera del event loop
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+MAX_PENDING_IMAGES = int(os.getenv("MAX_PENDING_IMAGES", "64"))
+# Caché de tensores preprocesados (0 = desactivada)
+TENSOR_CACHE_MB = int(os.getenv("TENSOR_CACHE_MB", "256"))
+# Caché de resultados por contenido (0 = desactivada) y su archivo SQLite opcional
+RESULT_CACHE_ENTRIES = int(os.getenv("RESULT_CACHE_ENTRIES", "10000"))
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB", "")
+# Versiones del índice publicadas por el scheduler ("" = sin manifiestos)
+MANIFEST_DIR = os.getenv("MANIFEST_DIR", "")
+MANIFEST_CACHE_VERSIONS = int(os.getenv("MANIFEST_CACHE_VERSIONS", "4"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if batcher is not None:
+        await batcher.start()
+    yield
+    if batcher is not None:
+        await batcher.stop()
+    executor.shutdown()
+    if result_cache is not None:
+        result_cache.close()
 
 # Crear app
 app = FastAPI(
     title="ML Service - Size",
     description="Servicio de predicción de tamaño de pan",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Caché de entradas ya preprocesadas, por (ruta, mtime, tamaño)
+tensor_cache = TensorCache(TENSOR_CACHE_MB * 1024 * 1024)
+
 # Cargar modelo al inicio
 try:
-    predictor = SizePredictor(MODEL_PATH, CONFIG_PATH, SCALER_PATH)
+    predictor = SizePredictor(MODEL_PATH, CONFIG_PATH, SCALER_PATH, DECODE_MODE, tensor_cache)
 except Exception as e:
     logger.error(f"Failed to load model: {e}")
     predictor = None
 
+# Resultados por hash del contenido + versión del modelo: una imagen repetida
+# cuesta un hash en lugar de una inferencia
+result_cache = ResultCache(
+    [MODEL_PATH, CONFIG_PATH, SCALER_PATH],
+    f"decode={DECODE_MODE}",
+    RESULT_CACHE_ENTRIES,
+    RESULT_CACHE_DB or None
+) if predictor and RESULT_CACHE_ENTRIES > 0 else None
+
+if predictor is None:
+    predict_paths = None
+elif result_cache is not None:
+    predict_paths = result_cache.wrap(predictor.predict_batch)
+else:
+    predict_paths = predictor.predict_batch
+
+# Resuelve los manifiestos de /predict-batch a rutas locales
+manifest_store = ManifestStore(MANIFEST_DIR, MANIFEST_CACHE_VERSIONS) if MANIFEST_DIR else None
+
+# Lectura, preprocesado e inferencia corren en este pool, no en el event loop
+executor = InferenceExecutor(INFERENCE_WORKERS, MAX_PENDING_IMAGES)
+
+# Agrupa las llamadas concurrentes a /predict en una sola inferencia
+batcher = MicroBatcher(
+    predict_paths, executor, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS
+) if predictor else None
+
 # Modelos Pydantic
 class PredictionRequest(BaseModel):
     image_path: str = Field(..., description="Ruta absoluta a la imagen")
@@ -44,6 +111,59 @@ class PredictionResponse(BaseModel):
     width_mm: float
     height_mm: float
 
+class ImageManifest(BaseModel):
+    dataset: str
+    version: str
+    ranges: Optional[List[Tuple[int, int]]] = None
+    packed: Optional[str] = None
+
+class PredictBatchRequest(BaseModel):
+    image_paths: List[str] = Field(default=[], description="Lista de rutas absolutas a las imágenes")
+    manifest: Optional[ImageManifest] = Field(default=None, description="Ids del índice publicado en lugar de image_paths")
+
+class PredictBatchItem(BaseModel):
+    image_path: str
+    result: Optional[PredictionResponse] = None
+    error: Optional[str] = None
+
+class PredictBatchResponse(BaseModel):
+    processed: int
+    failed: int
+    results: List[PredictBatchItem]
+
+def check_deadline(deadline: Optional[float]):
+    """
+    Descarta al llegar el trabajo que el llamador ya no espera.
+    """
+    if expired(deadline):
+        executor.expired += 1
+        raise DeadlineExceeded("Deadline passed before the request was processed")
+
+def deadline_exceeded(e: DeadlineExceeded) -> HTTPException:
+    logger.warning(f"⏰ Dropping expired work: {e}")
+    return HTTPException(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        detail=str(e),
+        headers={DEADLINE_EXCEEDED_HEADER: "true"}
+    )
+
+def request_paths(request: PredictBatchRequest) -> List[str]:
+    """
+    Rutas del lote: las de image_paths o las del manifiesto resuelto.
+    """
+    if request.manifest is None:
+        return request.image_paths
+    if manifest_store is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Image manifests are not enabled (MANIFEST_DIR)"
+        )
+    manifest = request.manifest
+    try:
+        return manifest_store.resolve(manifest.dataset, manifest.version, manifest.ranges, manifest.packed)
+    except ManifestError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
 @app.get("/")
 async def root():
     return {
@@ -51,7 +171,8 @@ async def root():
         "status": "running" if predictor else "model not loaded",
         "model_path": MODEL_PATH,
         "config_path": CONFIG_PATH,
-        "scaler_path": SCALER_PATH
+        "scaler_path": SCALER_PATH,
+        "decode_mode": DECODE_MODE
     }
 
 @app.get("/health")
@@ -64,7 +185,10 @@ async def health():
     return {"status": "healthy", "model": "loaded"}
 
 @app.post("/predict", response_model=PredictionResponse)
-async def predict(request: PredictionRequest):
+async def predict(
+    request: PredictionRequest,
+    x_deadline: Optional[str] = Header(None, alias=DEADLINE_HEADER)
+):
     """
     Predice las dimensiones del pan.
     """
@@ -80,15 +204,112 @@ async def predict(request: PredictionRequest):
             detail=f"Image not found: {request.image_path}"
         )
     
+    deadline = parse_deadline(x_deadline)
     try:
-        result = predictor.predict(request.image_path)
-        return result
+        check_deadline(deadline)
+        with executor.admit():
+            result = await batcher.submit(request.image_path, deadline)
+    except DeadlineExceeded as e:
+        raise deadline_exceeded(e)
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
         logger.error(f"Prediction error: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Prediction failed: {str(e)}"
         )
+    
+    if "error" in result:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Prediction failed: {result['error']}"
+        )
+    return result
+
+@app.get("/stats")
+async def stats():
+    """
+    Métricas del micro-batching para ajustar la ventana.
+    """
+    return {
+        "batcher": batcher.stats() if batcher else None,
+        "executor": executor.stats(),
+        "tensor_cache": tensor_cache.stats(),
+        "result_cache": result_cache.stats() if result_cache else None,
+        "manifests": manifest_store.stats() if manifest_store else None
+    }
+
+@app.post("/predict-batch", response_model=PredictBatchResponse)
+async def predict_batch(
+    request: PredictBatchRequest,
+    x_deadline: Optional[str] = Header(None, alias=DEADLINE_HEADER)
+):
+    """
+    Predice las dimensiones de un lote de imágenes con una sola inferencia.
+    Los resultados mantienen el orden de entrada; una imagen que falla
+    no hace fallar el lote. Las imágenes llegan como rutas o como
+    manifiesto (ids de una versión publicada del índice).
+    """
+    if predictor is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Model not loaded"
+        )
+    
+    image_paths = request_paths(request)
+    if len(image_paths) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch too large: {len(image_paths)} > {MAX_BATCH_SIZE}"
+        )
+    
+    items = [PredictBatchItem(image_path=path) for path in image_paths]
+    pending = []
+    for item in items:
+        if os.path.exists(item.image_path):
+            pending.append(item)
+        else:
+            item.error = f"Image not found: {item.image_path}"
+    
+    deadline = parse_deadline(x_deadline)
+    try:
+        check_deadline(deadline)
+        with executor.admit(len(pending)):
+            results = await executor.run(
+                predict_paths, [item.image_path for item in pending], deadline=deadline
+            ) if pending else []
+    except DeadlineExceeded as e:
+        raise deadline_exceeded(e)
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "1"}
+        )
+    except Exception as e:
+        logger.error(f"Batch prediction error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Batch prediction failed: {str(e)}"
+        )
+    
+    for item, result in zip(pending, results):
+        if "error" in result:
+            item.error = result["error"]
+        else:
+            item.result = PredictionResponse(**result)
+    
+    failed = sum(1 for item in items if item.error is not None)
+    return PredictBatchResponse(
+        processed=len(items) - failed,
+        failed=failed,
+        results=items
+    )
 
 if __name__ == "__main__":
     import uvicorn
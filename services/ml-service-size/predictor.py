@@ -5,12 +5,23 @@ import json
 import pickle
 import logging
 import os
-from typing import Dict, Optional
+import math
+from typing import Dict, List, Optional
+
+from decoder import DECODE_MODES, imread_for_target
+from tensor_cache import TensorCache
 
 logger = logging.getLogger(__name__)
 
 class SizePredictor:
-    def __init__(self, model_path: str, config_path: str, scaler_path: Optional[str] = None):
+    def __init__(
+        self,
+        model_path: str,
+        config_path: str,
+        scaler_path: Optional[str] = None,
+        decode_mode: str = "reduced",
+        tensor_cache: Optional[TensorCache] = None
+    ):
         """
         Inicializa el predictor de tamaño de pan.
         
@@ -18,7 +29,14 @@ class SizePredictor:
             model_path: Ruta al archivo modelo_medidor.h5
             config_path: Ruta al archivo config.json
             scaler_path: Ruta al archivo output_scaler.pkl (opcional)
+            decode_mode: "reduced" (decodificación JPEG reducida) o "full"
+            tensor_cache: Caché de tensores ya preprocesados (opcional)
         """
+        if decode_mode not in DECODE_MODES:
+            raise ValueError(f"Unknown decode mode: {decode_mode} (expected one of {DECODE_MODES})")
+        self.decode_mode = decode_mode
+        self.tensor_cache = tensor_cache
+        
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"Model not found: {model_path}")
         
@@ -37,6 +55,12 @@ class SizePredictor:
                 self.config = json.load(f)
             logger.info(f"✅ Config loaded: {config_path}")
             
+            # El recorte izquierdo debe seguir midiendo al menos img_size
+            # tras la reducción, para no tener que ampliar la imagen
+            crop_percent = self.config['preprocessing']['crop_left_percent']
+            img_size = self.config['model']['img_size']
+            self.decode_min_side = max(math.ceil(img_size[0] / crop_percent), img_size[1])
+            
             # Cargar scaler (opcional)
             self.scaler = None
             if scaler_path and os.path.exists(scaler_path):
@@ -50,6 +74,79 @@ class SizePredictor:
             logger.error(f"Failed to load size model: {e}")
             raise
     
+    def preprocess(self, image_path: str) -> np.ndarray:
+        """
+        Lee la imagen y la deja lista para el modelo.
+
+        Args:
+            image_path: Ruta a la imagen
+
+        Returns:
+            Tensor (img_size, img_size, 3) normalizado en [0, 1]
+        """
+        # Leer imagen con OpenCV a la menor escala suficiente
+        img = imread_for_target(image_path, self.decode_min_side, self.decode_mode)
+        if img is None:
+            raise ValueError(f"Could not read image: {image_path}")
+
+        # Convertir BGR a RGB
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+        # Aplicar crop según configuración
+        crop_percent = self.config['preprocessing']['crop_left_percent']
+        h, w = img.shape[:2]
+        img = img[:, :int(w * crop_percent)]
+
+        # Resize según configuración del modelo
+        img_size = tuple(self.config['model']['img_size'])
+        img = cv2.resize(img, img_size)
+
+        # Normalizar [0, 255] -> [0, 1] (float32 como la entrada del modelo)
+        return img.astype(np.float32) / 255.0
+
+    def load_input(self, image_path: str) -> np.ndarray:
+        """
+        Devuelve la entrada del modelo para la imagen, desde la caché de
+        tensores si el archivo no cambió desde la última vez.
+        """
+        key = None
+        if self.tensor_cache is not None and self.tensor_cache.enabled:
+            key = self.tensor_cache.key_for(image_path, self.decode_mode)
+            if key is not None:
+                found, value = self.tensor_cache.get(key)
+                if found:
+                    return value
+
+        value = self.preprocess(image_path)
+        if key is not None:
+            self.tensor_cache.put(key, value)
+        return value
+
+    def postprocess(self, preds: np.ndarray) -> np.ndarray:
+        """
+        Desnormaliza las salidas del modelo (N, 2) si hay scaler.
+        """
+        if self.scaler is not None:
+            preds = self.scaler.inverse_transform(preds.reshape(len(preds), -1))
+        return preds
+
+    def build_result(self, image_path: str, pred: np.ndarray) -> Dict:
+        """
+        Construye la respuesta a partir de una fila de predicción.
+        """
+        # Extraer dimensiones
+        width_mm = float(pred[0])
+        height_mm = float(pred[1])
+
+        logger.info(f"Size prediction for {os.path.basename(image_path)}: "
+                   f"width={width_mm:.2f}mm, height={height_mm:.2f}mm")
+
+        return {
+            "image": os.path.basename(image_path),
+            "width_mm": round(width_mm, 2),
+            "height_mm": round(height_mm, 2)
+        }
+
     def predict(self, image_path: str) -> Dict:
         """
         Predice las dimensiones del pan.
@@ -61,49 +158,53 @@ class SizePredictor:
             Diccionario con las dimensiones predichas
         """
         try:
-            # Leer imagen con OpenCV
-            img = cv2.imread(image_path)
-            if img is None:
-                raise ValueError(f"Could not read image: {image_path}")
-            
-            # Convertir BGR a RGB
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            
-            # Aplicar crop según configuración
-            crop_percent = self.config['preprocessing']['crop_left_percent']
-            h, w = img.shape[:2]
-            img = img[:, :int(w * crop_percent)]
-            
-            # Resize según configuración del modelo
-            img_size = tuple(self.config['model']['img_size'])
-            img = cv2.resize(img, img_size)
-            
-            # Normalizar [0, 255] -> [0, 1]
-            img = img / 255.0
+            img = self.load_input(image_path)
             
             # Agregar dimensión batch
             img = np.expand_dims(img, axis=0)
             
             # Predecir
-            pred = self.model.predict(img, verbose=0)[0]
-            
-            # Desnormalizar si hay scaler
-            if self.scaler is not None:
-                pred = self.scaler.inverse_transform(pred.reshape(1, -1))[0]
+            pred = self.postprocess(self.model.predict(img, verbose=0))[0]
             
-            # Extraer dimensiones
-            width_mm = float(pred[0])
-            height_mm = float(pred[1])
-            
-            logger.info(f"Size prediction for {os.path.basename(image_path)}: "
-                       f"width={width_mm:.2f}mm, height={height_mm:.2f}mm")
-            
-            return {
-                "image": os.path.basename(image_path),
-                "width_mm": round(width_mm, 2),
-                "height_mm": round(height_mm, 2)
-            }
+            return self.build_result(image_path, pred)
             
         except Exception as e:
             logger.error(f"Error predicting size for {image_path}: {e}")
             raise
+
+    def predict_batch(self, image_paths: List[str]) -> List[Dict]:
+        """
+        Predice un lote de imágenes con una sola llamada a model.predict.
+
+        Las imágenes que no se pueden leer no detienen el lote: su entrada
+        lleva la clave "error" en lugar de la predicción.
+
+        Args:
+            image_paths: Lista de rutas a las imágenes
+
+        Returns:
+            Lista de resultados en el mismo orden que image_paths
+        """
+        results: List[Dict] = [None] * len(image_paths)
+        indices, tensors = [], []
+
+        for i, image_path in enumerate(image_paths):
+            try:
+                tensors.append(self.load_input(image_path))
+                indices.append(i)
+            except Exception as e:
+                logger.error(f"Error preprocessing size for {image_path}: {e}")
+                results[i] = {"image": os.path.basename(image_path), "error": str(e)}
+
+        if not indices:
+            return results
+
+        # Una sola inferencia para todo el lote: (N, H, W, 3)
+        batch = np.stack(tensors)
+        preds = self.postprocess(self.model.predict(batch, verbose=0))
+
+        for i, pred in zip(indices, preds):
+            results[i] = self.build_result(image_paths[i], pred)
+
+        logger.info(f"Size batch prediction: {len(indices)}/{len(image_paths)} images")
+        return results
@@ -0,0 +1,238 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_CHUNK = 1024 * 1024
+
+
+def file_digest(path: str) -> str:
+    """
+    Hash del contenido del archivo (BLAKE2b, 128 bits).
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    Caché de predicciones direccionada por contenido.
+
+    La clave es el hash de los bytes de la imagen más la versión del modelo
+    (hash de los archivos del modelo y de los parámetros de preprocesado).
+    Como el modelo es determinista, una imagen repetida cuesta un hash en vez
+    de una inferencia, aunque llegue con otra ruta.
+
+    Si los archivos del modelo cambian en disco, las entradas se descartan y
+    la caché queda desactivada hasta reiniciar el servicio, porque el modelo
+    en memoria ya no corresponde al archivo. Opcionalmente persiste en SQLite
+    para sobrevivir a reinicios del contenedor.
+    """
+
+    def __init__(
+        self,
+        model_files: List[str],
+        identity: str = "",
+        max_entries: int = 10000,
+        db_path: Optional[str] = None,
+        check_interval: float = 5.0
+    ):
+        """
+        Args:
+            model_files: Archivos que definen el modelo cargado
+            identity: Parámetros de preprocesado que también cambian el resultado
+            max_entries: Entradas en memoria (LRU)
+            db_path: Archivo SQLite para persistir la caché (opcional)
+            check_interval: Segundos entre comprobaciones de los archivos del modelo
+        """
+        self.model_files = [f for f in model_files if f and os.path.exists(f)]
+        self.max_entries = max(1, max_entries)
+        self.check_interval = check_interval
+
+        self._model_stat = self._stat_models()
+        self.model_version = self._version(identity)
+        self.stale = False
+        self._last_check = time.monotonic()
+
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Métricas
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        if db_path:
+            self._open_db(db_path)
+
+        logger.info(f"✅ Result cache ready (model_version={self.model_version[:12]}, db={db_path or 'off'})")
+
+    def _stat_models(self) -> Tuple:
+        stats = []
+        for path in self.model_files:
+            try:
+                st = os.stat(path)
+                stats.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                stats.append((path, None, None))
+        return tuple(stats)
+
+    def _version(self, identity: str) -> str:
+        h = hashlib.blake2b(digest_size=16)
+        for path in self.model_files:
+            h.update(file_digest(path).encode())
+        h.update(identity.encode())
+        return h.hexdigest()
+
+    def _open_db(self, db_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " content_hash TEXT NOT NULL,"
+            " model_version TEXT NOT NULL,"
+            " result TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " PRIMARY KEY (content_hash, model_version))"
+        )
+        # Las entradas de otras versiones del modelo ya no sirven
+        deleted = self._db.execute(
+            "DELETE FROM results WHERE model_version != ?", (self.model_version,)
+        ).rowcount
+        if deleted:
+            logger.info(f"Result cache: dropped {deleted} entries from previous model versions")
+
+    def _check_model(self):
+        """
+        Detecta cambios en los archivos del modelo, como mucho una vez cada
+        check_interval segundos.
+        """
+        now = time.monotonic()
+        if self.stale or now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        if self._stat_models() == self._model_stat:
+            return
+
+        logger.warning("⚠️  Model files changed on disk; result cache disabled until restart")
+        with self._lock:
+            self.stale = True
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results WHERE model_version = ?", (self.model_version,))
+
+    def get(self, content_hash: str) -> Optional[Dict]:
+        self._check_model()
+        if self.stale:
+            return None
+
+        with self._lock:
+            result = self._entries.get(content_hash)
+            if result is not None:
+                self._entries.move_to_end(content_hash)
+                self.hits += 1
+                return result
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT result FROM results WHERE content_hash = ? AND model_version = ?",
+                    (content_hash, self.model_version)
+                ).fetchone()
+                if row is not None:
+                    result = json.loads(row[0])
+                    self._remember(content_hash, result)
+                    self.disk_hits += 1
+                    return result
+
+            self.misses += 1
+            return None
+
+    def put(self, content_hash: str, result: Dict):
+        if self.stale:
+            return
+
+        with self._lock:
+            self._remember(content_hash, result)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                    (content_hash, self.model_version, json.dumps(result), time.time())
+                )
+
+    def _remember(self, content_hash: str, result: Dict):
+        self._entries[content_hash] = result
+        self._entries.move_to_end(content_hash)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def wrap(self, batch_fn: Callable[[List[str]], List[Dict]]) -> Callable[[List[str]], List[Dict]]:
+        """
+        Envuelve predictor.predict_batch: las imágenes ya vistas se responden
+        desde la caché y solo el resto pasa por el modelo.
+        """
+        def cached_batch(image_paths: List[str]) -> List[Dict]:
+            results: List[Optional[Dict]] = [None] * len(image_paths)
+            hashes: List[Optional[str]] = [None] * len(image_paths)
+            pending = []
+
+            for i, image_path in enumerate(image_paths):
+                try:
+                    hashes[i] = file_digest(image_path)
+                except OSError:
+                    # El predictor reportará el error de lectura
+                    pending.append(i)
+                    continue
+
+                cached = self.get(hashes[i])
+                if cached is None:
+                    pending.append(i)
+                else:
+                    # El mismo contenido puede llegar con otro nombre
+                    results[i] = {**cached, "image": os.path.basename(image_path)}
+
+            if pending:
+                computed = batch_fn([image_paths[i] for i in pending])
+                for i, result in zip(pending, computed):
+                    results[i] = result
+                    # Los errores no se guardan: pueden ser transitorios
+                    if hashes[i] is not None and "error" not in result:
+                        self.put(hashes[i], {k: v for k, v in result.items() if k != "image"})
+
+            return results
+
+        return cached_batch
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "model_version": self.model_version,
+            "stale": self.stale,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "persistent": self._db is not None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,115 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Tamaño contabilizado para entradas sin array (p. ej. "no se detectó pan")
+_SMALL_ENTRY_BYTES = 64
+
+
+def _entry_bytes(value: Any) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    return _SMALL_ENTRY_BYTES
+
+
+class TensorCache:
+    """
+    Caché LRU en memoria de entradas ya preprocesadas para el modelo.
+
+    La clave incluye (ruta, mtime, tamaño) del archivo, así que una imagen
+    modificada nunca devuelve un tensor viejo. La expulsión se hace por bytes
+    ocupados, no por número de entradas. Es segura entre los hilos del pool
+    de inferencia.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Args:
+            max_bytes: Memoria máxima de la caché; 0 la desactiva
+        """
+        self.max_bytes = max(0, max_bytes)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Métricas
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key_for(self, image_path: str, *extra: Hashable) -> Optional[Tuple]:
+        """
+        Construye la clave de una imagen, o None si no se puede leer su stat.
+
+        Args:
+            image_path: Ruta a la imagen
+            extra: Parámetros de preprocesado que también cambian el tensor
+        """
+        try:
+            st = os.stat(image_path)
+        except OSError:
+            return None
+        return (image_path, st.st_mtime_ns, st.st_size, *extra)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        Returns:
+            (encontrado, valor)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        size = _entry_bytes(value)
+        if not self.enabled or size > self.max_bytes:
+            return
+
+        if isinstance(value, np.ndarray):
+            # Evitar que un llamador modifique el tensor compartido
+            value.setflags(write=False)
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
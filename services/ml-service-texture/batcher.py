@@ -0,0 +1,192 @@
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from deadline import DeadlineExceeded, expired
+from executor import InferenceExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Agrupa peticiones /predict concurrentes en un solo lote de inferencia.
+
+    Cada petición espera como máximo max_wait_ms a que lleguen otras; el lote
+    se despacha antes si alcanza max_batch_size. Cada llamador recibe su
+    propia fila del resultado.
+
+    Los lotes se ejecutan en el InferenceExecutor; mientras todos sus hilos
+    están ocupados, las peticiones siguen acumulándose para el próximo lote.
+    Las peticiones cuyo deadline vence antes de despachar el lote se
+    descartan con DeadlineExceeded.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[str]], List[Dict]],
+        executor: InferenceExecutor,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0
+    ):
+        """
+        Args:
+            batch_fn: Función que predice una lista de rutas (predictor.predict_batch)
+            executor: Pool donde se ejecuta batch_fn
+            max_batch_size: Tamaño máximo de cada lote
+            max_wait_ms: Tiempo máximo que una petición espera a formar lote
+        """
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight = set()
+
+        # Métricas
+        self.batches = 0
+        self.requests = 0
+        self.last_batch_size = 0
+        self.largest_batch_size = 0
+        self.expired = 0
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.executor.max_workers)
+        self._worker = asyncio.create_task(self._run())
+        logger.info(
+            f"✅ Micro-batcher started (max_batch_size={self.max_batch_size}, "
+            f"max_wait_ms={self.max_wait * 1000:.1f})"
+        )
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        for task in list(self._in_flight):
+            task.cancel()
+
+        # Liberar a quien siga esperando
+        while self._queue is not None and not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Micro-batcher stopped"))
+
+    async def submit(self, image_path: str, deadline: Optional[float] = None) -> Dict:
+        """
+        Encola una imagen y espera su resultado.
+
+        Raises:
+            DeadlineExceeded: si el deadline vence antes de despachar el lote
+        """
+        if self._queue is None:
+            raise RuntimeError("Micro-batcher not started")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((image_path, future, deadline))
+        return await future
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future, Optional[float]]]:
+        """
+        Espera la primera petición y reúne las siguientes hasta llenar el
+        lote o agotar la ventana.
+        """
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        while True:
+            # No formar un lote hasta que haya un hilo libre para ejecutarlo
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+
+            task = asyncio.create_task(self._execute(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _execute(self, batch: List[Tuple[str, asyncio.Future, Optional[float]]]):
+        try:
+            await self._execute_batch(batch)
+        finally:
+            self._slots.release()
+
+    async def _execute_batch(self, batch: List[Tuple[str, asyncio.Future, Optional[float]]]):
+        # Lo vencido o cancelado mientras esperaba no se infiere
+        live = []
+        for path, future, deadline in batch:
+            if future.done():
+                continue
+            if expired(deadline):
+                self.expired += 1
+                future.set_exception(DeadlineExceeded("Deadline passed while waiting for a batch"))
+                continue
+            live.append((path, future))
+        if not live:
+            return
+        batch = live
+        paths = [path for path, _ in batch]
+
+        self.batches += 1
+        self.requests += len(batch)
+        self.last_batch_size = len(batch)
+        self.largest_batch_size = max(self.largest_batch_size, len(batch))
+
+        try:
+            results = await self.executor.run(self.batch_fn, paths)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                if not future.done():
+                    future.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Micro-batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            # El llamador pudo haber cancelado mientras esperaba
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "last_batch_size": self.last_batch_size,
+            "largest_batch_size": self.largest_batch_size,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "expired": self.expired,
+        }
@@ -0,0 +1,33 @@
+import logging
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Instante límite (epoch en segundos) que envía el orquestador
+DEADLINE_HEADER = "X-Deadline"
+# Marca los 504 de trabajo descartado por vencido (no es un fallo del servicio)
+DEADLINE_EXCEEDED_HEADER = "X-Deadline-Exceeded"
+
+
+class DeadlineExceeded(Exception):
+    """
+    El llamador ya no espera el resultado: el trabajo se descarta sin ejecutarse.
+    """
+
+
+def parse_deadline(value: Optional[str]) -> Optional[float]:
+    """
+    Lee el header de deadline; un valor ausente o inválido es "sin deadline".
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid {DEADLINE_HEADER} header: {value!r}")
+        return None
+
+
+def expired(deadline: Optional[float]) -> bool:
+    return deadline is not None and time.time() >= deadline
@@ -0,0 +1,247 @@
+import base64
+import json
+import logging
+import os
+import sys
+import tempfile
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Un manifiesto identifica imágenes por su posición en una versión publicada
+# del índice de un dataset, en lugar de enviar sus rutas:
+#   {"dataset": "color", "version": "3f2a...", "ranges": [[0, 100], [250, 260]]}
+#   {"dataset": "color", "version": "3f2a...", "packed": "<base64 uint32 LE>"}
+# ranges son intervalos [inicio, fin); packed es un array de ids uint32
+# little-endian en base64. Cada versión del índice se publica una vez en
+# <MANIFEST_DIR>/<dataset>/<version>.json y no se modifica.
+
+
+class ManifestError(Exception):
+    """
+    El manifiesto no se puede resolver: versión desconocida, ids fuera de
+    rango o formato inválido.
+    """
+
+
+def _ranges(ids: List[int]) -> List[List[int]]:
+    ranges: List[List[int]] = []
+    for i in ids:
+        if ranges and ranges[-1][1] == i:
+            ranges[-1][1] = i + 1
+        else:
+            ranges.append([i, i + 1])
+    return ranges
+
+
+def encode_ids(ids: List[int]) -> Dict[str, Any]:
+    """
+    Codifica los ids con la representación más corta: intervalos si son
+    mayormente consecutivos, array empaquetado si no.
+    """
+    ranges = _ranges(ids)
+    # Un intervalo ocupa ~14 caracteres en JSON; un id empaquetado, 4 bytes
+    # que en base64 son 16/3 caracteres
+    if len(ranges) * 14 <= len(ids) * 16 / 3:
+        return {"ranges": ranges}
+    packed = array("I", ids)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return {"packed": base64.b64encode(packed.tobytes()).decode("ascii")}
+
+
+def decode_ids(
+    ranges: Optional[List[List[int]]] = None,
+    packed: Optional[str] = None,
+    limit: Optional[int] = None
+) -> List[int]:
+    """
+    Ids de un manifiesto en el orden en que se codificaron; con limit, los
+    intervalos que lo superan se rechazan antes de expandirse.
+
+    Raises:
+        ManifestError: Si el formato es inválido
+    """
+    if packed is not None:
+        try:
+            raw = base64.b64decode(packed, validate=True)
+        except ValueError as e:
+            raise ManifestError(f"Invalid packed ids: {e}")
+        if len(raw) % 4:
+            raise ManifestError("Invalid packed ids: length is not a multiple of 4")
+        ids = array("I")
+        ids.frombytes(raw)
+        if sys.byteorder != "little":
+            ids.byteswap()
+        return ids.tolist()
+
+    ids: List[int] = []
+    for item in ranges or []:
+        if len(item) != 2 or item[0] < 0 or item[1] < item[0] or (limit is not None and item[1] > limit):
+            raise ManifestError(f"Invalid id range: {item}")
+        ids.extend(range(item[0], item[1]))
+    return ids
+
+
+def make_manifest(dataset: str, version: str, ids: List[int]) -> Dict[str, Any]:
+    return {"dataset": dataset, "version": version, **encode_ids(ids)}
+
+
+def manifest_file(directory: str, dataset: str, version: str) -> str:
+    return os.path.join(directory, dataset, f"{version}.json")
+
+
+def publish(directory: str, dataset: str, version: str, root: str, names: List[str], keep: int = 5) -> bool:
+    """
+    Escribe la versión del índice si no existe y borra las más antiguas,
+    dejando keep versiones (las peticiones en curso pueden seguir usando
+    una versión anterior).
+
+    Returns:
+        True si se escribió una versión nueva
+    """
+    path = manifest_file(directory, dataset, version)
+    if os.path.exists(path):
+        return False
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Nombre único: varias réplicas (todas con PID 1 en su contenedor) pueden
+    # publicar la misma versión a la vez en el volumen compartido
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"dataset": dataset, "version": version, "root": root, "names": names}, f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    # Otra réplica puede estar podando a la vez: lo que ya no existe se ignora
+    versions = []
+    for entry in os.scandir(os.path.dirname(path)):
+        if entry.name.endswith(".json"):
+            try:
+                versions.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                pass
+    versions.sort(reverse=True)
+    for _, old_path in versions[max(1, keep):]:
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+    return True
+
+
+class ManifestSelection:
+    """
+    Imágenes de un manifiesto ya resueltas, para reenviar cualquier
+    subconjunto de sus rutas como un manifiesto más pequeño.
+    """
+    def __init__(self, dataset: str, version: str, paths: List[str], ids: List[int]):
+        self.dataset = dataset
+        self.version = version
+        self.paths = paths
+        self._ids = dict(zip(paths, ids))
+
+    def manifest(self, paths: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Manifiesto de esas rutas, o None si alguna no es de la selección.
+        """
+        try:
+            ids = [self._ids[path] for path in paths]
+        except KeyError:
+            return None
+        return make_manifest(self.dataset, self.version, ids)
+
+
+class ManifestStore:
+    """
+    Resuelve manifiestos a rutas con las versiones publicadas en directory.
+    Las últimas cache_size versiones leídas se guardan en memoria.
+    """
+    def __init__(self, directory: str, cache_size: int = 4):
+        self.directory = directory
+        self.cache_size = max(1, cache_size)
+        self._versions: "OrderedDict[tuple, List[str]]" = OrderedDict()
+
+        # Métricas
+        self.loads = 0
+        self.resolved = 0
+
+    def paths(self, dataset: str, version: str) -> List[str]:
+        """
+        Rutas de una versión, en el orden de sus ids.
+
+        Raises:
+            ManifestError: Si la versión no está publicada
+        """
+        key = (dataset, version)
+        paths = self._versions.get(key)
+        if paths is not None:
+            self._versions.move_to_end(key)
+            return paths
+
+        # dataset y version llegan del cliente: no pueden salir del directorio
+        if os.sep in dataset or os.sep in version or dataset.startswith(".") or version.startswith("."):
+            raise ManifestError(f"Invalid manifest {dataset}@{version}")
+        try:
+            with open(manifest_file(self.directory, dataset, version)) as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            raise ManifestError(f"Unknown manifest version {dataset}@{version}")
+        except (OSError, ValueError) as e:
+            raise ManifestError(f"Unreadable manifest {dataset}@{version}: {e}")
+
+        root = snapshot["root"]
+        paths = [os.path.join(root, name) for name in snapshot["names"]]
+        self.loads += 1
+        self._versions[key] = paths
+        if len(self._versions) > self.cache_size:
+            self._versions.popitem(last=False)
+        logger.info(f"📜 Loaded manifest {dataset}@{version} ({len(paths)} images)")
+        return paths
+
+    def resolve(
+        self,
+        dataset: str,
+        version: str,
+        ranges: Optional[List[List[int]]] = None,
+        packed: Optional[str] = None
+    ) -> List[str]:
+        """
+        Rutas de las imágenes de un manifiesto, en su orden.
+
+        Raises:
+            ManifestError: Si el manifiesto no se puede resolver
+        """
+        return self.select(dataset, version, ranges, packed).paths
+
+    def select(
+        self,
+        dataset: str,
+        version: str,
+        ranges: Optional[List[List[int]]] = None,
+        packed: Optional[str] = None
+    ) -> ManifestSelection:
+        """
+        Como resolve, conservando los ids para reenviar el manifiesto.
+        """
+        paths = self.paths(dataset, version)
+        ids = decode_ids(ranges, packed, len(paths))
+        if ids and max(ids) >= len(paths):
+            raise ManifestError(f"Image id {max(ids)} out of range for {dataset}@{version} ({len(paths)} images)")
+        self.resolved += len(ids)
+        return ManifestSelection(dataset, version, [paths[i] for i in ids], ids)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "cached_versions": [f"{dataset}@{version}" for dataset, version in self._versions],
+            "loads": self.loads,
+            "resolved": self.resolved,
+        }
@@ -3,19 +3,20 @@ import numpy as np
 import logging
 import os
 import cv2
-from typing import Dict
+from typing import Dict, List, Optional
+
+from decoder import DECODE_MODES, imread_for_target
+from tensor_cache import TensorCache
 
 logger = logging.getLogger(__name__)
 
 # === Función detect_and_crop integrada === #
-def detect_and_crop(img_path):
+def detect_and_crop(img_path, decode_mode="full", min_side=0):
     try:
-        img = cv2.imread(img_path)
+        img = imread_for_target(img_path, min_side, decode_mode)
         if img is None:
             return None
 
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-
         lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
         L, A, B = cv2.split(lab)
 
@@ -36,7 +37,8 @@ def detect_and_crop(img_path):
 
         cnt = max(contours, key=cv2.contourArea)
         x, y, w, h = cv2.boundingRect(cnt)
-        crop = img_rgb[y:y+h, x:x+w]
+        # Solo el recorte pasa a RGB
+        crop = cv2.cvtColor(img[y:y+h, x:x+w], cv2.COLOR_BGR2RGB)
 
         return crop
 
@@ -48,14 +50,37 @@ def detect_and_crop(img_path):
 
 # === Clase de producción === #
 class TexturePredictor:
-    def __init__(self, model_path: str, img_size: int = 224):
+    def __init__(
+        self,
+        model_path: str,
+        img_size: int = 224,
+        decode_mode: str = "reduced",
+        decode_min_side: Optional[int] = None,
+        tensor_cache: Optional[TensorCache] = None
+    ):
         """
         Inicializa el predictor de textura de pan.
+
+        Args:
+            model_path: Ruta al modelo .h5
+            img_size: Lado de la entrada del modelo
+            decode_mode: "reduced" (decodificación JPEG reducida) o "full"
+            decode_min_side: Lado corto mínimo de la imagen decodificada. Por
+                defecto 2 * img_size, para que un pan que ocupe al menos la
+                mitad del encuadre siga recortándose a img_size o más
+            tensor_cache: Caché de recortes ya preprocesados (opcional);
+                también recuerda las imágenes sin pan detectado
         """
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"Model not found: {model_path}")
 
+        if decode_mode not in DECODE_MODES:
+            raise ValueError(f"Unknown decode mode: {decode_mode} (expected one of {DECODE_MODES})")
+
         self.img_size = img_size
+        self.decode_mode = decode_mode
+        self.decode_min_side = decode_min_side or 2 * img_size
+        self.tensor_cache = tensor_cache
 
         logger.info(f"Loading texture model from {model_path}")
 
@@ -67,40 +92,115 @@ class TexturePredictor:
             raise
     
 
+    def preprocess(self, image_path: str) -> Optional[np.ndarray]:
+        """
+        Recorta el pan y lo deja listo para el modelo.
+
+        Returns:
+            Tensor (img_size, img_size, 3) en [0, 1], o None si no se detecta pan
+        """
+        # === Recorte usando tu lógica === #
+        crop = detect_and_crop(image_path, self.decode_mode, self.decode_min_side)
+
+        if crop is None:
+            return None
+
+        # === Resize y normalización === #
+        crop = cv2.resize(crop, (self.img_size, self.img_size))
+        return crop.astype("float32") / 255.0
+
+    def load_input(self, image_path: str) -> Optional[np.ndarray]:
+        """
+        Devuelve la entrada del modelo para la imagen, desde la caché de
+        tensores si el archivo no cambió desde la última vez.
+        """
+        key = None
+        if self.tensor_cache is not None and self.tensor_cache.enabled:
+            key = self.tensor_cache.key_for(image_path, self.decode_mode)
+            if key is not None:
+                found, value = self.tensor_cache.get(key)
+                if found:
+                    return value
+
+        value = self.preprocess(image_path)
+        if key is not None:
+            self.tensor_cache.put(key, value)
+        return value
+
+    def no_bread_result(self, image_path: str) -> Dict:
+        logger.warning(f"No bread detected in image: {image_path}")
+        return {
+            "image": os.path.basename(image_path),
+            "texture_score": None,
+            "message": "No se pudo detectar pan en la imagen"
+        }
+
+    def build_result(self, image_path: str, pred: float) -> Dict:
+        texture_score = float(pred)
+
+        logger.info(
+            f"Texture prediction for {os.path.basename(image_path)}: score={texture_score:.4f}"
+        )
+
+        return {
+            "image": os.path.basename(image_path),
+            "texture_score": round(texture_score, 2)
+        }
+
     def predict(self, image_path: str) -> Dict:
         """
         Predice la textura del pan usando recorte real detect_and_crop().
         """
         try:
-            # === Recorte usando tu lógica === #
-            crop = detect_and_crop(image_path)
+            crop = self.load_input(image_path)
 
             if crop is None:
-                logger.warning(f"No bread detected in image: {image_path}")
-                return {
-                    "image": os.path.basename(image_path),
-                    "texture_score": None,
-                    "message": "No se pudo detectar pan en la imagen"
-                }
-
-            # === Resize y normalización === #
-            crop = cv2.resize(crop, (self.img_size, self.img_size))
-            crop = crop.astype("float32") / 255.0
+                return self.no_bread_result(image_path)
+
             crop = np.expand_dims(crop, axis=0)
 
             # === Predicción === #
             pred = self.model.predict(crop, verbose=0)[0][0]
-            texture_score = float(pred)
-
-            logger.info(
-                f"Texture prediction for {os.path.basename(image_path)}: score={texture_score:.4f}"
-            )
 
-            return {
-                "image": os.path.basename(image_path),
-                "texture_score": round(texture_score, 2)
-            }
+            return self.build_result(image_path, pred)
 
         except Exception as e:
             logger.error(f"Error predicting texture for {image_path}: {e}")
             raise
+
+    def predict_batch(self, image_paths: List[str]) -> List[Dict]:
+        """
+        Predice un lote de imágenes con una sola llamada a model.predict.
+
+        Las imágenes sin pan detectado devuelven texture_score None, igual
+        que predict(). Los errores de lectura no detienen el lote: su entrada
+        lleva la clave "error".
+        """
+        results: List[Dict] = [None] * len(image_paths)
+        indices, crops = [], []
+
+        for i, image_path in enumerate(image_paths):
+            try:
+                crop = self.load_input(image_path)
+            except Exception as e:
+                logger.error(f"Error preprocessing texture for {image_path}: {e}")
+                results[i] = {"image": os.path.basename(image_path), "error": str(e)}
+                continue
+
+            if crop is None:
+                results[i] = self.no_bread_result(image_path)
+            else:
+                crops.append(crop)
+                indices.append(i)
+
+        if not indices:
+            return results
+
+        # === Una sola predicción para todo el lote === #
+        preds = self.model.predict(np.stack(crops), verbose=0)[:, 0]
+
+        for i, pred in zip(indices, preds):
+            results[i] = self.build_result(image_paths[i], pred)
+
+        logger.info(f"Texture batch prediction: {len(indices)}/{len(image_paths)} images")
+        return results
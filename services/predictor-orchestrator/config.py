@@ -3,11 +3,31 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+def url_list(value: str) -> list:
+    """
+    Lista de URLs separadas por comas.
+    """
+    return [url.strip() for url in value.split(",") if url.strip()]
+
 class Settings:
-    # ML Services
-    ML_COLOR_URL = os.getenv("ML_SERVICE_COLOR_URL", "http://ml-service-color:8000")
-    ML_TEXTURE_URL = os.getenv("ML_SERVICE_TEXTURE_URL", "http://ml-service-texture:8000")
-    ML_SIZE_URL = os.getenv("ML_SERVICE_SIZE_URL", "http://ml-service-size:8000")
+    # ML Services: una o varias réplicas separadas por comas
+    ML_COLOR_URLS = url_list(os.getenv("ML_SERVICE_COLOR_URL", "http://ml-service-color:8000"))
+    ML_TEXTURE_URLS = url_list(os.getenv("ML_SERVICE_TEXTURE_URL", "http://ml-service-texture:8000"))
+    ML_SIZE_URLS = url_list(os.getenv("ML_SERVICE_SIZE_URL", "http://ml-service-size:8000"))
+    
+    # Balanceo entre réplicas y health check pasivo
+    ML_BALANCING_POLICY = os.getenv("ML_BALANCING_POLICY", "least_outstanding")
+    ML_EJECT_AFTER_FAILURES = int(os.getenv("ML_EJECT_AFTER_FAILURES", "3"))
+    ML_EJECT_COOLDOWN = float(os.getenv("ML_EJECT_COOLDOWN", "30"))
+    ML_RESOLVE_REPLICAS = os.getenv("ML_RESOLVE_REPLICAS", "false").lower() == "true"
+    ML_RESOLVE_INTERVAL = float(os.getenv("ML_RESOLVE_INTERVAL", "30"))
+    
+    # Circuit breaker por servicio y hedging de llamadas lentas
+    ML_BREAKER_FAILURES = int(os.getenv("ML_BREAKER_FAILURES", "5"))
+    ML_BREAKER_COOLDOWN = float(os.getenv("ML_BREAKER_COOLDOWN", "15"))
+    ML_HEDGING = os.getenv("ML_HEDGING", "false").lower() == "true"
+    ML_HEDGE_MIN_SAMPLES = int(os.getenv("ML_HEDGE_MIN_SAMPLES", "20"))
+    ML_HEDGE_BUDGET = float(os.getenv("ML_HEDGE_BUDGET", "0.1"))
     
     # ThingsBoard - Un token por cada modelo
     THINGSBOARD_URL = os.getenv("THINGSBOARD_URL", "https://thingsboard.cloud")
@@ -24,5 +44,52 @@ class Settings:
     
     # Timeout para ML services (pueden tardar)
     ML_TIMEOUT = 120.0
+    
+    # Peticiones simultáneas por servicio ML dentro de un batch
+    ML_COLOR_MAX_IN_FLIGHT = int(os.getenv("ML_COLOR_MAX_IN_FLIGHT", "8"))
+    ML_TEXTURE_MAX_IN_FLIGHT = int(os.getenv("ML_TEXTURE_MAX_IN_FLIGHT", "8"))
+    ML_SIZE_MAX_IN_FLIGHT = int(os.getenv("ML_SIZE_MAX_IN_FLIGHT", "8"))
+    
+    # Chunks adaptativos contra /predict-batch de los servicios ML
+    ML_BATCHING = os.getenv("ML_BATCHING", "true").lower() == "true"
+    # Chunks en curso por servicio, sin superar su ML_*_MAX_IN_FLIGHT
+    ML_BATCH_CONCURRENCY = int(os.getenv("ML_BATCH_CONCURRENCY", "2"))
+    ML_BATCH_INITIAL = int(os.getenv("ML_BATCH_INITIAL", "8"))
+    ML_BATCH_MIN = int(os.getenv("ML_BATCH_MIN", "1"))
+    ML_BATCH_MAX = int(os.getenv("ML_BATCH_MAX", "64"))
+    ML_BATCH_TARGET_MS = int(os.getenv("ML_BATCH_TARGET_MS", "1000"))
+    
+    # Pools HTTP de larga vida (keep-alive) por upstream
+    ML_MAX_CONNECTIONS = int(os.getenv("ML_MAX_CONNECTIONS", "16"))
+    TB_MAX_CONNECTIONS = int(os.getenv("TB_MAX_CONNECTIONS", "10"))
+    TB_HTTP2 = os.getenv("TB_HTTP2", "false").lower() == "true"
+    WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", "5"))
+    # Eventos al dashboard pendientes de enviar (se descartan los más antiguos)
+    WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "1000"))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    
+    # Cola write-behind de telemetría
+    TELEMETRY_QUEUE_SIZE = int(os.getenv("TELEMETRY_QUEUE_SIZE", "1000"))
+    TELEMETRY_BATCH_SIZE = int(os.getenv("TELEMETRY_BATCH_SIZE", "100"))
+    TELEMETRY_MAX_AGE_MS = int(os.getenv("TELEMETRY_MAX_AGE_MS", "1000"))
+    TELEMETRY_MAX_BACKOFF = float(os.getenv("TELEMETRY_MAX_BACKOFF", "60"))
+    TELEMETRY_SPILL_DB = os.getenv("TELEMETRY_SPILL_DB", "")
+    TB_RATE_LIMIT = float(os.getenv("TB_RATE_LIMIT", "10"))
+    TB_RATE_BURST = float(os.getenv("TB_RATE_BURST", "20"))
+    # Una fila de telemetría por predicción además del registro agregado por batch
+    TB_SEND_PREDICTIONS = os.getenv("TB_SEND_PREDICTIONS", "true").lower() == "true"
+    # Batches tras los que un batch pesa la mitad en los agregados acumulados (0 = sin decaimiento)
+    AGGREGATE_HALF_LIFE = float(os.getenv("AGGREGATE_HALF_LIFE", "20"))
+    
+    # Jobs de /jobs (batches en segundo plano)
+    MAX_RUNNING_JOBS = int(os.getenv("MAX_RUNNING_JOBS", "2"))
+    MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "20"))
+    JOB_RETENTION = int(os.getenv("JOB_RETENTION", "100"))
+    JOB_TTL = float(os.getenv("JOB_TTL", "3600"))
+    
+    # Versiones del índice publicadas por el scheduler para resolver los
+    # manifiestos de imágenes ("" = solo listas de rutas)
+    MANIFEST_DIR = os.getenv("MANIFEST_DIR", "")
+    MANIFEST_CACHE_VERSIONS = int(os.getenv("MANIFEST_CACHE_VERSIONS", "4"))
 
 settings = Settings()
\ No newline at end of file
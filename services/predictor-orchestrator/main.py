@@ -1,12 +1,23 @@
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional, Tuple
+import asyncio
 import logging
+import orjson
 import time
+from contextlib import asynccontextmanager
 from config import settings
 from services.ml_client import MLOrchestrator
-from services.thingsboard import ThingsBoardClient
+from services.thingsboard import ThingsBoardClient, prediction_records
 from services.websocket_client import WebSocketEmitter
+from services.http_pool import HTTPClientPool
+from services.telemetry_queue import TelemetryQueue
+from services.jobs import Job, JobManager, JobQueueFull
+from services.resilience import DeadlineExceeded, remaining, request_deadline
+from services.response_format import shape_predictions, summarize
+from services.aggregates import RollingAggregates, batch_aggregates, extract, telemetry_values
+from services.manifest import ManifestError, ManifestSelection, ManifestStore
 
 # Configurar logging
 logging.basicConfig(
@@ -15,28 +26,129 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Un cliente HTTP de larga vida por upstream, abierto durante el lifespan
+http_pool = HTTPClientPool()
+for ml_name, ml_urls in (
+    ("ml-color", settings.ML_COLOR_URLS),
+    ("ml-texture", settings.ML_TEXTURE_URLS),
+    ("ml-size", settings.ML_SIZE_URLS)
+):
+    http_pool.register(
+        ml_name,
+        timeout=settings.ML_TIMEOUT,
+        # El límite es por réplica configurada
+        max_connections=settings.ML_MAX_CONNECTIONS * max(1, len(ml_urls)),
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+    )
+http_pool.register(
+    "thingsboard",
+    timeout=10.0,
+    max_connections=settings.TB_MAX_CONNECTIONS,
+    keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    http2=settings.TB_HTTP2
+)
+http_pool.register(
+    "websocket",
+    timeout=5.0,
+    max_connections=settings.WS_MAX_CONNECTIONS,
+    keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await http_pool.start()
+    await telemetry_queue.start()
+    await ws_emitter.start()
+    yield
+    await job_manager.close()
+    await ws_emitter.close()
+    await telemetry_queue.close()
+    await http_pool.close()
+
 # Crear app
 app = FastAPI(
     title="Predictor Orchestrator",
     description="Orquestador de predicciones ML",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # orjson serializa las respuestas grandes mucho más rápido que json
+    default_response_class=ORJSONResponse
 )
 
 # Clientes globales
 ml_orchestrator = MLOrchestrator(
-    settings.ML_COLOR_URL,
-    settings.ML_TEXTURE_URL,
-    settings.ML_SIZE_URL,
-    settings.ML_TIMEOUT
+    settings.ML_COLOR_URLS,
+    settings.ML_TEXTURE_URLS,
+    settings.ML_SIZE_URLS,
+    http_pool,
+    batching=settings.ML_BATCHING,
+    batch_concurrency=settings.ML_BATCH_CONCURRENCY,
+    chunk_options={
+        "initial": settings.ML_BATCH_INITIAL,
+        "min_size": settings.ML_BATCH_MIN,
+        "max_size": settings.ML_BATCH_MAX,
+        "target_latency": settings.ML_BATCH_TARGET_MS / 1000
+    },
+    replica_options={
+        "policy": settings.ML_BALANCING_POLICY,
+        "failure_threshold": settings.ML_EJECT_AFTER_FAILURES,
+        "cooldown": settings.ML_EJECT_COOLDOWN,
+        "resolve_dns": settings.ML_RESOLVE_REPLICAS,
+        "resolve_interval": settings.ML_RESOLVE_INTERVAL
+    },
+    breaker_options={
+        "failure_threshold": settings.ML_BREAKER_FAILURES,
+        "cooldown": settings.ML_BREAKER_COOLDOWN
+    },
+    client_options={
+        "timeout": settings.ML_TIMEOUT,
+        "hedging": settings.ML_HEDGING,
+        "hedge_min_samples": settings.ML_HEDGE_MIN_SAMPLES,
+        "hedge_budget": settings.ML_HEDGE_BUDGET
+    }
+)
+tb_client = ThingsBoardClient(settings.THINGSBOARD_URL, http_pool)
+ws_emitter = WebSocketEmitter(settings.WEBSOCKET_URL, http_pool, max_queue=settings.WS_QUEUE_SIZE)
+telemetry_queue = TelemetryQueue(
+    tb_client,
+    max_queue_per_token=settings.TELEMETRY_QUEUE_SIZE,
+    batch_size=settings.TELEMETRY_BATCH_SIZE,
+    max_age=settings.TELEMETRY_MAX_AGE_MS / 1000,
+    rate_limit=settings.TB_RATE_LIMIT,
+    rate_burst=settings.TB_RATE_BURST,
+    max_backoff=settings.TELEMETRY_MAX_BACKOFF,
+    spill_path=settings.TELEMETRY_SPILL_DB or None
+)
+rolling_aggregates = RollingAggregates(settings.AGGREGATE_HALF_LIFE)
+job_manager = JobManager(
+    max_running=settings.MAX_RUNNING_JOBS,
+    max_queued=settings.MAX_QUEUED_JOBS,
+    retention=settings.JOB_RETENTION,
+    ttl=settings.JOB_TTL
 )
-tb_client = ThingsBoardClient(settings.THINGSBOARD_URL)
-ws_emitter = WebSocketEmitter(settings.WEBSOCKET_URL)
+manifest_store = ManifestStore(
+    settings.MANIFEST_DIR, settings.MANIFEST_CACHE_VERSIONS
+) if settings.MANIFEST_DIR else None
 
 # Modelos Pydantic
+class ImageManifest(BaseModel):
+    """
+    Imágenes como ids de una versión publicada del índice de un dataset
+    (ver services/manifest.py): intervalos [inicio, fin) o un array uint32
+    little-endian en base64.
+    """
+    dataset: str
+    version: str
+    ranges: Optional[List[Tuple[int, int]]] = None
+    packed: Optional[str] = None
+
 class PredictBatchRequest(BaseModel):
     color_images: List[str] = Field(default=[], description="Lista de rutas a imágenes para análisis de color")
     texture_images: List[str] = Field(default=[], description="Lista de rutas a imágenes para análisis de textura")
     size_images: List[str] = Field(default=[], description="Lista de rutas a imágenes para análisis de tamaño")
+    color_manifest: Optional[ImageManifest] = Field(default=None, description="Manifiesto en lugar de color_images")
+    texture_manifest: Optional[ImageManifest] = Field(default=None, description="Manifiesto en lugar de texture_images")
+    size_manifest: Optional[ImageManifest] = Field(default=None, description="Manifiesto en lugar de size_images")
 
 class PredictBatchResponse(BaseModel):
     total_processed: int
@@ -44,8 +156,20 @@ class PredictBatchResponse(BaseModel):
     texture_processed: int
     size_processed: int
     success: bool
-    predictions: dict
+    mode: str = "full"
+    predictions: Optional[dict] = Field(default=None, description="Por modelo: lista de dicts (full) o un array por campo (columnar); omitido en summary")
+    aggregates: Optional[Dict[str, Dict[str, Any]]] = Field(default=None, description="Conteo por estado, medias y agregados de calidad por modelo (solo summary)")
     timestamp: float
+    timings: Dict[str, float] = Field(default_factory=dict, description="Tiempo de pared por servicio (s)")
+    thingsboard: Dict[str, Dict[str, int]] = Field(default_factory=dict, description="Predicciones encoladas/rechazadas y registros de agregados por dispositivo")
+    coalesced: Dict[str, int] = Field(default_factory=dict, description="Imágenes repetidas resueltas sin llamada propia, por servicio")
+
+class JobAccepted(BaseModel):
+    job_id: str
+    status: str
+    total_images: int
+    status_url: str
+    stream_url: str
 
 @app.get("/")
 async def root():
@@ -53,9 +177,9 @@ async def root():
         "service": "Predictor Orchestrator",
         "status": "running",
         "ml_services": {
-            "color": settings.ML_COLOR_URL,
-            "texture": settings.ML_TEXTURE_URL,
-            "size": settings.ML_SIZE_URL
+            "color": settings.ML_COLOR_URLS,
+            "texture": settings.ML_TEXTURE_URLS,
+            "size": settings.ML_SIZE_URLS
         }
     }
 
@@ -63,13 +187,109 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
-@app.post("/predict-batch", response_model=PredictBatchResponse)
-async def predict_batch(request: PredictBatchRequest):
+@app.get("/stats")
+async def stats():
+    """
+    Métricas de conexiones por upstream, de los clientes ML, de la cola de
+    telemetría y de los jobs, y los agregados de calidad acumulados.
+    """
+    return {
+        "http": http_pool.stats(),
+        "ml": ml_orchestrator.stats(),
+        "telemetry": telemetry_queue.stats(),
+        "websocket": ws_emitter.stats(),
+        "jobs": job_manager.stats(),
+        "aggregates": rolling_aggregates.snapshot(),
+        "manifests": manifest_store.stats() if manifest_store else None
+    }
+
+def resolve_manifests(request: PredictBatchRequest) -> Dict[str, ManifestSelection]:
+    """
+    Sustituye las listas de rutas por las de los manifiestos recibidos.
+    
+    Returns:
+        Selección por modelo, para reenviar los chunks como manifiestos
+    
+    Raises:
+        HTTPException: 501 si no hay MANIFEST_DIR, 409 si un manifiesto no se puede resolver
+    """
+    selections: Dict[str, ManifestSelection] = {}
+    for model in ("color", "texture", "size"):
+        manifest = getattr(request, f"{model}_manifest")
+        if manifest is None:
+            continue
+        if manifest_store is None:
+            raise HTTPException(
+                status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                detail="Image manifests are not enabled (MANIFEST_DIR)"
+            )
+        try:
+            selection = manifest_store.select(manifest.dataset, manifest.version, manifest.ranges, manifest.packed)
+        except ManifestError as e:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+        setattr(request, f"{model}_images", selection.paths)
+        selections[model] = selection
+    return selections
+
+# Callback por imagen terminada: (modelo, índice, ruta, resultado o None)
+ResultCallback = Callable[[str, int, str, Optional[Dict[str, Any]]], Awaitable[None]]
+
+async def run_service(
+    label: str,
+    client,
+    image_paths: List[str],
+    max_in_flight: int,
+    model: str = "",
+    on_result: Optional[ResultCallback] = None,
+    deadline: Optional[float] = None,
+    manifest: Optional[ManifestSelection] = None
+):
+    """
+    Procesa las imágenes de un modelo y mide su tiempo de pared.
+    
+    Returns:
+        (predicciones exitosas en orden de entrada, segundos, imágenes coalescidas)
+    """
+    if not image_paths:
+        return [], 0.0, 0
+    
+    callback = (lambda i, p, r: on_result(model, i, p, r)) if on_result else None
+    
+    in_flight, unit = client.concurrency(max_in_flight)
+    logger.info(f"{label}: processing {len(image_paths)} images ({in_flight} {unit} in flight)")
+    start = time.time()
+    results, coalesced = await client.predict_many(image_paths, max_in_flight, callback, deadline, manifest)
+    elapsed = time.time() - start
+    
+    for image_path, result in zip(image_paths, results):
+        if not result:
+            logger.error(f"Error processing {client.service_name} {image_path}")
+    
+    return [r for r in results if r], elapsed, coalesced
+
+# Formato de la respuesta (ver services/response_format.py)
+ResponseMode = Literal["full", "columnar", "summary"]
+
+async def process_batch(
+    request: PredictBatchRequest,
+    on_result: Optional[ResultCallback] = None,
+    deadline: Optional[float] = None,
+    mode: ResponseMode = "full",
+    manifests: Optional[Dict[str, ManifestSelection]] = None
+) -> PredictBatchResponse:
     """
     Procesa lotes de imágenes con los 3 modelos ML.
     Cada modelo procesa su conjunto específico de imágenes.
     Envía resultados a ThingsBoard (un dispositivo por modelo) y emite eventos al dashboard.
+    
+    Args:
+        request: Imágenes por modelo
+        on_result: Corrutina llamada en cuanto termina cada imagen
+        deadline: Epoch límite (header X-Deadline); lo pendiente al vencer falla
+        mode: Formato de las predicciones en la respuesta
+        manifests: Manifiestos resueltos por modelo (ver resolve_manifests)
     """
+    manifests = manifests or {}
     total_images = len(request.color_images) + len(request.texture_images) + len(request.size_images)
     
     logger.info("=" * 60)
@@ -80,76 +300,74 @@ async def predict_batch(request: PredictBatchRequest):
     logger.info("=" * 60)
     
     start_time = time.time()
+    
+    # Los 3 servicios en paralelo, y varias imágenes en curso por servicio
+    (color, color_time, color_coalesced), (texture, texture_time, texture_coalesced), \
+        (size, size_time, size_coalesced) = await asyncio.gather(
+        run_service("🎨 COLOR", ml_orchestrator.color_client, request.color_images,
+                    settings.ML_COLOR_MAX_IN_FLIGHT, "color", on_result, deadline, manifests.get("color")),
+        run_service("🔲 TEXTURE", ml_orchestrator.texture_client, request.texture_images,
+                    settings.ML_TEXTURE_MAX_IN_FLIGHT, "texture", on_result, deadline, manifests.get("texture")),
+        run_service("📏 SIZE", ml_orchestrator.size_client, request.size_images,
+                    settings.ML_SIZE_MAX_IN_FLIGHT, "size", on_result, deadline, manifests.get("size"))
+    )
     predictions = {
-        "color": [],
-        "texture": [],
-        "size": []
+        "color": color,
+        "texture": texture,
+        "size": size
+    }
+    timings = {
+        "color": round(color_time, 3),
+        "texture": round(texture_time, 3),
+        "size": round(size_time, 3)
+    }
+    bounded_by = max(timings, key=timings.get)
+    logger.info(f"⏱️  ML wall time: {timings} (bounded by {bounded_by})")
+    coalesced = {
+        "color": color_coalesced,
+        "texture": texture_coalesced,
+        "size": size_coalesced
     }
     
-    # Procesar imágenes de COLOR
-    if request.color_images:
-        logger.info("🎨 Processing COLOR predictions...")
-        for image_path in request.color_images:
-            try:
-                result = await ml_orchestrator.color_client.predict(image_path)
-                if result:
-                    # Agregar timestamp
-                    result["timestamp"] = time.time()
-                    predictions["color"].append(result)
-            except Exception as e:
-                logger.error(f"Error processing color {image_path}: {e}")
-    
-    # Procesar imágenes de TEXTURE
-    if request.texture_images:
-        logger.info("🔲 Processing TEXTURE predictions...")
-        for image_path in request.texture_images:
-            try:
-                result = await ml_orchestrator.texture_client.predict(image_path)
-                if result:
-                    # Agregar timestamp
-                    result["timestamp"] = time.time()
-                    predictions["texture"].append(result)
-            except Exception as e:
-                logger.error(f"Error processing texture {image_path}: {e}")
-    
-    # Procesar imágenes de SIZE
-    if request.size_images:
-        logger.info("📏 Processing SIZE predictions...")
-        for image_path in request.size_images:
-            try:
-                result = await ml_orchestrator.size_client.predict(image_path)
-                if result:
-                    # Agregar timestamp
-                    result["timestamp"] = time.time()
-                    predictions["size"].append(result)
-            except Exception as e:
-                logger.error(f"Error processing size {image_path}: {e}")
-    
-    # Enviar a ThingsBoard - UN DISPOSITIVO POR MODELO
-    tb_results = await tb_client.send_predictions_batch(
-        color_token=settings.TB_PREDICTIONS_COLOR_TOKEN,
-        texture_token=settings.TB_PREDICTIONS_TEXTURE_TOKEN,
-        size_token=settings.TB_PREDICTIONS_SIZE_TOKEN,
-        color_predictions=predictions["color"],
-        texture_predictions=predictions["texture"],
-        size_predictions=predictions["size"]
-    )
+    # Agregados de calidad del batch y acumulados entre batches
+    columns = extract(predictions)
+    aggregates = batch_aggregates(columns)
+    rolling_aggregates.update(columns)
+    rolling = rolling_aggregates.snapshot()
+    
+    # Encolar para ThingsBoard - UN DISPOSITIVO POR MODELO
+    devices = {
+        "color": (settings.TB_PREDICTIONS_COLOR_TOKEN, "prediccion_color"),
+        "texture": (settings.TB_PREDICTIONS_TEXTURE_TOKEN, "prediccion_texture"),
+        "size": (settings.TB_PREDICTIONS_SIZE_TOKEN, "prediccion_size")
+    }
+    tb_results = {}
+    for kind, (token, proceso) in devices.items():
+        records = prediction_records(predictions[kind], proceso) if settings.TB_SEND_PREDICTIONS else []
+        queued = telemetry_queue.enqueue_many(token, records) if records else 0
+        tb_results[kind] = {"queued": queued, "rejected": len(records) - queued, "aggregates": 0}
+        # Un único registro con los agregados del batch
+        if predictions[kind] and token:
+            values = {"proceso": f"resumen_{kind}", **telemetry_values(kind, aggregates, rolling)}
+            tb_results[kind]["aggregates"] = int(telemetry_queue.enqueue(token, values))
     
-    success = any(tb_results.values())  # True si al menos uno tuvo éxito
+    # True si al menos un dispositivo tiene predicciones o agregados encolados
+    success = any(counts["queued"] > 0 or counts["aggregates"] for counts in tb_results.values())
     
     logger.info("")
     logger.info("📊 ThingsBoard Results:")
-    logger.info(f"   Color sent: {tb_results['color']}")
-    logger.info(f"   Texture sent: {tb_results['texture']}")
-    logger.info(f"   Size sent: {tb_results['size']}")
+    for kind, counts in tb_results.items():
+        logger.info(f"   {kind.capitalize()}: {counts['queued']} queued, {counts['rejected']} rejected")
     
-    # Emitir evento al dashboard
-    await ws_emitter.emit_event("predictions", {
+    # Emitir evento al dashboard (en segundo plano)
+    ws_emitter.enqueue("predictions", {
         "color_count": len(predictions["color"]),
         "texture_count": len(predictions["texture"]),
         "size_count": len(predictions["size"]),
         "timestamp": time.time(),
         "thingsboard": tb_results,
+        "aggregates": aggregates,
+        "rolling": rolling,
         "sample_predictions": {
             "color": predictions["color"][:3] if predictions["color"] else [],
             "texture": predictions["texture"][:3] if predictions["texture"] else [],
@@ -170,10 +388,109 @@ async def predict_batch(request: PredictBatchRequest):
         texture_processed=len(predictions["texture"]),
         size_processed=len(predictions["size"]),
         success=success,
-        predictions=predictions,
-        timestamp=time.time()
+        mode=mode,
+        predictions=shape_predictions(predictions, mode),
+        aggregates={
+            model: {**summarize(rows), **aggregates[model]} for model, rows in predictions.items()
+        } if mode == "summary" else None,
+        timestamp=time.time(),
+        timings={**timings, "total": round(elapsed, 3)},
+        thingsboard=tb_results,
+        coalesced=coalesced
+    )
+
+@app.post("/predict-batch", response_model=PredictBatchResponse)
+async def predict_batch(request: PredictBatchRequest, http_request: Request, mode: ResponseMode = "full"):
+    """
+    Procesa un batch y responde cuando termina (modo síncrono).
+    
+    mode=summary devuelve solo conteos, tiempos y agregados; mode=columnar,
+    un array por campo en lugar de una lista de dicts. Las imágenes pueden
+    llegar como manifiestos (color_manifest, ...) en lugar de rutas.
+    """
+    manifests = resolve_manifests(request)
+    return await process_batch(request, deadline=request_deadline(http_request), mode=mode, manifests=manifests)
+
+@app.post("/jobs", response_model=JobAccepted, status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(request: PredictBatchRequest, http_request: Request, mode: ResponseMode = "full"):
+    """
+    Acepta un batch como job en segundo plano y devuelve su id sin esperar.
+    
+    El progreso se consulta en GET /jobs/{job_id} o se recibe como NDJSON en
+    GET /jobs/{job_id}/stream; cada imagen terminada se emite también al
+    dashboard como evento "prediction". mode elige el formato del resumen
+    final, como en /predict-batch.
+    """
+    manifests = resolve_manifests(request)
+    total_images = len(request.color_images) + len(request.texture_images) + len(request.size_images)
+    deadline = request_deadline(http_request)
+    
+    async def run(job: Job) -> Dict[str, Any]:
+        left = remaining(deadline)
+        if left is not None and left <= 0:
+            # Venció mientras esperaba turno: ya no le sirve a nadie
+            raise DeadlineExceeded("deadline passed while the job was queued")
+        
+        async def on_result(model: str, index: int, image_path: str, result: Optional[Dict[str, Any]]):
+            event = {
+                "model": model,
+                "index": index,
+                "image_path": image_path,
+                "result": result,
+                "error": None if result else "prediction failed"
+            }
+            job.add_event(event)
+            # El envío al dashboard no frena el siguiente chunk de predicciones
+            ws_emitter.enqueue("prediction", {"job_id": job.id, **event})
+        
+        response = await process_batch(request, on_result, deadline, mode, manifests)
+        return response.model_dump()
+    
+    try:
+        job = job_manager.submit(total_images, run)
+    except JobQueueFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Job queue full: {e}",
+            headers={"Retry-After": "5"}
+        )
+    
+    logger.info(f"📥 Job {job.id} accepted ({total_images} images)")
+    return JobAccepted(
+        job_id=job.id,
+        status=job.status,
+        total_images=total_images,
+        status_url=f"/jobs/{job.id}",
+        stream_url=f"/jobs/{job.id}/stream"
     )
 
+def get_job_or_404(job_id: str) -> Job:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, offset: int = 0):
+    """
+    Estado del job y resultados a partir de offset (para sondeo incremental).
+    """
+    return get_job_or_404(job_id).as_dict(max(0, offset))
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str, offset: int = 0):
+    """
+    Resultados del job como NDJSON, una línea por imagen en cuanto termina,
+    y una línea final "end" con el resumen.
+    """
+    job = get_job_or_404(job_id)
+    
+    async def lines():
+        async for event in job_manager.stream(job, max(0, offset)):
+            yield orjson.dumps(event) + b"\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host=settings.HOST, port=settings.PORT)
\ No newline at end of file
@@ -0,0 +1,202 @@
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Cuantiles de probabilidad de quemado que se reportan
+QUANTILES = (0.5, 0.9, 0.99)
+# Bins en [0, 1] del histograma de texture_score
+TEXTURE_BINS = 10
+# Bins en [0, 1] del histograma de probabilidad (cuantiles acumulados)
+PROBABILITY_BINS = 100
+
+_PROBABILITY_EDGES = np.linspace(0.0, 1.0, PROBABILITY_BINS + 1)
+
+
+def _column(rows: List[Dict[str, Any]], field: str) -> np.ndarray:
+    return np.fromiter(
+        (row[field] for row in rows if row.get(field) is not None),
+        dtype=np.float64
+    )
+
+
+def extract(predictions: Dict[str, List[Dict[str, Any]]]) -> Dict[str, np.ndarray]:
+    """
+    Columnas numéricas de las predicciones de un batch que entran en los
+    agregados.
+    """
+    color = predictions.get("color", [])
+    size = predictions.get("size", [])
+    return {
+        "prediction": _column(color, "prediction"),
+        "probability": _column(color, "probability"),
+        "texture_score": _column(predictions.get("texture", []), "texture_score"),
+        "width_mm": _column(size, "width_mm"),
+        "height_mm": _column(size, "height_mm"),
+    }
+
+
+def _describe(values: np.ndarray) -> Dict[str, float]:
+    if not values.size:
+        return {}
+    return {
+        "mean": round(float(values.mean()), 3),
+        "std": round(float(values.std()), 3),
+        "min": round(float(values.min()), 3),
+        "max": round(float(values.max()), 3),
+    }
+
+
+def texture_histogram(scores: np.ndarray) -> np.ndarray:
+    counts, _ = np.histogram(np.clip(scores, 0.0, 1.0), bins=TEXTURE_BINS, range=(0.0, 1.0))
+    return counts
+
+
+def batch_aggregates(columns: Dict[str, np.ndarray]) -> Dict[str, Dict[str, Any]]:
+    """
+    Agregados de calidad de un batch, por modelo:
+        color: ratio de quemados y cuantiles de probabilidad
+        texture: histograma de texture_score en [0, 1]
+        size: media, desviación, mínimo y máximo de ancho y alto
+    """
+    prediction, probability = columns["prediction"], columns["probability"]
+    scores = columns["texture_score"]
+    color: Dict[str, Any] = {"count": int(prediction.size)}
+    if prediction.size:
+        color["burnt_ratio"] = round(float(np.mean(prediction == 1)), 4)
+    if probability.size:
+        color["probability_quantiles"] = {
+            f"p{int(q * 100)}": round(float(value), 4)
+            for q, value in zip(QUANTILES, np.quantile(probability, QUANTILES))
+        }
+
+    return {
+        "color": color,
+        "texture": {
+            "count": int(scores.size),
+            "histogram": texture_histogram(scores).tolist(),
+        },
+        "size": {
+            "count": int(columns["width_mm"].size),
+            "width_mm": _describe(columns["width_mm"]),
+            "height_mm": _describe(columns["height_mm"]),
+        },
+    }
+
+
+class _Moments:
+    """
+    Suma ponderada, suma de cuadrados, mínimo y máximo de una serie.
+    """
+    def __init__(self):
+        self.weight = 0.0
+        self.total = 0.0
+        self.squares = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def update(self, values: np.ndarray, decay: float):
+        self.weight = self.weight * decay + values.size
+        self.total = self.total * decay + float(values.sum())
+        self.squares = self.squares * decay + float(np.dot(values, values))
+        if values.size:
+            self.min = min(self.min, float(values.min()))
+            self.max = max(self.max, float(values.max()))
+
+    def as_dict(self) -> Dict[str, float]:
+        if not self.weight:
+            return {}
+        mean = self.total / self.weight
+        return {
+            "mean": round(mean, 3),
+            "std": round(max(0.0, self.squares / self.weight - mean * mean) ** 0.5, 3),
+            "min": round(self.min, 3),
+            "max": round(self.max, 3),
+        }
+
+
+class RollingAggregates:
+    """
+    Agregados acumulados entre batches en memoria constante.
+
+    Conteos, histogramas y sumas se multiplican por un factor de decaimiento
+    antes de sumar cada batch, así los batches de hace half_life pesan la
+    mitad (half_life=0: acumulado sin decaimiento). Los cuantiles salen de un
+    histograma de probabilidad de PROBABILITY_BINS bins; mínimos y máximos
+    son desde el arranque.
+    """
+    def __init__(self, half_life: float = 20.0):
+        self.half_life = half_life
+        self.decay = 0.5 ** (1.0 / half_life) if half_life > 0 else 1.0
+        self.batches = 0
+        self.color_weight = 0.0
+        self.burnt_weight = 0.0
+        self.probability_histogram = np.zeros(PROBABILITY_BINS)
+        self.texture_histogram = np.zeros(TEXTURE_BINS)
+        self.width = _Moments()
+        self.height = _Moments()
+
+    def update(self, columns: Dict[str, np.ndarray]):
+        decay = self.decay
+        self.batches += 1
+        self.color_weight = self.color_weight * decay + columns["prediction"].size
+        self.burnt_weight = self.burnt_weight * decay + float(np.sum(columns["prediction"] == 1))
+        counts, _ = np.histogram(np.clip(columns["probability"], 0.0, 1.0), bins=_PROBABILITY_EDGES)
+        self.probability_histogram = self.probability_histogram * decay + counts
+        self.texture_histogram = self.texture_histogram * decay + texture_histogram(columns["texture_score"])
+        self.width.update(columns["width_mm"], decay)
+        self.height.update(columns["height_mm"], decay)
+
+    def _probability_quantiles(self) -> Dict[str, float]:
+        total = self.probability_histogram.sum()
+        if not total:
+            return {}
+        cumulative = np.cumsum(self.probability_histogram) / total
+        # Borde superior del primer bin que alcanza cada cuantil
+        bins = np.searchsorted(cumulative, QUANTILES)
+        return {
+            f"p{int(q * 100)}": round(float(_PROBABILITY_EDGES[min(b + 1, PROBABILITY_BINS)]), 4)
+            for q, b in zip(QUANTILES, bins)
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        color: Dict[str, Any] = {}
+        if self.color_weight:
+            color["burnt_ratio"] = round(self.burnt_weight / self.color_weight, 4)
+        quantiles = self._probability_quantiles()
+        if quantiles:
+            color["probability_quantiles"] = quantiles
+        texture_total = self.texture_histogram.sum()
+        return {
+            "batches": self.batches,
+            "half_life": self.half_life,
+            "color": color,
+            "texture": {
+                # Fracción de imágenes por bin
+                "histogram": (self.texture_histogram / texture_total).round(4).tolist() if texture_total else [],
+            },
+            "size": {
+                "width_mm": self.width.as_dict(),
+                "height_mm": self.height.as_dict(),
+            },
+        }
+
+
+def telemetry_values(model: str, batch: Dict[str, Any], rolling: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Aplana los agregados de un modelo en claves de telemetría de ThingsBoard
+    (p. ej. probability_quantiles_p90, histogram_3, rolling_width_mm_mean).
+    """
+    def flatten(prefix: str, value: Any, out: Dict[str, Any]):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                flatten(f"{prefix}_{key}" if prefix else key, item, out)
+        elif isinstance(value, list):
+            for i, item in enumerate(value):
+                flatten(f"{prefix}_{i}", item, out)
+        else:
+            out[prefix] = value
+
+    values: Dict[str, Any] = {}
+    flatten("", batch[model], values)
+    flatten("rolling", rolling[model], values)
+    return values
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import random
+import socket
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+# Políticas de elección de réplica
+POLICIES = ("least_outstanding", "p2c")
+
+# Peso de la última muestra en la media móvil de latencia
+_EWMA_ALPHA = 0.2
+
+
+class Replica:
+    """
+    Una instancia de un servicio ML y sus métricas.
+    """
+    def __init__(self, url: str, source: str = ""):
+        self.url = url.rstrip('/')
+        # URL configurada de la que sale (distinta de url si se resolvió por DNS)
+        self.source = source or self.url
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.latency_ewma = 0.0
+
+    def available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def as_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.available(now),
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+            "ejected_for_s": round(max(0.0, self.ejected_until - now), 1),
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1),
+        }
+
+
+class ReplicaSet:
+    """
+    Réplicas de un servicio ML con balanceo y health check pasivo.
+
+    Cada petición va a la réplica con menos peticiones en curso
+    ("least_outstanding") o a la mejor de dos elegidas al azar ("p2c").
+    Tras failure_threshold fallos seguidos (error de conexión o 5xx) una
+    réplica se expulsa durante cooldown segundos y después vuelve a recibir
+    tráfico; si falla de nuevo se expulsa otra vez. Si todas están
+    expulsadas se usa la que antes vuelve, para no cortar el servicio.
+
+    Con resolve_dns, cada URL configurada se expande a una réplica por
+    dirección IP de su hostname (p. ej. tras docker compose --scale) y se
+    vuelve a resolver cada resolve_interval segundos.
+    """
+    def __init__(
+        self,
+        urls: List[str],
+        policy: str = "least_outstanding",
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        resolve_dns: bool = False,
+        resolve_interval: float = 30.0
+    ):
+        if not urls:
+            raise ValueError("At least one replica URL is required")
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown balancing policy: {policy} (expected one of {POLICIES})")
+
+        self.urls = [url.rstrip('/') for url in urls]
+        self.policy = policy
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.resolve_dns = resolve_dns
+        self.resolve_interval = resolve_interval
+        self.replicas: List[Replica] = [Replica(url) for url in self.urls]
+        self._resolved_at = 0.0
+
+    async def refresh(self):
+        """
+        Vuelve a resolver los hostnames si toca, conservando las métricas de
+        las réplicas que siguen existiendo.
+        """
+        if not self.resolve_dns or time.monotonic() - self._resolved_at < self.resolve_interval:
+            return
+        self._resolved_at = time.monotonic()
+
+        loop = asyncio.get_running_loop()
+        current = {replica.url: replica for replica in self.replicas}
+        replicas = []
+        for source in self.urls:
+            parts = urlsplit(source)
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+            try:
+                infos = await loop.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+            except OSError as e:
+                logger.warning(f"⚠️  Could not resolve {parts.hostname}: {e}")
+                replicas.extend(r for r in self.replicas if r.source == source)
+                continue
+
+            for address in sorted({info[4][0] for info in infos}):
+                host = f"[{address}]" if ":" in address else address
+                url = urlunsplit((parts.scheme, f"{host}:{port}", parts.path, "", "")).rstrip('/')
+                replicas.append(current.get(url) or Replica(url, source))
+
+        if replicas and {r.url for r in replicas} != set(current):
+            logger.info(f"🔁 Replicas updated: {[r.url for r in replicas]}")
+        self.replicas = replicas or self.replicas
+
+    def pick(self, exclude: Optional[Replica] = None) -> Replica:
+        now = time.monotonic()
+        candidates = [r for r in self.replicas if r is not exclude] or self.replicas
+        healthy = [r for r in candidates if r.available(now)]
+        if not healthy:
+            return min(candidates, key=lambda r: r.ejected_until)
+
+        if self.policy == "p2c" and len(healthy) > 2:
+            healthy = random.sample(healthy, 2)
+        # Desempate por latencia, y al azar entre réplicas equivalentes
+        return min(healthy, key=lambda r: (r.outstanding, r.latency_ewma, random.random()))
+
+    @asynccontextmanager
+    async def acquire(self, exclude: Optional[Replica] = None) -> AsyncIterator[Replica]:
+        replica = self.pick(exclude)
+        replica.outstanding += 1
+        replica.requests += 1
+        try:
+            yield replica
+        finally:
+            replica.outstanding -= 1
+
+    def record(self, replica: Replica, ok: bool, latency: float = 0.0):
+        """
+        Registra el resultado de una petición (health check pasivo).
+        """
+        if ok:
+            replica.consecutive_failures = 0
+            replica.latency_ewma = latency if replica.latency_ewma == 0 else \
+                _EWMA_ALPHA * latency + (1 - _EWMA_ALPHA) * replica.latency_ewma
+            return
+
+        replica.failures += 1
+        replica.consecutive_failures += 1
+        if replica.consecutive_failures >= self.failure_threshold:
+            replica.ejected_until = time.monotonic() + self.cooldown
+            replica.ejections += 1
+            # Al volver, un solo fallo más la expulsa de nuevo
+            replica.consecutive_failures = self.failure_threshold - 1
+            logger.warning(f"🚫 Replica {replica.url} ejected for {self.cooldown:.0f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "policy": self.policy,
+            "replicas": [replica.as_dict(now) for replica in self.replicas],
+        }
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ("queued", "running", "completed", "failed", "cancelled")
+
+
+class JobQueueFull(Exception):
+    """
+    Hay demasiados jobs esperando turno.
+    """
+
+
+class Job:
+    """
+    Un batch de predicción ejecutado en segundo plano.
+
+    Los resultados parciales se acumulan en events a medida que terminan las
+    imágenes; los lectores esperan nuevos eventos con wait_for_events.
+    """
+    def __init__(self, total_images: int):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.total_images = total_images
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.events: List[Dict[str, Any]] = []
+        self.summary: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    def add_event(self, event: Dict[str, Any]):
+        self.events.append(event)
+        self._notify()
+
+    def _notify(self):
+        # Despierta a los lectores actuales y prepara el evento para los siguientes
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_for_events(self, offset: int, timeout: float):
+        """
+        Espera a que haya eventos a partir de offset o a que el job termine.
+        """
+        if offset < len(self.events) or self.done:
+            return
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def as_dict(self, offset: int = 0) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total_images": self.total_images,
+            "completed_images": len(self.events),
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+            "offset": offset,
+            "results": self.events[offset:],
+            "summary": self.summary,
+        }
+
+
+class JobManager:
+    """
+    Ejecuta jobs de predicción en segundo plano con concurrencia acotada.
+
+    Como mucho max_running jobs se ejecutan a la vez; el resto espera en cola
+    hasta max_queued (más allá se rechazan con JobQueueFull). Los jobs
+    terminados se conservan para consulta hasta retention jobs o ttl
+    segundos.
+    """
+    def __init__(self, max_running: int = 2, max_queued: int = 20, retention: int = 100, ttl: float = 3600.0):
+        self.max_running = max(1, max_running)
+        self.max_queued = max(0, max_queued)
+        self.retention = max(1, retention)
+        self.ttl = ttl
+        self._semaphore = asyncio.Semaphore(self.max_running)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+        # Métricas
+        self.submitted = 0
+        self.rejected = 0
+
+    def _counts(self) -> Dict[str, int]:
+        counts = {state: 0 for state in JOB_STATES}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return counts
+
+    def _prune(self):
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.done]
+        excess = len(finished) - self.retention
+        for job in finished:
+            if excess > 0 or now - job.finished > self.ttl:
+                del self._jobs[job.id]
+                excess -= 1
+
+    def submit(self, total_images: int, run: Callable[[Job], Awaitable[Dict[str, Any]]]) -> Job:
+        """
+        Registra un job y lo lanza en segundo plano.
+
+        Args:
+            total_images: Imágenes del batch (para reportar progreso)
+            run: Corrutina que procesa el job y devuelve el resumen final
+
+        Raises:
+            JobQueueFull: Si ya hay max_queued jobs esperando turno
+        """
+        self._prune()
+        if self._counts()["queued"] >= self.max_queued:
+            self.rejected += 1
+            raise JobQueueFull(f"{self.max_queued} jobs already queued")
+
+        job = Job(total_images)
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._execute(job, run))
+        self.submitted += 1
+        return job
+
+    async def _execute(self, job: Job, run: Callable[[Job], Awaitable[Dict[str, Any]]]):
+        try:
+            async with self._semaphore:
+                job.status = "running"
+                job.started = time.time()
+                job._notify()
+                logger.info(f"🚀 Job {job.id} started ({job.total_images} images)")
+                job.summary = await run(job)
+                job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            logger.error(f"❌ Job {job.id} failed: {e}", exc_info=True)
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished = time.time()
+            job._notify()
+            logger.info(f"🏁 Job {job.id} {job.status} ({len(job.events)}/{job.total_images} results)")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def stream(self, job: Job, offset: int = 0, heartbeat: float = 15.0) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Emite los eventos del job desde offset a medida que llegan y, al
+        terminar, una línea final con el estado y el resumen.
+        """
+        while True:
+            while offset < len(job.events):
+                yield {"type": "result", **job.events[offset]}
+                offset += 1
+            if job.done:
+                break
+            await job.wait_for_events(offset, heartbeat)
+            if offset == len(job.events) and not job.done:
+                # Mantiene viva la conexión en batches lentos
+                yield {"type": "heartbeat", "completed_images": offset}
+
+        yield {
+            "type": "end",
+            "job_id": job.id,
+            "status": job.status,
+            "error": job.error,
+            "summary": job.summary,
+        }
+
+    async def close(self):
+        tasks = [job.task for job in self._jobs.values() if job.task and not job.done]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.info(f"Cancelled {len(tasks)} unfinished jobs")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_running": self.max_running,
+            "max_queued": self.max_queued,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            **self._counts(),
+        }
@@ -1,39 +1,403 @@
 import httpx
 import logging
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple
 import asyncio
+from services.http_pool import HTTPClientPool
+from services.balancer import Replica, ReplicaSet
+from services.manifest import ManifestSelection
+from services.resilience import (
+    DEADLINE_EXCEEDED_HEADER, DEADLINE_HEADER, CircuitBreaker, CircuitOpen,
+    DeadlineExceeded, LatencyTracker, remaining
+)
 
 logger = logging.getLogger(__name__)
 
+# Tiempo tras el que se vuelve a probar /predict-batch en un servicio sin soporte
+BATCH_REPROBE_SECONDS = 300.0
+
+
+class AdaptiveChunkSizer:
+    """
+    Tamaño de chunk por servicio ajustado con AIMD sobre la latencia.
+
+    Mientras las peticiones terminan por debajo de target_latency el chunk
+    crece de increase en increase; si una petición la supera o falla, se
+    multiplica por decrease. Así converge al mayor chunk que cumple la
+    latencia objetivo sin ajustarlo a mano para cada modelo.
+    """
+    def __init__(
+        self,
+        initial: int = 8,
+        min_size: int = 1,
+        max_size: int = 64,
+        target_latency: float = 1.0,
+        increase: int = 2,
+        decrease: float = 0.5
+    ):
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.target_latency = target_latency
+        self.increase = max(1, increase)
+        self.decrease = decrease
+        self._size = float(min(max(initial, self.min_size), self.max_size))
+
+        # Métricas
+        self.increases = 0
+        self.decreases = 0
+        self.last_latency = 0.0
+        self.images = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def size(self) -> int:
+        return int(self._size)
+
+    def observe(self, latency: float, count: int, ok: bool = True):
+        """
+        Registra una petición de count imágenes y ajusta el tamaño.
+        """
+        self.last_latency = latency
+        if ok:
+            self.images += count
+            self.busy_seconds += latency
+
+        if ok and latency <= self.target_latency:
+            # Solo crece si el chunk estaba lleno: uno corto no prueba el tamaño actual
+            if count >= self.size:
+                self._size = min(self.max_size, self._size + self.increase)
+                self.increases += 1
+        else:
+            self._size = max(self.min_size, self._size * self.decrease)
+            self.decreases += 1
+
+    def cap(self, max_size: int):
+        """
+        Limita el tamaño máximo (p. ej. tras un 413 del servicio).
+        """
+        self.max_size = max(self.min_size, max_size)
+        self._size = min(self._size, self.max_size)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "chunk_size": self.size,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "target_latency_ms": round(self.target_latency * 1000, 1),
+            "last_latency_ms": round(self.last_latency * 1000, 1),
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "images_per_second": round(self.images / self.busy_seconds, 2) if self.busy_seconds else 0.0,
+        }
+
+
+def is_service_failure(response: httpx.Response) -> bool:
+    """
+    Respuestas que indican una réplica caída o sin modelo. Un 503 con
+    Retry-After es solo saturación y un 504 marcado como deadline vencido es
+    trabajo descartado a propósito.
+    """
+    code = response.status_code
+    if code == 502:
+        return True
+    if code == 503:
+        return "Retry-After" not in response.headers
+    if code == 504:
+        return DEADLINE_EXCEEDED_HEADER not in response.headers
+    return False
+
+
 class MLClient:
-    def __init__(self, service_name: str, service_url: str, timeout: float = 120.0):
+    def __init__(
+        self,
+        service_name: str,
+        replicas: ReplicaSet,
+        http_pool: HTTPClientPool,
+        pool_name: str,
+        batching: bool = True,
+        chunk_sizer: Optional[AdaptiveChunkSizer] = None,
+        batch_concurrency: int = 2,
+        timeout: float = 120.0,
+        breaker: Optional[CircuitBreaker] = None,
+        hedging: bool = False,
+        hedge_min_samples: int = 20,
+        hedge_budget: float = 0.1
+    ):
+        """
+        Args:
+            timeout: Timeout máximo por llamada; el deadline puede acortarlo
+            breaker: Circuit breaker del servicio
+            hedging: Repetir en otra réplica las llamadas que superan el p95
+            hedge_min_samples: Latencias observadas antes de empezar a repetir
+            hedge_budget: Fracción máxima de llamadas que se pueden repetir
+        """
         self.service_name = service_name
-        self.service_url = service_url.rstrip('/')
-        self.timeout = httpx.Timeout(timeout)
+        self.replicas = replicas
+        self.http_pool = http_pool
+        self.pool_name = pool_name
+        self.batching = batching
+        self.chunk_sizer = chunk_sizer or AdaptiveChunkSizer()
+        self.batch_concurrency = max(1, batch_concurrency)
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker(service_name)
+        self.hedging = hedging
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_budget = hedge_budget
+        self._latency: Dict[str, LatencyTracker] = {}
+        # Predicción en curso por imagen, compartida por las peticiones que la repiten
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        
+        # None = aún no se sabe si el servicio tiene /predict-batch
+        self.batch_supported: Optional[bool] = None
+        self._unsupported_since = 0.0
+        # None = aún no se sabe si el servicio resuelve manifiestos
+        self.manifest_supported: Optional[bool] = None
+        self._manifest_unsupported_since = 0.0
+        
+        # Métricas
+        self.calls = 0
+        self.expired = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.coalesced = 0
+        self.manifest_chunks = 0
+        self.manifest_fallbacks = 0
+    
+    def _use_manifests(self) -> bool:
+        if self.manifest_supported is False:
+            if time.monotonic() - self._manifest_unsupported_since < BATCH_REPROBE_SECONDS:
+                return False
+            self.manifest_supported = None
+        return True
+    
+    def _use_batches(self) -> bool:
+        if not self.batching:
+            return False
+        if self.batch_supported is False:
+            if time.monotonic() - self._unsupported_since < BATCH_REPROBE_SECONDS:
+                return False
+            self.batch_supported = None
+        return True
+    
+    def concurrency(self, max_in_flight: int) -> Tuple[int, str]:
+        """
+        Peticiones simultáneas de predict_many contra este servicio: chunks
+        (hasta batch_concurrency) o imágenes sueltas, nunca más de
+        max_in_flight.
+        
+        Returns:
+            (peticiones en curso, "chunks" o "requests")
+        """
+        if self._use_batches():
+            return min(self.batch_concurrency, max(1, max_in_flight)), "chunks"
+        return max(1, max_in_flight), "requests"
+    
+    def _hedge_delay(self, path: str) -> Optional[float]:
+        """
+        Segundos tras los que se repite la llamada en otra réplica, o None si
+        no se debe repetir.
+        """
+        if not self.hedging or len(self.replicas.replicas) < 2:
+            return None
+        tracker = self._latency.get(path)
+        if tracker is None or len(tracker) < self.hedge_min_samples:
+            return None
+        if self.hedges >= self.hedge_budget * self.calls:
+            return None
+        return tracker.quantile(0.95)
+    
+    async def _post(self, path: str, payload: Dict[str, Any], deadline: Optional[float] = None) -> httpx.Response:
+        """
+        Llama al servicio respetando el circuit breaker y el deadline.
+        
+        El timeout de la llamada es el menor entre self.timeout y lo que
+        queda hasta el deadline, que se propaga en el header X-Deadline.
+        
+        Raises:
+            CircuitOpen: Si el circuito está abierto
+            DeadlineExceeded: Si el deadline ya pasó
+            httpx.RequestError: Si la llamada falla
+        """
+        left = remaining(deadline)
+        if left is not None and left <= 0:
+            self.expired += 1
+            raise DeadlineExceeded(f"{self.service_name}: deadline passed before the call")
+        if not self.breaker.allow():
+            raise CircuitOpen(f"{self.service_name} circuit open")
+        
+        timeout = self.timeout if left is None else min(self.timeout, left)
+        headers = {DEADLINE_HEADER: f"{deadline:.3f}"} if deadline is not None else {}
+        self.calls += 1
+        
+        try:
+            response = await self._hedged(path, payload, timeout, headers)
+        except httpx.TimeoutException:
+            if timeout < self.timeout:
+                # Lo cortó el deadline, no el servicio
+                self.expired += 1
+                self.breaker.release()
+            else:
+                self.breaker.record_failure()
+            raise
+        except httpx.RequestError:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        
+        if is_service_failure(response):
+            self.breaker.record_failure()
+        elif response.status_code == 504:
+            self.expired += 1
+            self.breaker.release()
+        else:
+            self.breaker.record_success()
+        return response
+    
+    async def _hedged(self, path: str, payload: Dict[str, Any], timeout: float, headers: Dict[str, str]) -> httpx.Response:
+        """
+        Envía la llamada y, si tarda más que el p95 del endpoint, lanza una
+        segunda en otra réplica; gana la primera que responde.
+        """
+        delay = self._hedge_delay(path)
+        if delay is None or delay >= timeout:
+            return await self._send(path, payload, timeout, headers)
+        
+        picked: List[Replica] = []
+        first = asyncio.create_task(self._send(path, payload, timeout, headers, picked=picked))
+        tasks = [first]
+        # Todo lo que sigue a crear first va dentro del try: si cancelan al
+        # llamador, first no puede quedarse corriendo con su réplica ocupada
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            if done:
+                return first.result()
+            
+            self.hedges += 1
+            logger.info(f"⏩ {self.service_name} {path} slower than p95 ({delay * 1000:.0f} ms), hedging")
+            second = asyncio.create_task(self._send(
+                path, payload, timeout - delay, headers, exclude=picked[0] if picked else None
+            ))
+            tasks.append(second)
+            pending = {first, second}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    async def _send(
+        self,
+        path: str,
+        payload: Dict[str, Any],
+        timeout: float,
+        headers: Dict[str, str],
+        exclude: Optional[Replica] = None,
+        picked: Optional[List[Replica]] = None
+    ) -> httpx.Response:
+        """
+        Envía la petición a una réplica elegida por el balanceador y registra
+        el resultado para el health check pasivo. Si la conexión falla, se
+        reintenta una vez en otra réplica.
+        """
+        await self.replicas.refresh()
+        client = self.http_pool.get(self.pool_name)
+        
+        for attempt in range(2):
+            async with self.replicas.acquire(exclude=exclude) as replica:
+                if picked is not None:
+                    picked.append(replica)
+                start = time.perf_counter()
+                try:
+                    response = await client.post(
+                        f"{replica.url}{path}", json=payload, headers=headers, timeout=timeout
+                    )
+                except httpx.RequestError as e:
+                    # Un timeout recortado por el deadline no es culpa de la réplica
+                    if not (isinstance(e, httpx.TimeoutException) and timeout < self.timeout):
+                        self.replicas.record(replica, ok=False)
+                    if isinstance(e, httpx.ConnectError) and attempt == 0 and len(self.replicas.replicas) > 1:
+                        logger.warning(f"⚠️  {self.service_name} replica {replica.url} unreachable, retrying on another")
+                        exclude = replica
+                        continue
+                    raise
+                
+                latency = time.perf_counter() - start
+                if is_service_failure(response):
+                    self.replicas.record(replica, ok=False)
+                elif response.status_code < 500:
+                    self.replicas.record(replica, ok=True, latency=latency)
+                    self._latency.setdefault(path, LatencyTracker()).add(latency)
+                return response
+    
+    def _settle(self, image_path: str, future: asyncio.Future, result: Optional[Dict[str, Any]]):
+        """
+        Entrega el resultado a quien espera la misma imagen y la libera.
+        """
+        if self._in_flight.get(image_path) is future:
+            del self._in_flight[image_path]
+        if not future.done():
+            future.set_result(result)
     
-    async def predict(self, image_path: str) -> Optional[Dict[str, Any]]:
+    async def predict(self, image_path: str, deadline: Optional[float] = None) -> Optional[Dict[str, Any]]:
         """
         Llama al servicio ML para obtener una predicción.
         
+        Si la misma imagen ya está en curso contra este servicio, espera esa
+        llamada en lugar de repetirla (single-flight).
+        
         Args:
             image_path: Ruta a la imagen
+            deadline: Epoch límite para obtener el resultado
         
         Returns:
             Diccionario con la predicción o None si falla
         """
-        url = f"{self.service_url}/predict"
+        shared = self._in_flight.get(image_path)
+        if shared is not None:
+            self.coalesced += 1
+            result = await asyncio.shield(shared)
+            return dict(result) if result else None
+        
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[image_path] = future
+        result = None
+        try:
+            result = await self._request_prediction(image_path, deadline)
+            return result
+        finally:
+            self._settle(image_path, future, result)
+    
+    async def _request_prediction(self, image_path: str, deadline: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Una llamada a /predict, sin coalescing.
+        """
         payload = {"image_path": image_path}
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                logger.info(f"Calling {self.service_name} for {image_path}")
-                response = await client.post(url, json=payload)
-                response.raise_for_status()
-                
-                result = response.json()
-                logger.info(f"✅ {self.service_name} prediction: {result.get('estado', 'unknown')}")
-                return result
-                
+            logger.info(f"Calling {self.service_name} for {image_path}")
+            response = await self._post("/predict", payload, deadline)
+            response.raise_for_status()
+            
+            result = response.json()
+            # Agregar timestamp
+            result["timestamp"] = time.time()
+            logger.info(f"✅ {self.service_name} prediction: {result.get('estado', 'unknown')}")
+            return result
+            
+        except (CircuitOpen, DeadlineExceeded) as e:
+            logger.warning(f"⏭️  Skipping {image_path}: {e}")
+            return None
         except httpx.HTTPStatusError as e:
             logger.error(f"❌ {self.service_name} HTTP error: {e.response.status_code}")
             return None
@@ -43,13 +407,317 @@ class MLClient:
         except Exception as e:
             logger.error(f"❌ {self.service_name} unexpected error: {e}")
             return None
+    
+    async def predict_many(
+        self,
+        image_paths: List[str],
+        max_in_flight: int,
+        on_result: Optional[Callable[[int, str, Optional[Dict[str, Any]]], Awaitable[None]]] = None,
+        deadline: Optional[float] = None,
+        manifest: Optional[ManifestSelection] = None
+    ) -> Tuple[List[Optional[Dict[str, Any]]], int]:
+        """
+        Predice varias imágenes con hasta max_in_flight llamadas simultáneas.
+        
+        Las rutas repetidas dentro de image_paths, o que otra petición ya
+        tiene en curso contra este servicio, se piden una sola vez y
+        comparten el resultado.
+        
+        Args:
+            image_paths: Rutas a las imágenes
+            max_in_flight: Máximo de peticiones en curso contra este servicio
+            on_result: Corrutina llamada con (índice, ruta, resultado) en cuanto
+                termina cada imagen, en orden de finalización
+            deadline: Epoch límite; las imágenes pendientes al vencer fallan
+            manifest: Manifiesto del que salen las rutas; los chunks se envían
+                como manifiesto en lugar de como lista de rutas
+        
+        Returns:
+            (resultados en el mismo orden que image_paths (None si falla),
+            imágenes resueltas sin una llamada propia)
+        """
+        positions: Dict[str, List[int]] = {}
+        for index, image_path in enumerate(image_paths):
+            positions.setdefault(image_path, []).append(index)
+        
+        # Las imágenes que nadie tiene en curso se piden; el resto se espera
+        loop = asyncio.get_running_loop()
+        owned: Dict[str, asyncio.Future] = {}
+        joined: Dict[str, asyncio.Future] = {}
+        for image_path in positions:
+            if image_path in self._in_flight:
+                joined[image_path] = self._in_flight[image_path]
+            else:
+                owned[image_path] = self._in_flight[image_path] = loop.create_future()
+        
+        coalesced = len(image_paths) - len(owned)
+        self.coalesced += coalesced
+        if coalesced:
+            logger.info(f"🔗 {self.service_name}: {coalesced} duplicate images coalesced")
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(image_paths)
+        
+        async def deliver(image_path: str, result: Optional[Dict[str, Any]], shared: bool):
+            for n, index in enumerate(positions[image_path]):
+                # Cada posición recibe su propia copia del resultado
+                value = dict(result) if result and (shared or n) else result
+                results[index] = value
+                if on_result is not None:
+                    await on_result(index, image_path, value)
+        
+        async def relay(_: int, image_path: str, result: Optional[Dict[str, Any]]):
+            self._settle(image_path, owned[image_path], result)
+            await deliver(image_path, result, shared=False)
+        
+        async def wait(image_path: str, future: asyncio.Future):
+            await deliver(image_path, await asyncio.shield(future), shared=True)
+        
+        if self._use_batches():
+            requested = self._predict_chunked(list(owned), max_in_flight, relay, deadline, manifest)
+        else:
+            requested = self._predict_each(list(owned), max_in_flight, relay, deadline)
+        try:
+            await asyncio.gather(
+                requested,
+                *(wait(image_path, future) for image_path, future in joined.items())
+            )
+        finally:
+            # Quien espera una imagen que no llegó a responderse recibe None
+            for image_path, future in owned.items():
+                self._settle(image_path, future, None)
+        
+        return results, coalesced
+    
+    async def _predict_each(
+        self,
+        image_paths: List[str],
+        max_in_flight: int,
+        on_result: Optional[Callable[[int, str, Optional[Dict[str, Any]]], Awaitable[None]]] = None,
+        deadline: Optional[float] = None
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Una petición /predict por imagen.
+        """
+        semaphore = asyncio.Semaphore(max(1, max_in_flight))
+        
+        async def predict_one(index: int, image_path: str) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                result = await self._request_prediction(image_path, deadline)
+            if on_result is not None:
+                await on_result(index, image_path, result)
+            return result
+        
+        return await asyncio.gather(*(predict_one(i, path) for i, path in enumerate(image_paths)))
+    
+    async def predict_chunk(
+        self,
+        image_paths: List[str],
+        deadline: Optional[float] = None,
+        manifest: Optional[ManifestSelection] = None
+    ) -> Optional[List[Optional[Dict[str, Any]]]]:
+        """
+        Predice varias imágenes en una sola llamada a /predict-batch.
+        
+        Con manifest, las imágenes viajan como ids del índice publicado; si el
+        servicio no tiene esa versión (409) o no resuelve manifiestos (422,
+        501), la llamada se repite con las rutas.
+        
+        Returns:
+            Resultados en orden (None por imagen fallida), o None si el
+            servicio no tiene /predict-batch
+        
+        Raises:
+            httpx.HTTPError: Si la llamada falla
+            CircuitOpen, DeadlineExceeded: Si la llamada no se intenta
+        """
+        compact = manifest.manifest(image_paths) if manifest and self._use_manifests() else None
+        if compact is not None:
+            self.manifest_chunks += 1
+            response = await self._post("/predict-batch", {"manifest": compact}, deadline)
+            if response.status_code in (409, 422, 501):
+                self.manifest_fallbacks += 1
+                if response.status_code != 409:
+                    if self.manifest_supported is not False:
+                        logger.warning(f"⚠️  {self.service_name} does not resolve manifests, sending paths")
+                    self.manifest_supported = False
+                    self._manifest_unsupported_since = time.monotonic()
+                response = await self._post("/predict-batch", {"image_paths": image_paths}, deadline)
+            elif response.status_code < 400:
+                self.manifest_supported = True
+        else:
+            response = await self._post("/predict-batch", {"image_paths": image_paths}, deadline)
+        if response.status_code in (404, 405):
+            return None
+        response.raise_for_status()
+        
+        results = []
+        for item in response.json()["results"]:
+            if item.get("error") or item.get("result") is None:
+                logger.error(f"❌ {self.service_name} failed {item.get('image_path')}: {item.get('error')}")
+                results.append(None)
+            else:
+                results.append(item["result"])
+        return results
+    
+    async def _predict_chunked(
+        self,
+        image_paths: List[str],
+        max_in_flight: int,
+        on_result: Optional[Callable[[int, str, Optional[Dict[str, Any]]], Awaitable[None]]] = None,
+        deadline: Optional[float] = None,
+        manifest: Optional[ManifestSelection] = None
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Reparte las imágenes en chunks de tamaño adaptativo enviados a
+        /predict-batch, con hasta batch_concurrency chunks en curso (y no más
+        de max_in_flight). Si el servicio no tiene /predict-batch, sigue
+        imagen a imagen.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(image_paths)
+        answered = [False] * len(image_paths)
+        cursor = 0
+        fallback_from: Optional[int] = None
+        
+        async def worker():
+            nonlocal cursor, fallback_from
+            while cursor < len(image_paths) and fallback_from is None:
+                # El tamaño se lee al despachar, así cada chunk usa el último ajuste
+                start = cursor
+                cursor = min(len(image_paths), start + self.chunk_sizer.size)
+                indices = list(range(start, cursor))
+                chunk = [image_paths[i] for i in indices]
+                
+                began = time.perf_counter()
+                try:
+                    chunk_results = await self.predict_chunk(chunk, deadline, manifest)
+                except (CircuitOpen, DeadlineExceeded) as e:
+                    # No dice nada del tamaño del chunk
+                    logger.warning(f"⏭️  Skipping {len(chunk)} images: {e}")
+                    chunk_results = [None] * len(chunk)
+                except httpx.HTTPStatusError as e:
+                    code = e.response.status_code
+                    if code == 504 and DEADLINE_EXCEEDED_HEADER in e.response.headers:
+                        chunk_results = [None] * len(chunk)
+                    else:
+                        self.chunk_sizer.observe(time.perf_counter() - began, len(chunk), ok=False)
+                        if code == 413:
+                            self.chunk_sizer.cap(len(chunk) - 1)
+                        logger.warning(f"⚠️  {self.service_name} batch of {len(chunk)} failed: HTTP {code}")
+                        chunk_results = await self._predict_each(chunk, 1, deadline=deadline) \
+                            if code in (413, 503) else [None] * len(chunk)
+                except Exception as e:
+                    self.chunk_sizer.observe(time.perf_counter() - began, len(chunk), ok=False)
+                    logger.error(f"❌ {self.service_name} batch of {len(chunk)} failed: {e}")
+                    chunk_results = [None] * len(chunk)
+                else:
+                    if chunk_results is None:
+                        # Sin /predict-batch: el resto va imagen a imagen
+                        if self.batch_supported is not False:
+                            logger.warning(f"⚠️  {self.service_name} has no /predict-batch, using per-image calls")
+                        self.batch_supported = False
+                        self._unsupported_since = time.monotonic()
+                        fallback_from = start if fallback_from is None else min(fallback_from, start)
+                        return
+                    self.batch_supported = True
+                    self.chunk_sizer.observe(time.perf_counter() - began, len(chunk))
+                
+                now = time.time()
+                for i, result in zip(indices, chunk_results):
+                    if result:
+                        # Agregar timestamp
+                        result["timestamp"] = now
+                    results[i] = result
+                    answered[i] = True
+                    if on_result is not None:
+                        await on_result(i, image_paths[i], result)
+        
+        workers = min(self.batch_concurrency, max(1, max_in_flight))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        
+        if fallback_from is not None:
+            # Lo que no devolvió ningún chunk se pide imagen a imagen
+            missing = [i for i in range(fallback_from, len(image_paths)) if not answered[i]]
+            
+            async def relay(j: int, image_path: str, result: Optional[Dict[str, Any]]):
+                if on_result is not None:
+                    await on_result(missing[j], image_path, result)
+            
+            rest = await self._predict_each([image_paths[i] for i in missing], max_in_flight, relay, deadline)
+            for i, result in zip(missing, rest):
+                results[i] = result
+        
+        return results
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "circuit": self.breaker.stats(),
+            "calls": self.calls,
+            "expired": self.expired,
+            "hedging": self.hedging,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "coalesced": self.coalesced,
+            "manifest_supported": self.manifest_supported,
+            "manifest_chunks": self.manifest_chunks,
+            "manifest_fallbacks": self.manifest_fallbacks,
+            "p95_ms": {path: round(tracker.quantile(0.95) * 1000, 1) for path, tracker in self._latency.items()},
+            "batching": self.batching,
+            "batch_supported": self.batch_supported,
+            "batch_concurrency": self.batch_concurrency,
+            **self.chunk_sizer.stats(),
+            **self.replicas.stats()
+        }
 
 
 class MLOrchestrator:
-    def __init__(self, color_url: str, texture_url: str, size_url: str, timeout: float):
-        self.color_client = MLClient("ML-Color", color_url, timeout)
-        self.texture_client = MLClient("ML-Texture", texture_url, timeout)
-        self.size_client = MLClient("ML-Size", size_url, timeout)
+    def __init__(
+        self,
+        color_urls: List[str],
+        texture_urls: List[str],
+        size_urls: List[str],
+        http_pool: HTTPClientPool,
+        batching: bool = True,
+        batch_concurrency: int = 2,
+        chunk_options: Optional[Dict[str, Any]] = None,
+        replica_options: Optional[Dict[str, Any]] = None,
+        breaker_options: Optional[Dict[str, Any]] = None,
+        client_options: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Args:
+            color_urls, texture_urls, size_urls: Réplicas de cada servicio
+            batching: Usar /predict-batch de los servicios que lo tengan
+            batch_concurrency: Chunks en curso por servicio
+            chunk_options: Parámetros de AdaptiveChunkSizer (uno por servicio)
+            replica_options: Parámetros de ReplicaSet (uno por servicio)
+            breaker_options: Parámetros de CircuitBreaker (uno por servicio)
+            client_options: Resto de parámetros de MLClient (timeout, hedging...)
+        """
+        chunk_options = chunk_options or {}
+        replica_options = replica_options or {}
+        breaker_options = breaker_options or {}
+        client_options = client_options or {}
+        
+        def client(name: str, urls: List[str], pool_name: str) -> MLClient:
+            return MLClient(
+                name, ReplicaSet(urls, **replica_options), http_pool, pool_name,
+                batching=batching,
+                chunk_sizer=AdaptiveChunkSizer(**chunk_options),
+                batch_concurrency=batch_concurrency,
+                breaker=CircuitBreaker(name, **breaker_options),
+                **client_options
+            )
+        
+        self.color_client = client("ML-Color", color_urls, "ml-color")
+        self.texture_client = client("ML-Texture", texture_urls, "ml-texture")
+        self.size_client = client("ML-Size", size_urls, "ml-size")
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "color": self.color_client.stats(),
+            "texture": self.texture_client.stats(),
+            "size": self.size_client.stats()
+        }
     
     async def predict_all(self, image_path: str) -> Dict[str, Any]:
         """
@@ -0,0 +1,137 @@
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+# Instante límite (epoch en segundos) que viaja scheduler → orquestador → ML
+DEADLINE_HEADER = "X-Deadline"
+# Marca de los 504 de un servicio ML que descartó trabajo ya vencido
+DEADLINE_EXCEEDED_HEADER = "X-Deadline-Exceeded"
+
+
+class DeadlineExceeded(Exception):
+    """
+    El deadline de la petición ya pasó; no vale la pena llamar al servicio.
+    """
+
+
+class CircuitOpen(Exception):
+    """
+    El circuito del servicio está abierto: la llamada falla sin intentarse.
+    """
+
+
+def parse_deadline(value: Optional[str]) -> Optional[float]:
+    """
+    Lee el header de deadline; un valor ausente o inválido es "sin deadline".
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid {DEADLINE_HEADER} header: {value!r}")
+        return None
+
+
+def request_deadline(request: Request) -> Optional[float]:
+    return parse_deadline(request.headers.get(DEADLINE_HEADER))
+
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    """
+    Segundos que quedan hasta el deadline (None si no hay deadline).
+    """
+    return None if deadline is None else deadline - time.time()
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por servicio.
+
+    Tras failure_threshold fallos seguidos el circuito se abre y las llamadas
+    fallan al instante durante cooldown segundos. Después deja pasar una
+    única llamada de prueba (half-open): si va bien se cierra y si falla se
+    vuelve a abrir.
+    """
+    def __init__(self, name: str, failure_threshold: int = 5, cooldown: float = 15.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+        # Métricas
+        self.opens = 0
+        self.short_circuited = 0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+            logger.info(f"🔌 {self.name} circuit half-open, probing")
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.short_circuited += 1
+        return False
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info(f"✅ {self.name} circuit closed")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self._probe_in_flight = False
+        self.consecutive_failures += 1
+        if self.state == "half_open" or (
+            self.state == "closed" and self.consecutive_failures >= self.failure_threshold
+        ):
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.opens += 1
+            logger.warning(f"🚫 {self.name} circuit open for {self.cooldown:.0f}s")
+
+    def release(self):
+        """
+        Resultado que no dice nada de la salud del servicio (p. ej. deadline
+        vencido): solo libera la llamada de prueba.
+        """
+        self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opens": self.opens,
+            "short_circuited": self.short_circuited,
+        }
+
+
+class LatencyTracker:
+    """
+    Latencias recientes de un endpoint, para calcular su p95.
+    """
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def quantile(self, q: float) -> float:
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        return ordered[int(q * (len(ordered) - 1))]
@@ -0,0 +1,58 @@
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+# Formatos de respuesta de /predict-batch
+#   full: lista de predicciones por modelo (formato original)
+#   columnar: un array por campo en lugar de una lista de dicts
+#   summary: solo conteos, tiempos y agregados
+RESPONSE_MODES = ("full", "columnar", "summary")
+
+# Campos que no tiene sentido promediar
+_NON_NUMERIC_FIELDS = {"timestamp"}
+
+
+def to_columns(rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """
+    Convierte una lista de predicciones en un array por campo. Los campos
+    que falten en alguna fila quedan como None en su posición.
+    """
+    fields: Dict[str, None] = {}
+    for row in rows:
+        fields.update(dict.fromkeys(row))
+    return {field: [row.get(field) for row in rows] for field in fields}
+
+
+def summarize(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Agregados de las predicciones de un modelo: conteo por estado y media de
+    cada campo numérico.
+    """
+    totals: Dict[str, float] = {}
+    counts: Dict[str, int] = {}
+    for row in rows:
+        for field, value in row.items():
+            if field in _NON_NUMERIC_FIELDS or isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            totals[field] = totals.get(field, 0.0) + value
+            counts[field] = counts.get(field, 0) + 1
+
+    estados = Counter(row["estado"] for row in rows if "estado" in row)
+    return {
+        "count": len(rows),
+        "estados": dict(estados),
+        "mean": {field: round(total / counts[field], 4) for field, total in totals.items()},
+    }
+
+
+def shape_predictions(
+    predictions: Dict[str, List[Dict[str, Any]]],
+    mode: str
+) -> Optional[Dict[str, Any]]:
+    """
+    Predicciones por modelo en el formato pedido (None en modo summary).
+    """
+    if mode == "summary":
+        return None
+    if mode == "columnar":
+        return {model: to_columns(rows) for model, rows in predictions.items()}
+    return predictions
@@ -0,0 +1,417 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Limitador de peticiones por token bucket (rate peticiones/s, ráfagas
+    de hasta capacity).
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class SpillStore:
+    """
+    Registros desbordados a SQLite, en orden FIFO por token.
+    """
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS spill ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " token TEXT NOT NULL,"
+            " record TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS spill_token ON spill (token, id)")
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self._db.execute("SELECT token, COUNT(*) FROM spill GROUP BY token").fetchall())
+
+    def push(self, token: str, records: List[Dict[str, Any]]):
+        self._db.executemany(
+            "INSERT INTO spill (token, record) VALUES (?, ?)",
+            [(token, json.dumps(record)) for record in records]
+        )
+
+    def push_front(self, token: str, records: List[Dict[str, Any]]):
+        """
+        Guarda records delante de los ya desbordados (son anteriores a ellos).
+        """
+        if not records:
+            return
+        first = self._db.execute("SELECT COALESCE(MIN(id), 1) FROM spill").fetchone()[0]
+        start = first - len(records)
+        self._db.executemany(
+            "INSERT INTO spill (id, token, record) VALUES (?, ?, ?)",
+            [(start + i, token, json.dumps(record)) for i, record in enumerate(records)]
+        )
+
+    def pop(self, token: str, limit: int) -> List[Dict[str, Any]]:
+        rows = self._db.execute(
+            "SELECT id, record FROM spill WHERE token = ? ORDER BY id LIMIT ?", (token, limit)
+        ).fetchall()
+        if rows:
+            self._db.execute("DELETE FROM spill WHERE token = ? AND id <= ?", (token, rows[-1][0]))
+        return [json.loads(record) for _, record in rows]
+
+    def close(self):
+        self._db.close()
+
+
+class TelemetryQueue:
+    """
+    Cola write-behind de telemetría hacia ThingsBoard.
+
+    Los handlers solo encolan; una tarea de fondo agrupa los registros de
+    cada dispositivo en arrays {ts, values} y los envía cuando el lote llega a
+    batch_size o su registro más antiguo supera max_age segundos. Las
+    peticiones pasan por un token bucket y los fallos se reintentan con
+    backoff exponencial sin perder el orden. Cuando la cola en memoria de un
+    token se llena, los registros nuevos se desbordan a SQLite (si está
+    configurado) y vuelven a memoria a medida que hay sitio; al apagar, lo
+    que no se pudo enviar también se guarda ahí.
+    """
+
+    def __init__(
+        self,
+        tb_client,
+        max_queue_per_token: int = 1000,
+        batch_size: int = 100,
+        max_age: float = 1.0,
+        rate_limit: float = 10.0,
+        rate_burst: float = 20.0,
+        max_backoff: float = 60.0,
+        spill_path: Optional[str] = None,
+        drain_timeout: float = 5.0
+    ):
+        """
+        Args:
+            tb_client: ThingsBoardClient con post_telemetry(token, payload)
+            max_queue_per_token: Registros en memoria por dispositivo
+            batch_size: Registros máximos por petición
+            max_age: Segundos que un registro puede esperar a completar lote
+            rate_limit: Peticiones por segundo hacia ThingsBoard (0 = sin límite)
+            rate_burst: Ráfaga máxima del token bucket
+            max_backoff: Espera máxima entre reintentos (s)
+            spill_path: Archivo SQLite de desborde (None = descartar lo más antiguo)
+            drain_timeout: Segundos para vaciar la cola al apagar
+        """
+        self.tb_client = tb_client
+        self.max_queue_per_token = max(1, max_queue_per_token)
+        self.batch_size = max(1, batch_size)
+        self.max_age = max_age
+        self.max_backoff = max_backoff
+        self.drain_timeout = drain_timeout
+        self.bucket = TokenBucket(rate_limit, rate_burst)
+        self.spill_path = spill_path
+
+        # token -> deque de (instante de encolado, registro)
+        self._queues: Dict[str, Deque[Tuple[float, Dict[str, Any]]]] = {}
+        self._spilled: Dict[str, int] = {}
+        self._attempts: Dict[str, int] = {}
+        self._retry_at: Dict[str, float] = {}
+        self._spill: Optional[SpillStore] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        # Métricas
+        self.enqueued = 0
+        self.sent = 0
+        self.requests = 0
+        self.failed_requests = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.spilled_total = 0
+        self.unspilled_total = 0
+        self._flush_latency: Deque[float] = deque(maxlen=512)
+
+    async def start(self):
+        if self.spill_path:
+            self._spill = SpillStore(self.spill_path)
+            self._spilled = self._spill.counts()
+            pending = sum(self._spilled.values())
+            if pending:
+                logger.info(f"📂 Telemetry queue: {pending} spilled records pending from a previous run")
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"✅ Telemetry queue ready (batch={self.batch_size}, max_age={self.max_age}s, "
+            f"rate={self.bucket.rate}/s, spill={self.spill_path or 'off'})"
+        )
+
+    async def close(self):
+        """
+        Detiene el flusher, intenta vaciar la cola durante drain_timeout y
+        guarda el resto en el archivo de desborde.
+        """
+        self._closing = True
+        self._wakeup.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=self.drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("⚠️  Telemetry queue drain timed out")
+
+        # Lo que queda en memoria es anterior a lo ya desbordado: va delante
+        remaining = {token: [record for _, record in q] for token, q in self._queues.items() if q}
+        if self._spill is not None:
+            for token, records in remaining.items():
+                self._spill_front(token, records)
+            self._spill.close()
+            self._spill = None
+        elif remaining:
+            lost = sum(len(records) for records in remaining.values())
+            self.dropped += lost
+            logger.error(f"❌ Telemetry queue closed with {lost} unsent records (no spill file)")
+        self._queues.clear()
+
+    def enqueue(self, access_token: str, values: Dict[str, Any], ts: Optional[float] = None) -> bool:
+        """
+        Encola un registro de telemetría sin esperar a ThingsBoard.
+
+        Args:
+            access_token: Token del dispositivo
+            values: Valores de telemetría
+            ts: Epoch en segundos del registro (por defecto, ahora)
+
+        Returns:
+            False si el registro no se pudo encolar
+        """
+        ts = time.time() if ts is None else ts
+        return self.enqueue_many(access_token, [{"ts": int(ts * 1000), "values": values}]) == 1
+
+    def enqueue_many(self, access_token: str, records: List[Dict[str, Any]]) -> int:
+        """
+        Encola registros {"ts": ms, "values": {...}} de un dispositivo.
+
+        Returns:
+            Registros aceptados
+        """
+        if not access_token:
+            logger.warning(f"No ThingsBoard token, rejecting {len(records)} records")
+            self.rejected += len(records)
+            return 0
+        if self._closing:
+            self.rejected += len(records)
+            return 0
+
+        q = self._queues.setdefault(access_token, deque())
+        now = time.monotonic()
+        accepted = 0
+        overflow = []
+        for record in records:
+            # Con registros ya desbordados, los nuevos van detrás para no desordenar
+            if self._spilled.get(access_token) or len(q) >= self.max_queue_per_token:
+                overflow.append(record)
+            else:
+                q.append((now, record))
+            accepted += 1
+
+        if overflow:
+            if self._spill is not None:
+                self._spill_records(access_token, overflow)
+            else:
+                # Sin desborde se descarta lo más antiguo
+                for record in overflow:
+                    q.popleft()
+                    q.append((now, record))
+                self.dropped += len(overflow)
+                logger.warning(f"⚠️  Telemetry queue full, dropped {len(overflow)} oldest records")
+
+        self.enqueued += accepted
+        if len(q) >= self.batch_size:
+            self._wakeup.set()
+        return accepted
+
+    def _spill_records(self, token: str, records: List[Dict[str, Any]]):
+        self._spill.push(token, records)
+        self._spilled[token] = self._spilled.get(token, 0) + len(records)
+        self.spilled_total += len(records)
+
+    def _spill_front(self, token: str, records: List[Dict[str, Any]]):
+        self._spill.push_front(token, records)
+        self._spilled[token] = self._spilled.get(token, 0) + len(records)
+        self.spilled_total += len(records)
+
+    def _requeue(self, token: str, batch: List[Tuple[float, Dict[str, Any]]]):
+        """
+        Devuelve un lote fallido al frente de la cola, en su orden. Si
+        mientras tanto se llenó, lo que no cabe se desborda delante de lo ya
+        desbordado (o, sin desborde, se descarta lo más antiguo).
+        """
+        q = self._queues[token]
+        q.extendleft(reversed(batch))
+        overflow = len(q) - self.max_queue_per_token
+        if overflow <= 0:
+            return
+        if self._spill is not None:
+            tail = [q.pop() for _ in range(overflow)]
+            tail.reverse()
+            self._spill_front(token, [record for _, record in tail])
+        else:
+            for _ in range(overflow):
+                q.popleft()
+            self.dropped += overflow
+            logger.warning(f"⚠️  Telemetry queue full, dropped {overflow} oldest records")
+
+    def _unspill(self, token: str):
+        """
+        Devuelve a memoria registros desbordados si hay sitio en la cola.
+        """
+        if self._spill is None or not self._spilled.get(token):
+            return
+        q = self._queues.setdefault(token, deque())
+        room = self.max_queue_per_token - len(q)
+        if room <= 0:
+            return
+        records = self._spill.pop(token, room)
+        # Ya esperaron en disco: se envían sin esperar max_age
+        stamp = time.monotonic() - self.max_age
+        q.extend((stamp, record) for record in records)
+        self._spilled[token] -= len(records)
+        self.unspilled_total += len(records)
+
+    def _ready_tokens(self) -> Tuple[List[str], float]:
+        """
+        Returns:
+            (tokens con lote listo, segundos hasta el próximo lote)
+        """
+        now = time.monotonic()
+        ready = []
+        wait = self.max_age
+        for token in set(self._queues) | set(self._spilled):
+            self._unspill(token)
+            q = self._queues.get(token)
+            if not q:
+                continue
+            retry_at = self._retry_at.get(token, 0.0)
+            if now < retry_at and not self._closing:
+                wait = min(wait, retry_at - now)
+                continue
+            age = now - q[0][0]
+            if self._closing or len(q) >= self.batch_size or age >= self.max_age:
+                ready.append(token)
+            else:
+                wait = min(wait, self.max_age - age)
+        return ready, max(0.0, wait)
+
+    async def _run(self):
+        while True:
+            ready, wait = self._ready_tokens()
+            if ready:
+                results = await asyncio.gather(*(self._flush(token) for token in ready))
+                # Al apagar, se para en cuanto ThingsBoard falla
+                if self._closing and not all(results):
+                    return
+                continue
+            if self._closing:
+                return
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _flush(self, token: str) -> bool:
+        q = self._queues[token]
+        batch = [q.popleft() for _ in range(min(self.batch_size, len(q)))]
+        payload = [record for _, record in batch]
+
+        start = time.monotonic()
+        try:
+            await self.bucket.acquire()
+            self.requests += 1
+            await self.tb_client.post_telemetry(token, payload)
+        except asyncio.CancelledError:
+            # Cancelado al agotar drain_timeout: el lote vuelve a la cola
+            self._requeue(token, batch)
+            raise
+        except Exception as e:
+            self.failed_requests += 1
+            if isinstance(e, httpx.HTTPStatusError) and 400 <= e.response.status_code < 500 \
+                    and e.response.status_code not in (408, 429):
+                # El payload o el token son inválidos: reintentar no lo arregla
+                self.dropped += len(payload)
+                logger.error(f"❌ ThingsBoard rejected {len(payload)} records ({e.response.status_code}), dropping")
+                return True
+
+            # Devolver el lote al frente de la cola, en su orden
+            self._requeue(token, batch)
+            attempts = self._attempts.get(token, 0) + 1
+            self._attempts[token] = attempts
+            delay = min(self.max_backoff, 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+            if isinstance(e, httpx.HTTPStatusError):
+                retry_after = e.response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+            self._retry_at[token] = time.monotonic() + delay
+            reason = f"HTTP {e.response.status_code}" if isinstance(e, httpx.HTTPStatusError) else repr(e)
+            logger.warning(
+                f"⚠️  ThingsBoard telemetry failed ({reason}), retry #{attempts} in {delay:.1f}s "
+                f"({len(q)} queued)"
+            )
+            return False
+
+        self._flush_latency.append(time.monotonic() - start)
+        self.sent += len(payload)
+        self._attempts.pop(token, None)
+        self._retry_at.pop(token, None)
+        logger.debug(f"Telemetry flushed: {len(payload)} records")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._flush_latency)
+        return {
+            "queued": sum(len(q) for q in self._queues.values()),
+            "spilled_pending": sum(self._spilled.values()),
+            "depth_by_device": {
+                token[:6] + "…": len(q) + self._spilled.get(token, 0)
+                for token, q in self._queues.items()
+            },
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "requests": self.requests,
+            "failed_requests": self.failed_requests,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+            "spilled_total": self.spilled_total,
+            "unspilled_total": self.unspilled_total,
+            "flush_latency_ms": {
+                "avg": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+                "p95": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 2) if latencies else 0.0,
+                "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            },
+        }
@@ -1,13 +1,42 @@
-import httpx
 import logging
+import time
 from typing import Dict, Any, List
+from services.http_pool import HTTPClientPool
 
 logger = logging.getLogger(__name__)
 
+def prediction_records(predictions: List[Dict[str, Any]], proceso: str) -> List[Dict[str, Any]]:
+    """
+    Convierte predicciones en registros {ts, values} de ThingsBoard, usando
+    el timestamp de cada predicción.
+    """
+    now = time.time()
+    return [
+        {
+            "ts": int((pred.get("timestamp") or now) * 1000),
+            "values": {
+                "proceso": proceso,
+                "timestamp": pred.get("timestamp"),
+                **pred
+            }
+        }
+        for pred in predictions
+    ]
+
 class ThingsBoardClient:
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, http_pool: HTTPClientPool):
         self.base_url = base_url.rstrip('/')
-        self.timeout = httpx.Timeout(10.0)
+        self.http_pool = http_pool
+    
+    async def post_telemetry(self, access_token: str, payload: Any):
+        """
+        Envía telemetría (un objeto o un array de {ts, values}) y propaga
+        los errores HTTP para que el llamador decida si reintentar.
+        """
+        url = f"{self.base_url}/api/v1/{access_token}/telemetry"
+        client = self.http_pool.get("thingsboard")
+        response = await client.post(url, json=payload)
+        response.raise_for_status()
     
     async def send_telemetry(self, access_token: str, data: Dict[str, Any]) -> bool:
         """
@@ -23,76 +52,11 @@ class ThingsBoardClient:
         url = f"{self.base_url}/api/v1/{access_token}/telemetry"
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(url, json=data)
-                response.raise_for_status()
-                logger.info(f"✅ Telemetry sent to ThingsBoard")
-                return True
+            client = self.http_pool.get("thingsboard")
+            response = await client.post(url, json=data)
+            response.raise_for_status()
+            logger.info(f"✅ Telemetry sent to ThingsBoard")
+            return True
         except Exception as e:
             logger.error(f"❌ Error sending to ThingsBoard: {e}")
             return False
-    
-    async def send_predictions_batch(
-        self, 
-        color_token: str,
-        texture_token: str,
-        size_token: str,
-        color_predictions: List[Dict[str, Any]],
-        texture_predictions: List[Dict[str, Any]],
-        size_predictions: List[Dict[str, Any]]
-    ) -> Dict[str, bool]:
-        """
-        Envía predicciones a los 3 dispositivos de ThingsBoard correspondientes.
-        
-        Returns:
-            Diccionario con el estado de envío de cada tipo
-        """
-        results = {
-            "color": False,
-            "texture": False,
-            "size": False
-        }
-        
-        # Enviar predicciones de COLOR
-        if color_predictions and color_token:
-            logger.info(f"📤 Sending {len(color_predictions)} color predictions to ThingsBoard")
-            for pred in color_predictions:
-                data = {
-                    "proceso": "prediccion_color",
-                    "timestamp": pred.get("timestamp"),
-                    **pred
-                }
-                success = await self.send_telemetry(color_token, data)
-                if not success:
-                    logger.warning(f"Failed to send color prediction: {pred.get('image')}")
-            results["color"] = True
-        
-        # Enviar predicciones de TEXTURE
-        if texture_predictions and texture_token:
-            logger.info(f"📤 Sending {len(texture_predictions)} texture predictions to ThingsBoard")
-            for pred in texture_predictions:
-                data = {
-                    "proceso": "prediccion_texture",
-                    "timestamp": pred.get("timestamp"),
-                    **pred
-                }
-                success = await self.send_telemetry(texture_token, data)
-                if not success:
-                    logger.warning(f"Failed to send texture prediction: {pred.get('image')}")
-            results["texture"] = True
-        
-        # Enviar predicciones de SIZE
-        if size_predictions and size_token:
-            logger.info(f"📤 Sending {len(size_predictions)} size predictions to ThingsBoard")
-            for pred in size_predictions:
-                data = {
-                    "proceso": "prediccion_size",
-                    "timestamp": pred.get("timestamp"),
-                    **pred
-                }
-                success = await self.send_telemetry(size_token, data)
-                if not success:
-                    logger.warning(f"Failed to send size prediction: {pred.get('image')}")
-            results["size"] = True
-        
-        return results
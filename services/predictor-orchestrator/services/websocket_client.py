@@ -1,26 +1,111 @@
-import httpx
+import asyncio
 import logging
-from typing import Dict, Any
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+from services.http_pool import HTTPClientPool
 
 logger = logging.getLogger(__name__)
 
 class WebSocketEmitter:
-    def __init__(self, websocket_url: str):
+    """
+    Emite eventos al WebSocket Gateway.
+
+    emit_event espera a la petición; enqueue solo encola y un task de fondo
+    los envía en orden, para que un gateway lento o caído no frene las
+    predicciones. La cola guarda como mucho max_queue eventos: al llenarse
+    se descartan los más antiguos.
+    """
+    def __init__(
+        self,
+        websocket_url: str,
+        http_pool: HTTPClientPool,
+        max_queue: int = 1000,
+        drain_timeout: float = 5.0
+    ):
         self.websocket_url = websocket_url.rstrip('/')
-    
-    async def emit_event(self, event_type: str, data: Dict[str, Any]):
+        self.http_pool = http_pool
+        self.max_queue = max(1, max_queue)
+        self.drain_timeout = drain_timeout
+
+        self._queue: Deque[Tuple[str, Dict[str, Any]]] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        # Métricas
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    async def emit_event(self, event_type: str, data: Dict[str, Any]) -> bool:
         """
         Emite un evento al WebSocket Gateway.
         """
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                await client.post(
-                    f"{self.websocket_url}/emit",
-                    json={
-                        "event_type": event_type,
-                        "data": data
-                    }
-                )
-                logger.debug(f"Event emitted: {event_type}")
+            client = self.http_pool.get("websocket")
+            await client.post(
+                f"{self.websocket_url}/emit",
+                json={
+                    "event_type": event_type,
+                    "data": data
+                }
+            )
+            logger.debug(f"Event emitted: {event_type}")
+            return True
         except Exception as e:
             logger.warning(f"Could not emit event to WebSocket: {e}")
+            return False
+
+    def enqueue(self, event_type: str, data: Dict[str, Any]):
+        """
+        Encola un evento sin esperar a enviarlo.
+        """
+        if len(self._queue) >= self.max_queue:
+            self._queue.popleft()
+            self.dropped += 1
+        self._queue.append((event_type, data))
+        self.enqueued += 1
+        self._wakeup.set()
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """
+        Intenta enviar lo encolado durante drain_timeout; el resto se pierde.
+        """
+        self._closing = True
+        self._wakeup.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=self.drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("⚠️  WebSocket event queue drain timed out")
+            self._task = None
+        if self._queue:
+            self.dropped += len(self._queue)
+            logger.warning(f"⚠️  {len(self._queue)} WebSocket events not sent")
+            self._queue.clear()
+
+    async def _run(self):
+        while True:
+            while self._queue:
+                event_type, data = self._queue.popleft()
+                if await self.emit_event(event_type, data):
+                    self.sent += 1
+                else:
+                    self.failed += 1
+            if self._closing:
+                return
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self._queue),
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import time
+
+import httpx
+
+from services.telemetry_queue import TelemetryQueue
+from services.thingsboard import ThingsBoardClient
+
+TOKEN = "device-token"
+
+
+class ThingsBoardStandIn:
+    """
+    ThingsBoard local sobre httpx.MockTransport: registra cada petición de
+    telemetría y responde con lo que devuelva respond (200 por defecto).
+    """
+    def __init__(self, respond=None):
+        self.requests = []
+        self.respond = respond
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(self._handle))
+
+    async def _handle(self, request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        self.requests.append((time.monotonic(), payload))
+        if self.respond is not None:
+            response = await self.respond(len(self.requests))
+            if response is not None:
+                return response
+        return httpx.Response(200)
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        return self.client
+
+    @property
+    def delivered(self):
+        return [record["ts"] for _, payload in self.requests for record in payload]
+
+
+def make_queue(tb: ThingsBoardStandIn, **kwargs) -> TelemetryQueue:
+    kwargs.setdefault("rate_limit", 0)
+    return TelemetryQueue(ThingsBoardClient("http://tb.local", tb), **kwargs)
+
+
+def records(start: int, count: int):
+    return [{"ts": ts, "values": {"n": ts}} for ts in range(start, start + count)]
+
+
+async def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+
+def test_batches_by_size_and_drains_rest_on_close():
+    async def scenario():
+        tb = ThingsBoardStandIn()
+        queue = make_queue(tb, batch_size=3, max_age=30)
+        await queue.start()
+        queue.enqueue_many(TOKEN, records(0, 7))
+        await wait_for(lambda: len(tb.requests) == 2)
+        # El registro que no completa lote espera a max_age o al cierre
+        await asyncio.sleep(0.1)
+        assert len(tb.requests) == 2
+        await queue.close()
+        return tb
+
+    tb = asyncio.run(scenario())
+    assert [len(payload) for _, payload in tb.requests] == [3, 3, 1]
+    assert tb.delivered == list(range(7))
+
+
+def test_batches_by_age():
+    async def scenario():
+        tb = ThingsBoardStandIn()
+        queue = make_queue(tb, batch_size=100, max_age=0.2)
+        await queue.start()
+        started = time.monotonic()
+        queue.enqueue_many(TOKEN, records(0, 2))
+        await wait_for(lambda: tb.requests)
+        await queue.close()
+        return tb, tb.requests[0][0] - started
+
+    tb, waited = asyncio.run(scenario())
+    assert 0.15 <= waited < 1.0
+    assert [len(payload) for _, payload in tb.requests] == [2]
+
+
+def test_retry_honours_retry_after():
+    async def respond(n):
+        if n == 1:
+            return httpx.Response(503, headers={"Retry-After": "1"})
+
+    async def scenario():
+        tb = ThingsBoardStandIn(respond)
+        queue = make_queue(tb, batch_size=2, max_age=30)
+        await queue.start()
+        queue.enqueue_many(TOKEN, records(0, 2))
+        await wait_for(lambda: len(tb.requests) == 2)
+        await queue.close()
+        return tb, queue
+
+    tb, queue = asyncio.run(scenario())
+    assert tb.requests[1][0] - tb.requests[0][0] >= 1.0
+    assert tb.requests[0][1] == tb.requests[1][1]
+    assert queue.failed_requests == 1 and queue.sent == 2
+
+
+def test_client_error_drops_batch_without_retry():
+    async def respond(n):
+        return httpx.Response(400)
+
+    async def scenario():
+        tb = ThingsBoardStandIn(respond)
+        queue = make_queue(tb, batch_size=3, max_age=30)
+        await queue.start()
+        queue.enqueue_many(TOKEN, records(0, 3))
+        await wait_for(lambda: tb.requests)
+        await asyncio.sleep(0.2)
+        await queue.close()
+        return tb, queue
+
+    tb, queue = asyncio.run(scenario())
+    assert len(tb.requests) == 1
+    assert queue.dropped == 3 and queue.sent == 0
+
+
+def test_spills_when_full_and_replays_in_order(tmp_path):
+    async def scenario():
+        tb = ThingsBoardStandIn()
+        queue = make_queue(tb, max_queue_per_token=5, batch_size=5, max_age=30, spill_path=str(tmp_path / "spill.sqlite"))
+        await queue.start()
+        queue.enqueue_many(TOKEN, records(0, 20))
+        assert queue.stats()["queued"] == 5
+        assert queue.stats()["spilled_pending"] == 15
+        await wait_for(lambda: len(tb.delivered) == 20)
+        await queue.close()
+        return tb, queue
+
+    tb, queue = asyncio.run(scenario())
+    assert tb.delivered == list(range(20))
+    assert queue.spilled_total == 15 and queue.unspilled_total == 15
+
+
+def test_failed_flush_does_not_exceed_queue_size(tmp_path):
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def respond(n):
+            if n == 1:
+                # Mientras el primer lote está en vuelo la cola se vuelve a llenar
+                await gate.wait()
+                return httpx.Response(503, headers={"Retry-After": "0"})
+
+        tb = ThingsBoardStandIn(respond)
+        queue = make_queue(
+            tb, max_queue_per_token=4, batch_size=4, max_age=30,
+            max_backoff=0.1, spill_path=str(tmp_path / "spill.sqlite")
+        )
+        await queue.start()
+        queue.enqueue_many(TOKEN, records(0, 4))
+        await wait_for(lambda: tb.requests)
+        queue.enqueue_many(TOKEN, records(4, 6))
+        gate.set()
+        await wait_for(lambda: queue.failed_requests == 1)
+        assert queue.stats()["queued"] <= 4
+        await wait_for(lambda: queue.sent == 10)
+        await queue.close()
+        return tb
+
+    tb = asyncio.run(scenario())
+    # El primer intento falló; después todo llega una vez y en orden
+    assert tb.delivered[4:] == list(range(10))
+
+
+def test_close_spills_unsent_records_and_next_run_replays_them(tmp_path):
+    spill = str(tmp_path / "spill.sqlite")
+
+    async def respond(n):
+        return httpx.Response(503)
+
+    async def first_run():
+        tb = ThingsBoardStandIn(respond)
+        queue = make_queue(tb, max_queue_per_token=3, batch_size=2, max_age=30, drain_timeout=0.5, spill_path=spill)
+        await queue.start()
+        queue.enqueue_many(TOKEN, records(0, 6))
+        await queue.close()
+        return queue
+
+    async def second_run():
+        tb = ThingsBoardStandIn()
+        queue = make_queue(tb, batch_size=2, max_age=30, spill_path=spill)
+        await queue.start()
+        await wait_for(lambda: len(tb.delivered) == 6)
+        await queue.close()
+        return tb
+
+    queue = asyncio.run(first_run())
+    assert queue.sent == 0 and queue.dropped == 0
+    tb = asyncio.run(second_run())
+    assert tb.delivered == list(range(6))
@@ -0,0 +1,150 @@
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Servicios ML cuyo tiempo de pared reporta el orquestador en cada batch
+SERVICES = ("color", "texture", "size")
+
+
+class AdaptiveController:
+    """
+    Ajusta las imágenes por tick y el intervalo a la capacidad medida.
+
+    Tras cada batch estima el throughput de cada servicio ML (imágenes
+    enviadas / su tiempo de pared) y el overhead fijo del batch (duración
+    total menos el servicio más lento). Como los servicios corren en
+    paralelo, un batch de n imágenes por dataset dura aproximadamente
+    overhead + n / throughput del más lento. Se busca que esa duración ocupe
+    target_utilization del intervalo:
+
+        1. Con el intervalo base, las imágenes que caben en el objetivo.
+        2. Si superan max_images, se fija max_images y se acorta el
+           intervalo (hasta min_interval).
+        3. Si no llegan a min_images, se fija min_images y se alarga el
+           intervalo (hasta max_interval).
+
+    Las estimaciones se suavizan con una media móvil exponencial (smoothing
+    = peso de la última muestra) y cada ajuste cambia imágenes e intervalo
+    como mucho un factor max_step. Un batch que no terminó a tiempo o un
+    tick descartado por solapamiento divide la carga entre max_step.
+    """
+    def __init__(
+        self,
+        images: int,
+        interval: float,
+        target_utilization: float = 0.7,
+        min_images: int = 5,
+        max_images: int = 200,
+        min_interval: float = 10.0,
+        max_interval: float = 300.0,
+        smoothing: float = 0.3,
+        max_step: float = 2.0
+    ):
+        self.base_interval = interval
+        self.target_utilization = min(max(target_utilization, 0.05), 1.0)
+        self.min_images = max(1, min_images)
+        self.max_images = max(self.min_images, max_images)
+        self.min_interval = max(1.0, min_interval)
+        self.max_interval = max(self.min_interval, max_interval)
+        self.smoothing = min(max(smoothing, 0.01), 1.0)
+        self.max_step = max(1.1, max_step)
+
+        self.images = self._clamp(images, self.min_images, self.max_images)
+        self.interval = self._clamp(interval, self.min_interval, self.max_interval)
+
+        # Estimaciones suavizadas: imágenes/s por servicio y overhead (s)
+        self.throughput: Dict[str, float] = {}
+        self.overhead: Optional[float] = None
+
+        # Métricas
+        self.adjustments = 0
+        self.backoffs = 0
+        self.last_utilization: Optional[float] = None
+
+    @staticmethod
+    def _clamp(value, low, high):
+        return max(low, min(high, value))
+
+    def _smooth(self, previous: Optional[float], sample: float) -> float:
+        if previous is None:
+            return sample
+        return previous + self.smoothing * (sample - previous)
+
+    def _step(self, current: float, wanted: float) -> float:
+        return self._clamp(wanted, current / self.max_step, current * self.max_step)
+
+    def observe(self, sent: Dict[str, int], timings: Dict[str, float]):
+        """
+        Incorpora un batch terminado y recalcula imágenes e intervalo.
+
+        Args:
+            sent: Imágenes enviadas por servicio
+            timings: Tiempo de pared por servicio y "total" (s), tal como
+                los reporta el orquestador en el resumen del job
+        """
+        total = timings.get("total")
+        measured = {
+            service: timings[service] for service in SERVICES
+            if sent.get(service) and timings.get(service, 0) > 0
+        }
+        if not total or not measured:
+            return
+
+        for service, seconds in measured.items():
+            rate = sent[service] / seconds
+            self.throughput[service] = self._smooth(self.throughput.get(service), rate)
+        self.overhead = self._smooth(self.overhead, max(0.0, total - max(measured.values())))
+        self.last_utilization = round(total / self.interval, 3)
+
+        # El servicio más lento marca la duración del batch
+        rate = min(self.throughput.values())
+        budget = self.base_interval * self.target_utilization - self.overhead
+        images = budget * rate
+        interval = self.base_interval
+        if images > self.max_images:
+            images = self.max_images
+            interval = (self.overhead + images / rate) / self.target_utilization
+        elif images < self.min_images:
+            images = self.min_images
+            interval = (self.overhead + images / rate) / self.target_utilization
+
+        self._apply(self._step(self.images, images), self._step(self.interval, interval))
+
+    def back_off(self, reason: str):
+        """
+        El pipeline no dio abasto: menos imágenes y, al llegar al mínimo,
+        un intervalo más largo.
+        """
+        self.backoffs += 1
+        images = self.images / self.max_step
+        interval = self.interval
+        if images < self.min_images:
+            interval = self.interval * self.max_step
+        logger.warning(f"🐢 Adaptive back-off ({reason})")
+        self._apply(images, interval)
+
+    def _apply(self, images: float, interval: float):
+        images = int(round(self._clamp(images, self.min_images, self.max_images)))
+        interval = round(self._clamp(interval, self.min_interval, self.max_interval), 1)
+        if images == self.images and interval == self.interval:
+            return
+        self.adjustments += 1
+        logger.info(
+            f"📐 Adaptive: {self.images} → {images} images, "
+            f"{self.interval:.1f}s → {interval:.1f}s interval "
+            f"(last utilization {self.last_utilization})"
+        )
+        self.images, self.interval = images, interval
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "images": self.images,
+            "interval": self.interval,
+            "target_utilization": self.target_utilization,
+            "last_utilization": self.last_utilization,
+            "throughput": {service: round(rate, 2) for service, rate in self.throughput.items()},
+            "overhead": round(self.overhead, 3) if self.overhead is not None else None,
+            "adjustments": self.adjustments,
+            "backoffs": self.backoffs,
+        }
@@ -0,0 +1,341 @@
+import asyncio
+import logging
+import math
+import random
+import sqlite3
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Qué hacer cuando toca una ejecución y la anterior sigue en curso
+#   skip: se descarta
+#   queue: espera a que termine la anterior (como mucho max_queued en espera)
+#   concurrent: se ejecuta en paralelo, hasta max_concurrent a la vez
+OVERLAP_POLICIES = ("skip", "queue", "concurrent")
+
+# Qué hacer con las ejecuciones perdidas mientras el servicio estuvo parado
+#   none: se ignoran
+#   one: una sola ejecución al arrancar
+#   all: una por ejecución perdida (hasta max_catch_up), una tras otra
+CATCH_UP_POLICIES = ("none", "one", "all")
+
+# Cada cuánto se vuelve a mirar gate mientras hay un slot omitido pendiente
+_GATE_POLL = 1.0
+
+
+class RunHistory:
+    """
+    Historial de ejecuciones en SQLite (o en memoria con path=None).
+
+    Guarda cuándo tocaba cada ejecución, cuándo empezó y terminó, su estado
+    y los detalles que devuelve la tarea; la última hora programada sirve
+    para recuperar las ejecuciones perdidas tras un reinicio.
+    """
+    def __init__(self, path: Optional[str] = None, max_runs: int = 1000):
+        self.max_runs = max(1, max_runs)
+        self._db = sqlite3.connect(path or ":memory:")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " scheduled_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL,"
+            " duration REAL,"
+            " status TEXT NOT NULL,"
+            " catch_up INTEGER NOT NULL DEFAULT 0,"
+            " job_id TEXT,"
+            " images INTEGER,"
+            " error TEXT)"
+        )
+        self._db.commit()
+
+    def record(
+        self,
+        scheduled_at: float,
+        status: str,
+        started_at: Optional[float] = None,
+        finished_at: Optional[float] = None,
+        catch_up: bool = False,
+        details: Optional[Dict[str, Any]] = None
+    ):
+        details = details or {}
+        duration = finished_at - started_at if started_at and finished_at else None
+        self._db.execute(
+            "INSERT INTO runs (scheduled_at, started_at, finished_at, duration, status,"
+            " catch_up, job_id, images, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (scheduled_at, started_at, finished_at, duration, status, int(catch_up),
+             details.get("job_id"), details.get("images"), details.get("error"))
+        )
+        self._db.execute(
+            "DELETE FROM runs WHERE id <= (SELECT MAX(id) FROM runs) - ?", (self.max_runs,)
+        )
+        self._db.commit()
+
+    def last_scheduled(self) -> Optional[float]:
+        row = self._db.execute("SELECT MAX(scheduled_at) FROM runs").fetchone()
+        return row[0]
+
+    def ran(self, scheduled_at: float, tolerance: float = 0.5) -> bool:
+        """
+        Si el slot ya tiene una ejecución registrada (no descartada).
+        """
+        row = self._db.execute(
+            "SELECT 1 FROM runs WHERE status != 'skipped' AND scheduled_at BETWEEN ? AND ? LIMIT 1",
+            (scheduled_at - tolerance, scheduled_at + tolerance)
+        ).fetchone()
+        return row is not None
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        cursor = self._db.execute(
+            "SELECT * FROM runs ORDER BY id DESC LIMIT ?", (limit,)
+        )
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def close(self):
+        self._db.close()
+
+
+class AsyncScheduler:
+    """
+    Ejecuta una corrutina cada interval segundos en el event loop.
+
+    Las ejecuciones se programan en slots fijos (scheduled_at + interval),
+    así una ejecución lenta no desplaza las siguientes; si se solapan, decide
+    la política overlap. jitter retrasa cada inicio un tiempo al azar entre
+    0 y jitter segundos. Al arrancar, las ejecuciones perdidas desde la
+    última registrada en el historial se recuperan según catch_up, de una
+    en una y registradas con la hora de su slot; no cuentan como ticks
+    descartados por solapamiento.
+
+    La tarea puede devolver un dict con detalles para el historial
+    (status, job_id, images, error). interval puede cambiarse en marcha y
+    rige desde el siguiente slot; on_skip se llama por cada tick descartado.
+    Si gate devuelve False en un slot (réplica en espera), el slot se omite
+    sin registrarlo; si gate pasa a True antes de gate_grace segundos (la
+    réplica acaba de tomar el relevo), ese slot se ejecuta con retraso. Con
+    align, los slots caen en múltiplos de interval desde la época, los
+    mismos en todas las réplicas.
+    """
+    def __init__(
+        self,
+        task: Callable[[], Awaitable[Optional[Dict[str, Any]]]],
+        interval: float,
+        history: RunHistory,
+        overlap: str = "skip",
+        max_concurrent: int = 2,
+        max_queued: int = 1,
+        jitter: float = 0.0,
+        catch_up: str = "one",
+        max_catch_up: int = 3,
+        on_skip: Optional[Callable[[], None]] = None,
+        gate: Optional[Callable[[], bool]] = None,
+        gate_grace: float = 0.0,
+        align: bool = False
+    ):
+        if overlap not in OVERLAP_POLICIES:
+            raise ValueError(f"Unknown overlap policy: {overlap} (expected one of {OVERLAP_POLICIES})")
+        if catch_up not in CATCH_UP_POLICIES:
+            raise ValueError(f"Unknown catch-up policy: {catch_up} (expected one of {CATCH_UP_POLICIES})")
+
+        self.task = task
+        self.interval = interval
+        self.history = history
+        self.overlap = overlap
+        self.max_concurrent = max(1, max_concurrent) if overlap == "concurrent" else 1
+        self.max_queued = max(0, max_queued)
+        self.jitter = max(0.0, jitter)
+        self.catch_up = catch_up
+        self.max_catch_up = max(1, max_catch_up)
+        self.on_skip = on_skip
+        self.gate = gate
+        self.gate_grace = max(0.0, gate_grace)
+        self.align = align
+        # Último slot omitido por gate, pendiente mientras no pase gate_grace
+        self._gated_slot: Optional[float] = None
+        self._catching_up = False
+
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._tasks: set = set()
+        # Ejecuciones lanzadas y sin terminar (en jitter, en espera o en curso)
+        self.active = 0
+        self.running = 0
+
+        # Métricas
+        self.started = 0
+        self.skipped = 0
+        self.gated = 0
+
+    def _plan(self, now: float) -> Tuple[float, List[float]]:
+        """
+        Returns:
+            (hora de la siguiente ejecución, alineada con los slots
+            anteriores; slots perdidos a recuperar según catch_up, del más
+            antiguo al más reciente)
+        """
+        last = self.history.last_scheduled()
+        if last is None:
+            if self.align:
+                return math.floor(now / self.interval + 1) * self.interval, []
+            return now + self.interval, []
+
+        missed = int((now - last) // self.interval)
+        next_at = last + (missed + 1) * self.interval
+        if missed <= 0:
+            return next_at, []
+
+        runs = {"none": 0, "one": 1, "all": min(missed, self.max_catch_up)}[self.catch_up]
+        logger.warning(f"⏪ {missed} runs missed while stopped, catching up {runs}")
+        return next_at, [last + k * self.interval for k in range(missed - runs + 1, missed + 1)]
+
+    async def _wait_gate(self) -> bool:
+        """
+        Espera hasta gate_grace a que gate se abra (la réplica acaba de
+        arrancar y aún no sabe si le toca).
+        """
+        deadline = time.monotonic() + self.gate_grace
+        while not self.gate():
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(_GATE_POLL)
+        return True
+
+    async def _catch_up(self, slots: List[float]):
+        """
+        Ejecuta las ejecuciones perdidas una tras otra; cada una queda en el
+        historial con la hora de su slot.
+        """
+        self._catching_up = True
+        try:
+            for slot in slots:
+                if self.gate and not await self._wait_gate():
+                    logger.info("⏪ Catch-up left to the active replica")
+                    return
+                # Con el historial compartido, otra réplica pudo recuperarlo ya
+                if self.history.ran(slot, self.interval / 2):
+                    continue
+                self.active += 1
+                await self._run(slot, catch_up=True)
+        finally:
+            self._catching_up = False
+
+    def _dispatch(self, scheduled_at: float):
+        if self.gate and not self.gate():
+            self.gated += 1
+            self._gated_slot = scheduled_at
+            return
+        self._gated_slot = None
+
+        limit = self.max_concurrent + (self.max_queued if self.overlap == "queue" else 0)
+        if self.active >= limit:
+            self.skipped += 1
+            logger.warning(
+                f"⏭️  Run scheduled at {time.strftime('%H:%M:%S', time.localtime(scheduled_at))} "
+                f"skipped: {self.running} still running ({self.overlap} policy)"
+            )
+            self.history.record(scheduled_at, "skipped")
+            # Solaparse con la recuperación al arrancar no indica falta de capacidad
+            if self.on_skip and not self._catching_up:
+                self.on_skip()
+            return
+
+        self.active += 1
+        task = asyncio.create_task(self._run(scheduled_at, False))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, scheduled_at: float, catch_up: bool):
+        started_at = None
+        status, details = "cancelled", {}
+        try:
+            if self.jitter:
+                await asyncio.sleep(random.uniform(0, self.jitter))
+            async with self._slots:
+                self.running += 1
+                self.started += 1
+                started_at = time.time()
+                try:
+                    details = await self.task() or {}
+                    status = details.get("status", "ok")
+                except Exception as e:
+                    logger.error(f"❌ Run failed: {e}", exc_info=True)
+                    status, details = "failed", {"error": str(e)}
+                finally:
+                    self.running -= 1
+        finally:
+            self.active -= 1
+            finished_at = time.time()
+            self.history.record(scheduled_at, status, started_at, finished_at, catch_up, details)
+            if started_at is not None:
+                logger.info(
+                    f"📒 Run {status} in {finished_at - started_at:.1f}s "
+                    f"(started {started_at - scheduled_at:.1f}s after its slot)"
+                )
+
+    async def run_forever(self, stop: asyncio.Event):
+        """
+        Programa ejecuciones hasta que se activa stop; al salir cancela las
+        que siguen en curso.
+        """
+        next_at, missed = self._plan(time.time())
+        if missed:
+            task = asyncio.create_task(self._catch_up(missed))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        logger.info(
+            f"⏰ Next run at {time.strftime('%H:%M:%S', time.localtime(next_at))} "
+            f"(every {self.interval:.0f}s, overlap={self.overlap}, catch_up={self.catch_up})"
+        )
+        try:
+            while not stop.is_set():
+                timeout = max(0.0, next_at - time.time())
+                if self._gated_slot is not None:
+                    timeout = min(timeout, _GATE_POLL)
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=timeout)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+
+                if time.time() < next_at:
+                    self._resume_gated()
+                    continue
+                self._dispatch(next_at)
+                next_at += self.interval
+                now = time.time()
+                if next_at <= now:
+                    # El proceso estuvo suspendido: se salta a la siguiente hora sin ráfagas
+                    behind = int((now - next_at) // self.interval) + 1
+                    logger.warning(f"⚠️  Scheduler {behind} slots behind, skipping ahead")
+                    next_at += behind * self.interval
+        finally:
+            for task in list(self._tasks):
+                task.cancel()
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _resume_gated(self):
+        slot = self._gated_slot
+        if slot is None:
+            return
+        # Con el historial compartido se sabe si otra réplica ya lo ejecutó
+        if time.time() - slot > self.gate_grace + _GATE_POLL or self.history.ran(slot, self.interval / 2):
+            self._gated_slot = None
+        elif self.gate():
+            logger.info(
+                f"▶️  Running slot {time.strftime('%H:%M:%S', time.localtime(slot))} "
+                f"{time.time() - slot:.1f}s late after taking over"
+            )
+            self._dispatch(slot)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "overlap": self.overlap,
+            "running": self.running,
+            "waiting": self.active - self.running,
+            "started": self.started,
+            "skipped": self.skipped,
+            "gated": self.gated,
+        }
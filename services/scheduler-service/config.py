@@ -10,8 +10,84 @@ class Settings:
     DATASET_COLOR_PATH = os.getenv('DATASET_COLOR_PATH', '/datasets/color')
     DATASET_TEXTURE_PATH = os.getenv('DATASET_TEXTURE_PATH', '/datasets/texture')
     DATASET_SIZE_PATH = os.getenv('DATASET_SIZE_PATH', '/datasets/size')
+    # Directorio donde se guarda el índice de cada dataset ("" = solo en memoria)
+    DATASET_INDEX_DIR = os.getenv('DATASET_INDEX_DIR', '')
+    # Directorio compartido con el orquestador y los servicios ML donde se
+    # publican las versiones del índice; si se define, los jobs envían
+    # manifiestos (ids de imágenes) en lugar de rutas
+    MANIFEST_DIR = os.getenv('MANIFEST_DIR', '')
+    MANIFEST_KEEP_VERSIONS = int(os.getenv('MANIFEST_KEEP_VERSIONS', '5'))
+    
+    # schedule: muestra aleatoria cada SCHEDULE_INTERVAL; watch: solo las
+    # imágenes nuevas, en cuanto llegan (ver watcher.py); both: ambos
+    TRIGGER_MODE = os.getenv('TRIGGER_MODE', 'schedule')
     
     SCHEDULE_INTERVAL = int(os.getenv('SCHEDULE_INTERVAL', '60'))  # segundos
     NUM_IMAGES = int(os.getenv('NUM_IMAGES', '20'))
+    
+    # Modo adaptativo: ajusta NUM_IMAGES y SCHEDULE_INTERVAL tras cada batch
+    # para que su duración ocupe TARGET_UTILIZATION del intervalo (ver adaptive.py)
+    ADAPTIVE_SCHEDULING = os.getenv('ADAPTIVE_SCHEDULING', 'false').lower() == 'true'
+    TARGET_UTILIZATION = float(os.getenv('TARGET_UTILIZATION', '0.7'))
+    MIN_IMAGES = int(os.getenv('MIN_IMAGES', '5'))
+    MAX_IMAGES = int(os.getenv('MAX_IMAGES', '200'))
+    MIN_INTERVAL = float(os.getenv('MIN_INTERVAL', '10'))
+    MAX_INTERVAL = float(os.getenv('MAX_INTERVAL', '300'))
+    # Peso de la última medida en la media móvil y cambio máximo por ajuste
+    ADAPTIVE_SMOOTHING = float(os.getenv('ADAPTIVE_SMOOTHING', '0.3'))
+    ADAPTIVE_MAX_STEP = float(os.getenv('ADAPTIVE_MAX_STEP', '2'))
+    
+    # Segundos que tiene cada job para terminar (0 = sin deadline); por defecto
+    # hasta el siguiente tick, cuando sus resultados ya no interesan (en modo
+    # adaptativo escala con el intervalo)
+    JOB_DEADLINE = float(os.getenv('JOB_DEADLINE', str(SCHEDULE_INTERVAL)))
+    # Segundos entre consultas del estado del job en curso
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '2'))
+    
+    # Ejecuciones solapadas: skip, queue o concurrent (ver async_scheduler.py)
+    OVERLAP_POLICY = os.getenv('OVERLAP_POLICY', 'skip')
+    MAX_CONCURRENT_RUNS = int(os.getenv('MAX_CONCURRENT_RUNS', '2'))
+    MAX_QUEUED_RUNS = int(os.getenv('MAX_QUEUED_RUNS', '1'))
+    # Retraso aleatorio de cada inicio, entre 0 y este valor (segundos)
+    SCHEDULE_JITTER = float(os.getenv('SCHEDULE_JITTER', '0'))
+    # Ejecuciones perdidas mientras el servicio estuvo parado: none, one o all
+    CATCH_UP_POLICY = os.getenv('CATCH_UP_POLICY', 'one')
+    MAX_CATCH_UP_RUNS = int(os.getenv('MAX_CATCH_UP_RUNS', '3'))
+    # Historial de ejecuciones en SQLite ("" = solo en memoria, sin catch-up)
+    RUN_HISTORY_DB = os.getenv('RUN_HISTORY_DB', '')
+    RUN_HISTORY_SIZE = int(os.getenv('RUN_HISTORY_SIZE', '1000'))
+    
+    # Detección de imágenes nuevas (TRIGGER_MODE watch o both)
+    WATCH_BACKEND = os.getenv('WATCH_BACKEND', 'auto')  # auto, inotify o poll
+    WATCH_POLL_INTERVAL = float(os.getenv('WATCH_POLL_INTERVAL', '2'))
+    # Re-listado de respaldo con inotify (eventos perdidos)
+    WATCH_RESCAN_INTERVAL = float(os.getenv('WATCH_RESCAN_INTERVAL', '60'))
+    # Se envía tras WATCH_DEBOUNCE s sin novedades, como mucho WATCH_MAX_DELAY s
+    # después de la primera imagen o al juntar WATCH_MAX_BATCH
+    WATCH_DEBOUNCE = float(os.getenv('WATCH_DEBOUNCE', '1'))
+    WATCH_MAX_DELAY = float(os.getenv('WATCH_MAX_DELAY', '5'))
+    WATCH_MAX_BATCH = int(os.getenv('WATCH_MAX_BATCH', '500'))
+    # Segundos sin modificarse para dar por escrita una imagen (modo poll)
+    WATCH_SETTLE = float(os.getenv('WATCH_SETTLE', '1'))
+    # Registro de imágenes detectadas y procesadas ("" = solo en memoria)
+    WATCH_LEDGER_DB = os.getenv('WATCH_LEDGER_DB', '')
+    WATCH_LEDGER_SIZE = int(os.getenv('WATCH_LEDGER_SIZE', '100000'))
+    # Envíos de una imagen sin predicción antes de darla por fallida
+    WATCH_MAX_ATTEMPTS = int(os.getenv('WATCH_MAX_ATTEMPTS', '5'))
+    
+    # Varias réplicas (ver leader.py): none, sqlite o redis. Solo el líder
+    # dispara los ticks y vigila los datasets; si muere, otra réplica toma el
+    # lease en menos de LEADER_LEASE_TTL + LEADER_LEASE_TTL/3 segundos
+    LEADER_ELECTION = os.getenv('LEADER_ELECTION', 'none')
+    LEADER_NAME = os.getenv('LEADER_NAME', 'scheduler')
+    LEADER_LEASE_TTL = float(os.getenv('LEADER_LEASE_TTL', '15'))
+    # Archivo compartido por las réplicas del mismo host (backend sqlite)
+    LEADER_SQLITE_PATH = os.getenv('LEADER_SQLITE_PATH', 'leases.sqlite')
+    LEADER_REDIS_URL = os.getenv('LEADER_REDIS_URL', 'redis://redis:6379/0')
+    # En vez de un líder, todas las réplicas disparan los ticks y cada una
+    # toma su parte de las imágenes (las de su partición del dataset)
+    SHARD_IMAGES = os.getenv('SHARD_IMAGES', 'false').lower() == 'true'
+    
+    HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', '10'))
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from manifest import manifest_file, publish
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Un cambio dentro de esta ventana puede no mover el mtime del directorio
+# (resolución del sistema de archivos): se vuelve a listar en el siguiente tick
+_MTIME_GRACE_NS = 2_000_000_000
+
+
+class DatasetIndex:
+    """
+    Índice de las imágenes de un dataset, actualizado de forma incremental.
+
+    Las rutas viven en una lista con su posición en un dict: una muestra de k
+    imágenes cuesta O(k) y una baja se hace con swap-remove (la última ruta
+    ocupa el hueco). El directorio solo se vuelve a listar cuando cambia su
+    mtime, es decir, cuando se añaden, borran o renombran archivos; si no, el
+    refresco es un único stat.
+
+    Con state_path el índice se guarda en JSON y, al arrancar, se reutiliza
+    sin listar el directorio si su mtime no cambió.
+
+    La posición de cada ruta es su id en la versión actual del índice (un
+    hash de la lista), que se publica para los manifiestos (ver manifest.py).
+    """
+    def __init__(self, dataset_path: str, state_path: Optional[str] = None):
+        self.dataset_path = str(Path(dataset_path).absolute())
+        self.state_path = state_path
+        self.paths: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._mtime_ns: Optional[int] = None
+        self._version: Optional[str] = None
+        self._published: Optional[str] = None
+        # True si el índice se recuperó de state_path al arrancar
+        self.restored = False
+
+        # Métricas
+        self.scans = 0
+        self.added = 0
+        self.removed = 0
+
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def _add(self, path: str):
+        self._positions[path] = len(self.paths)
+        self.paths.append(path)
+
+    def _remove(self, path: str):
+        index = self._positions.pop(path)
+        last = self.paths.pop()
+        if index < len(self.paths):
+            self.paths[index] = last
+            self._positions[last] = index
+
+    def _scan(self) -> List[str]:
+        # scandir da el tipo de entrada sin un stat por archivo
+        with os.scandir(self.dataset_path) as entries:
+            return [
+                entry.path for entry in entries
+                if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file()
+            ]
+
+    def refresh(self) -> bool:
+        """
+        Sincroniza el índice con el directorio si su mtime cambió.
+
+        Returns:
+            True si el directorio se volvió a listar
+        """
+        return self._sync() is not None
+
+    def poll_added(self) -> List[str]:
+        """
+        Como refresh, pero devuelve las rutas nuevas desde el último refresco.
+        """
+        return self._sync() or []
+
+    def _sync(self) -> Optional[List[str]]:
+        try:
+            mtime_ns = os.stat(self.dataset_path).st_mtime_ns
+        except FileNotFoundError:
+            if self.paths:
+                logger.warning(f"Dataset path disappeared: {self.dataset_path}")
+            self.paths, self._positions, self._mtime_ns = [], {}, None
+            return None
+
+        if mtime_ns == self._mtime_ns:
+            return None
+
+        scan_started = time.time_ns()
+        current = set(self._scan())
+        gone = [path for path in self.paths if path not in current]
+        new = [path for path in current if path not in self._positions]
+        for path in gone:
+            self._remove(path)
+        for path in new:
+            self._add(path)
+        if new or gone:
+            self._version = None
+
+        self.scans += 1
+        self.added += len(new)
+        self.removed += len(gone)
+        # Un mtime demasiado reciente no garantiza haber visto todos los cambios
+        self._mtime_ns = mtime_ns if scan_started - mtime_ns > _MTIME_GRACE_NS else None
+        if new or gone:
+            logger.info(
+                f"🗂️  Index {self.dataset_path}: +{len(new)} -{len(gone)} "
+                f"({len(self.paths)} images)"
+            )
+        self._save()
+        return new
+
+    def sample_ids(self, k: int, shard: Optional[Tuple[int, int]] = None) -> List[int]:
+        """
+        k posiciones distintas al azar (todas si hay menos de k), en O(k).
+
+        Con shard=(i, n), solo de las rutas de la partición i de n, que se
+        reparten por hash de la ruta (estable entre réplicas y reinicios).
+        """
+        if shard is not None and shard[1] > 1:
+            return self._sample_shard(k, *shard)
+        if k >= len(self.paths):
+            return list(range(len(self.paths)))
+        return random.sample(range(len(self.paths)), k)
+
+    def in_shard(self, i: int, index: int, count: int) -> bool:
+        return zlib.crc32(self.paths[i].encode()) % count == index
+
+    def _sample_shard(self, k: int, index: int, count: int) -> List[int]:
+        total = len(self.paths)
+        if total == 0 or k <= 0:
+            return []
+        # Muestreo por rechazo: ~count intentos por posición aceptada
+        chosen: Dict[int, None] = {}
+        for _ in range(4 * k * count + 64):
+            i = random.randrange(total)
+            if i not in chosen and self.in_shard(i, index, count):
+                chosen[i] = None
+                if len(chosen) == k:
+                    return list(chosen)
+        # Partición pequeña (o casi agotada): se recorre entera
+        ids = [i for i in range(total) if self.in_shard(i, index, count)]
+        return ids if k >= len(ids) else random.sample(ids, k)
+
+    def sample(self, k: int, shard: Optional[Tuple[int, int]] = None) -> List[str]:
+        """
+        k rutas distintas al azar (todas si hay menos de k), en O(k).
+        """
+        return [self.paths[i] for i in self.sample_ids(k, shard)]
+
+    @property
+    def version(self) -> str:
+        """
+        Hash del orden actual de las rutas; cambia con cada alta o baja.
+        """
+        if self._version is None:
+            digest = hashlib.sha1(self.dataset_path.encode())
+            for path in self.paths:
+                digest.update(b"\0" + path.encode())
+            self._version = digest.hexdigest()[:16]
+        return self._version
+
+    def publish(self, directory: str, dataset: str, keep: int = 5) -> str:
+        """
+        Publica la versión actual en directory si aún no existe.
+
+        Returns:
+            La versión publicada
+        """
+        version = self.version
+        if version == self._published and os.path.exists(manifest_file(directory, dataset, version)):
+            return version
+        # Las rutas se publican relativas a la raíz del dataset
+        names = [path[len(self.dataset_path) + 1:] for path in self.paths]
+        if publish(directory, dataset, version, self.dataset_path, names, keep):
+            logger.info(f"📜 Published manifest {dataset}@{version} ({len(names)} images)")
+        self._published = version
+        return version
+
+    def _load(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  Ignoring unreadable index {self.state_path}: {e}")
+            return
+        if state.get("dataset_path") != self.dataset_path:
+            return
+        for path in state.get("paths", []):
+            self._add(path)
+        self._mtime_ns = state.get("mtime_ns")
+        self.restored = True
+        logger.info(f"🗂️  Loaded index of {self.dataset_path} ({len(self.paths)} images)")
+
+    def _save(self):
+        if not self.state_path:
+            return
+        tmp = None
+        try:
+            # Nombre único: las réplicas comparten /state y guardan a la vez
+            fd, tmp = tempfile.mkstemp(
+                dir=os.path.dirname(self.state_path) or ".",
+                prefix=os.path.basename(self.state_path) + ".",
+                suffix=".tmp"
+            )
+            with os.fdopen(fd, "w") as f:
+                json.dump({
+                    "dataset_path": self.dataset_path,
+                    "mtime_ns": self._mtime_ns,
+                    "paths": self.paths,
+                }, f)
+            os.replace(tmp, self.state_path)
+        except OSError as e:
+            logger.warning(f"⚠️  Could not save index {self.state_path}: {e}")
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
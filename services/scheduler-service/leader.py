@@ -0,0 +1,322 @@
+import abc
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Backends de elección de líder
+#   sqlite: tabla de leases en un archivo compartido (réplicas en el mismo host)
+#   redis: claves con TTL en un servidor compatible con Redis
+LEADER_BACKENDS = ("sqlite", "redis")
+
+
+class LeaseBackend(abc.ABC):
+    """
+    Leases con nombre: los tiene un único dueño hasta que vencen o los suelta.
+    """
+    @abc.abstractmethod
+    async def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        """
+        Toma el lease si está libre o vencido, o lo renueva si ya es de
+        owner, por ttl segundos.
+
+        Returns:
+            True si owner tiene el lease
+        """
+
+    @abc.abstractmethod
+    async def release(self, name: str, owner: str):
+        pass
+
+    @abc.abstractmethod
+    async def owners(self, prefix: str) -> List[str]:
+        """
+        Dueños de los leases vigentes cuyo nombre empieza por prefix.
+        """
+
+    async def close(self):
+        pass
+
+
+class SQLiteLeaseBackend(LeaseBackend):
+    """
+    Leases en una tabla SQLite. Cada operación es una única sentencia
+    atómica; sirve para réplicas que comparten el archivo en un volumen
+    local (no en NFS, donde los locks de SQLite no son fiables).
+
+    Las sentencias corren en un hilo aparte: con el archivo bloqueado por
+    otra réplica pueden esperar hasta el timeout de SQLite (5 s), y eso no
+    debe parar el event loop.
+    """
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " name TEXT PRIMARY KEY,"
+            " owner TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+
+    def _acquire(self, name: str, owner: str, ttl: float) -> bool:
+        with self._lock:
+            now = time.time()
+            cursor = self._db.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at"
+                " WHERE leases.owner = excluded.owner OR leases.expires_at <= ?",
+                (name, owner, now + ttl, now)
+            )
+            return cursor.rowcount == 1
+
+    def _release(self, name: str, owner: str):
+        with self._lock:
+            self._db.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def _owners(self, prefix: str) -> List[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT owner FROM leases WHERE substr(name, 1, ?) = ? AND expires_at > ? ORDER BY owner",
+                (len(prefix), prefix, time.time())
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def _close(self):
+        with self._lock:
+            self._db.close()
+
+    async def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        return await asyncio.to_thread(self._acquire, name, owner, ttl)
+
+    async def release(self, name: str, owner: str):
+        await asyncio.to_thread(self._release, name, owner)
+
+    async def owners(self, prefix: str) -> List[str]:
+        return await asyncio.to_thread(self._owners, prefix)
+
+    async def close(self):
+        await asyncio.to_thread(self._close)
+
+
+# Renovar o soltar solo si el lease sigue siendo de quien lo pide
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLeaseBackend(LeaseBackend):
+    """
+    Leases como claves con TTL (SET NX PX) en un servidor compatible con
+    Redis; la renovación y la liberación comparan el dueño en un script Lua.
+    """
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url, decode_responses=True)
+        self._renew = self._redis.register_script(_RENEW_SCRIPT)
+        self._release = self._redis.register_script(_RELEASE_SCRIPT)
+
+    async def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        ttl_ms = max(1, int(ttl * 1000))
+        if await self._redis.set(name, owner, nx=True, px=ttl_ms):
+            return True
+        return bool(await self._renew(keys=[name], args=[owner, ttl_ms]))
+
+    async def release(self, name: str, owner: str):
+        await self._release(keys=[name], args=[owner])
+
+    async def owners(self, prefix: str) -> List[str]:
+        keys = [key async for key in self._redis.scan_iter(match=f"{prefix}*")]
+        if not keys:
+            return []
+        return sorted(owner for owner in await self._redis.mget(keys) if owner)
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+def create_backend(kind: str, sqlite_path: str, redis_url: str) -> LeaseBackend:
+    if kind == "sqlite":
+        return SQLiteLeaseBackend(sqlite_path)
+    if kind == "redis":
+        return RedisLeaseBackend(redis_url)
+    raise ValueError(f"Unknown leader election backend: {kind} (expected one of {LEADER_BACKENDS})")
+
+
+class LeaderElector:
+    """
+    Elección de líder por lease entre réplicas del scheduler.
+
+    Cada renew_every segundos (ttl/3 por defecto) la réplica intenta tomar
+    o renovar el lease "<name>:leader". Si el líder muere, su lease vence a
+    los ttl segundos y otra réplica lo toma en la siguiente renovación. Una
+    réplica deja de considerarse líder en cuanto no puede confirmar el lease
+    a tiempo (backend caído), antes de que otra pueda tomarlo.
+
+    Con sharding, además, cada réplica mantiene el lease
+    "<name>:member:<owner>"; shard es (posición, total) entre los miembros
+    vigentes, para repartir las imágenes entre réplicas.
+    """
+    def __init__(
+        self,
+        backend: LeaseBackend,
+        name: str = "scheduler",
+        owner: Optional[str] = None,
+        ttl: float = 15.0,
+        renew_every: Optional[float] = None,
+        sharding: bool = False
+    ):
+        self.backend = backend
+        self.name = name
+        self.owner = owner or f"{socket.gethostname()}-{os.getpid()}"
+        self.ttl = ttl
+        self.renew_every = renew_every or ttl / 3
+        self.sharding = sharding
+
+        self._leader = False
+        self._valid_until = 0.0
+        self._shard: Optional[Tuple[int, int]] = None
+        self._changed = asyncio.Event()
+
+        # Métricas
+        self.elections = 0
+        self.errors = 0
+
+    @property
+    def leader_key(self) -> str:
+        return f"{self.name}:leader"
+
+    @property
+    def member_prefix(self) -> str:
+        return f"{self.name}:member:"
+
+    @property
+    def failover_time(self) -> float:
+        """
+        Tiempo máximo hasta que otra réplica toma el lease de un líder caído.
+        """
+        return self.ttl + self.renew_every
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader and time.monotonic() < self._valid_until
+
+    @property
+    def shard(self) -> Optional[Tuple[int, int]]:
+        """
+        (posición, total) de esta réplica, o None si no está confirmada.
+        """
+        if self._shard is None or time.monotonic() >= self._valid_until:
+            return None
+        return self._shard
+
+    async def _renew(self):
+        started = time.monotonic()
+        leader = await self.backend.acquire(self.leader_key, self.owner, self.ttl)
+        shard = None
+        if self.sharding:
+            await self.backend.acquire(f"{self.member_prefix}{self.owner}", self.owner, self.ttl)
+            members = await self.backend.owners(self.member_prefix)
+            if self.owner in members:
+                shard = (members.index(self.owner), len(members))
+        # El lease cuenta desde antes de pedirlo: así vence aquí antes que en el backend
+        self._valid_until = started + self.ttl
+
+        if leader != self._leader:
+            if leader:
+                self.elections += 1
+                logger.info(f"👑 {self.owner} is now the leader")
+            else:
+                logger.info(f"💤 {self.owner} is on standby")
+            self._leader = leader
+            self._changed.set()
+        if shard != self._shard:
+            if shard:
+                logger.info(f"🧩 {self.owner} handles shard {shard[0] + 1}/{shard[1]}")
+            self._shard = shard
+
+    async def run(self, stop: asyncio.Event):
+        """
+        Renueva los leases hasta que se activa stop y los suelta al salir.
+        """
+        logger.info(f"🗳️  Leader election as {self.owner} (lease {self.ttl:.0f}s)")
+        try:
+            while not stop.is_set():
+                try:
+                    await self._renew()
+                except Exception as e:
+                    self.errors += 1
+                    logger.warning(f"⚠️  Lease renewal failed: {e}")
+                    if self._leader and not self.is_leader:
+                        logger.warning(f"💤 {self.owner} steps down: lease could not be confirmed")
+                        self._leader = False
+                        self._changed.set()
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=self.renew_every)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._leader = False
+            self._shard = None
+            self._changed.set()
+            try:
+                await self.backend.release(self.leader_key, self.owner)
+                if self.sharding:
+                    await self.backend.release(f"{self.member_prefix}{self.owner}", self.owner)
+            except Exception as e:
+                logger.warning(f"⚠️  Could not release leases: {e}")
+
+    async def while_leader(self, run: Callable[[asyncio.Event], Awaitable[None]], stop: asyncio.Event):
+        """
+        Ejecuta run mientras esta réplica sea líder; run recibe un evento
+        que se activa al perder el liderazgo o al parar.
+        """
+        while not stop.is_set():
+            if not self.is_leader:
+                self._changed.clear()
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=self.renew_every)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            term = asyncio.Event()
+
+            async def watch_term():
+                while not stop.is_set() and self.is_leader:
+                    self._changed.clear()
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), timeout=1.0)
+                    except asyncio.TimeoutError:
+                        pass
+                term.set()
+
+            watcher = asyncio.create_task(watch_term())
+            try:
+                await run(term)
+            finally:
+                watcher.cancel()
+
+    def stats(self):
+        return {
+            "owner": self.owner,
+            "leader": self.is_leader,
+            "shard": self.shard,
+            "elections": self.elections,
+            "errors": self.errors,
+        }
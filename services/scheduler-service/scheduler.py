@@ -1,11 +1,21 @@
 import os
-import random
+import asyncio
 import logging
+import math
+import signal
+import sys
+import threading
+import time
 from pathlib import Path
-from apscheduler.schedulers.blocking import BlockingScheduler
-from apscheduler.triggers.interval import IntervalTrigger
-import requests
+from typing import Optional, Set, Tuple
+import httpx
 from config import settings
+from dataset_index import DatasetIndex
+from async_scheduler import AsyncScheduler, RunHistory
+from adaptive import AdaptiveController
+from manifest import make_manifest
+from watcher import DatasetWatcher, JobLost, WatchLedger
+from leader import LeaderElector, create_backend
 
 # Configuración de logging
 logging.basicConfig(
@@ -15,44 +25,69 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def get_random_images(dataset_path: str, num_images: int) -> list:
+# Índice incremental por dataset, creado en el primer uso
+dataset_indexes = {}
+# Los índices se listan, guardan y publican en hilos (asyncio.to_thread) para
+# no frenar el event loop, que también renueva el lease del líder; dos ticks
+# solapados no los tocan a la vez
+dataset_indexes_lock = threading.Lock()
+
+
+def get_dataset_index(dataset_path: str) -> DatasetIndex:
+    index = dataset_indexes.get(dataset_path)
+    if index is None:
+        state_path = None
+        if settings.DATASET_INDEX_DIR:
+            name = Path(dataset_path).name or "root"
+            state_path = os.path.join(settings.DATASET_INDEX_DIR, f"{name}.index.json")
+        index = dataset_indexes[dataset_path] = DatasetIndex(dataset_path, state_path)
+    return index
+
+
+def get_ready_index(dataset_path: str, num_images: int) -> Optional[DatasetIndex]:
+    """
+    Índice actualizado del dataset, o None si no existe o está vacío.
+    """
+    if not Path(dataset_path).exists():
+        logger.error(f"Dataset path not found: {dataset_path}")
+        return None
+    
+    # Solo se vuelve a listar el directorio si cambió
+    index = get_dataset_index(dataset_path)
+    index.refresh()
+    
+    if not len(index):
+        logger.warning(f"No images found in {dataset_path}")
+        return None
+    
+    if len(index) < num_images:
+        logger.warning(
+            f"Only {len(index)} images available, "
+            f"requested {num_images}. Using all available."
+        )
+    return index
+
+
+def get_random_images(dataset_path: str, num_images: int, shard: Optional[Tuple[int, int]] = None) -> list:
     """
     Selecciona aleatoriamente N imágenes del dataset.
     
     Args:
         dataset_path: Ruta al directorio con imágenes
         num_images: Número de imágenes a seleccionar
+        shard: (posición, total) de la réplica; solo imágenes de su partición
     
     Returns:
         Lista de rutas absolutas a las imágenes
     """
     try:
-        dataset_dir = Path(dataset_path)
-        
-        if not dataset_dir.exists():
-            logger.error(f"Dataset path not found: {dataset_path}")
-            return []
-        
-        # Obtener todas las imágenes
-        image_extensions = ['.jpg', '.jpeg', '.png']
-        all_images = [
-            str(img.absolute()) for img in dataset_dir.iterdir()
-            if img.suffix.lower() in image_extensions and img.is_file()
-        ]
-        
-        if not all_images:
-            logger.warning(f"No images found in {dataset_path}")
-            return []
-        
-        if len(all_images) < num_images:
-            logger.warning(
-                f"Only {len(all_images)} images available, "
-                f"requested {num_images}. Using all available."
-            )
-            return all_images
-        
-        # Seleccionar aleatoriamente
-        selected = random.sample(all_images, num_images)
+        with dataset_indexes_lock:
+            index = get_ready_index(dataset_path, num_images)
+            if index is None:
+                return []
+            
+            # Seleccionar aleatoriamente
+            selected = index.sample(num_images, shard)
         logger.info(f"✅ Selected {len(selected)} random images")
         return selected
         
@@ -61,86 +96,309 @@ def get_random_images(dataset_path: str, num_images: int) -> list:
         return []
 
 
-def trigger_predictions():
+def get_random_manifest(
+    dataset: str,
+    dataset_path: str,
+    num_images: int,
+    shard: Optional[Tuple[int, int]] = None
+) -> Tuple[Optional[dict], int]:
+    """
+    Como get_random_images, pero devuelve un manifiesto: la versión
+    publicada del índice y los ids de las imágenes, sin sus rutas.
+    
+    Returns:
+        (manifiesto o None si no hay imágenes, número de imágenes)
+    """
+    try:
+        # Publicación y muestreo sobre la misma versión del índice
+        with dataset_indexes_lock:
+            index = get_ready_index(dataset_path, num_images)
+            if index is None:
+                return None, 0
+            
+            version = index.publish(settings.MANIFEST_DIR, dataset, settings.MANIFEST_KEEP_VERSIONS)
+            ids = sorted(index.sample_ids(num_images, shard))
+        logger.info(f"✅ Selected {len(ids)} random images from {dataset}@{version}")
+        return make_manifest(dataset, version, ids), len(ids)
+        
+    except Exception as e:
+        logger.error(f"❌ Error selecting images: {e}", exc_info=True)
+        return None, 0
+
+
+# Estados finales de un job del orquestador
+JOB_DONE_STATES = ("completed", "failed", "cancelled")
+
+
+def log_job_result(result: dict):
+    """
+    Reporta el resumen de un batch terminado.
+    """
+    logger.info("")
+    logger.info("✅ PREDICTIONS COMPLETED SUCCESSFULLY")
+    logger.info(f"   📊 Total images processed: {result.get('total_processed', 0)}")
+    logger.info(f"   ✔️  Color: {result.get('color_processed', 0)}")
+    logger.info(f"   ✔️  Texture: {result.get('texture_processed', 0)}")
+    logger.info(f"   ✔️  Size: {result.get('size_processed', 0)}")
+    logger.info(f"   📤 Sent to ThingsBoard: {result.get('success', False)}")
+
+
+async def wait_for_job(client: httpx.AsyncClient, job_id: str, timeout: float) -> dict:
+    """
+    Sondea el job hasta que termina o pasan timeout segundos.
+    
+    Returns:
+        Último estado conocido del job
+    """
+    give_up = time.monotonic() + timeout
+    while True:
+        response = await client.get(
+            f"/jobs/{job_id}",
+            params={"offset": 10 ** 9}  # solo el estado, sin resultados parciales
+        )
+        response.raise_for_status()
+        job = response.json()
+        if job["status"] in JOB_DONE_STATES or time.monotonic() >= give_up:
+            return job
+        await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+
+
+async def post_job(client: httpx.AsyncClient, payload: dict, job_deadline: float) -> dict:
+    """
+    Envía el payload como job; el orquestador responde de inmediato.
+    
+    Args:
+        payload: Imágenes por modelo (listas de rutas o manifiestos)
+        job_deadline: Segundos que tiene el job para terminar (0 = sin deadline)
+    
+    Returns:
+        Job aceptado (job_id, total_images, ...)
+    """
+    logger.info(f"📡 Submitting job to orchestrator: {settings.ORCHESTRATOR_URL}/jobs")
+    
+    # El deadline viaja al orquestador y de ahí a los servicios ML, que
+    # descartan el trabajo vencido en vez de procesarlo
+    headers = {}
+    if job_deadline > 0:
+        headers["X-Deadline"] = f"{time.time() + job_deadline:.3f}"
+    
+    response = await client.post(
+        "/jobs",
+        json=payload,
+        # Solo se leen los conteos: el resumen no necesita las predicciones
+        params={"mode": "summary"},
+        headers=headers
+    )
+    
+    response.raise_for_status()
+    job = response.json()
+    logger.info("")
+    logger.info(f"📨 Job accepted: {job['job_id']} ({job['total_images']} images)")
+    return job
+
+
+async def run_job(client: httpx.AsyncClient, payload: dict, job_deadline: float, wait_timeout: float) -> Tuple[dict, dict]:
+    """
+    Envía el payload como job y espera a que termine.
+    
+    Args:
+        payload: Imágenes por modelo (listas de rutas o manifiestos)
+        job_deadline: Segundos que tiene el job para terminar (0 = sin deadline)
+        wait_timeout: Segundos máximos de espera
+    
+    Returns:
+        (detalles de la ejecución para el historial, último estado del job)
+    """
+    job = await post_job(client, payload, job_deadline)
+    details = {"job_id": job["job_id"], "images": job["total_images"]}
+    
+    job = await wait_for_job(client, job["job_id"], wait_timeout)
+    if job["status"] == "completed":
+        log_job_result(job.get("summary") or {})
+        return details, job
+    if job["status"] in ("queued", "running"):
+        logger.warning(
+            f"⚠️  Job {job['job_id']} still {job['status']} "
+            f"({job['completed_images']}/{job['total_images']} images), no longer waiting"
+        )
+        return {**details, "status": "timeout"}, job
+    logger.error(f"❌ Job {job['job_id']} {job['status']}: {job.get('error')}")
+    return {**details, "status": job["status"], "error": job.get("error")}, job
+
+
+async def submit_new_images(client: httpx.AsyncClient, batch: dict) -> str:
     """
-    Tarea que se ejecuta cada minuto.
-    Selecciona imágenes aleatorias de cada dataset y dispara el orquestador.
+    Envía las imágenes recién detectadas por el watcher, sin esperar al job.
+    
+    Args:
+        batch: Rutas nuevas por modelo (color, texture, size)
+    
+    Returns:
+        Id del job
+    """
+    payload = {f"{model}_images": paths for model, paths in batch.items()}
+    job = await post_job(client, payload, settings.JOB_DEADLINE)
+    return job["job_id"]
+
+
+async def check_new_images_job(client: httpx.AsyncClient, job_id: str) -> Optional[Set[str]]:
+    """
+    Estado de un job del watcher.
+    
+    Returns:
+        None si sigue en curso; si terminó, las rutas que recibieron
+        predicción (un job "completed" puede tener imágenes sin ella: circuit
+        breaker abierto, deadline vencido...)
+    
+    Raises:
+        JobLost: Si el orquestador ya no tiene el job
+    """
+    # Primero solo el estado; los resultados se piden una vez, al terminar
+    for offset in (10 ** 9, 0):
+        response = await client.get(f"/jobs/{job_id}", params={"offset": offset})
+        if response.status_code == 404:
+            raise JobLost(job_id)
+        response.raise_for_status()
+        job = response.json()
+        if job["status"] not in JOB_DONE_STATES:
+            return None
+    return {event["image_path"] for event in job["results"] if event.get("result")}
+
+
+async def trigger_predictions(
+    client: httpx.AsyncClient,
+    adaptive: Optional[AdaptiveController] = None,
+    shard: Optional[Tuple[int, int]] = None
+) -> dict:
+    """
+    Tarea de cada tick.
+    Selecciona imágenes aleatorias de cada dataset, envía el batch al
+    orquestador como job en segundo plano y espera a que termine. Con
+    adaptive, las imágenes por dataset y el deadline salen del controlador,
+    que se alimenta con los tiempos del batch. Con shard, la réplica toma
+    solo su parte de las imágenes, de su partición de cada dataset.
+    
+    Returns:
+        Detalles de la ejecución para el historial
     """
     logger.info("")
     logger.info("=" * 70)
     logger.info("⏰ SCHEDULER TASK TRIGGERED")
     logger.info("=" * 70)
     
+    num_images = adaptive.images if adaptive else settings.NUM_IMAGES
+    if shard:
+        num_images = math.ceil(num_images / shard[1])
+        logger.info(f"🧩 Shard {shard[0] + 1}/{shard[1]}: {num_images} images per dataset")
+    job_deadline = settings.JOB_DEADLINE
+    if adaptive:
+        job_deadline *= adaptive.interval / settings.SCHEDULE_INTERVAL
+    
     try:
         # Seleccionar imágenes de cada dataset
         logger.info(f"📁 Scanning datasets...")
         
-        color_images = get_random_images(settings.DATASET_COLOR_PATH, settings.NUM_IMAGES)
-        texture_images = get_random_images(settings.DATASET_TEXTURE_PATH, settings.NUM_IMAGES)
-        size_images = get_random_images(settings.DATASET_SIZE_PATH, settings.NUM_IMAGES)
+        if settings.MANIFEST_DIR:
+            # Solo ids de imágenes; el orquestador y los servicios ML resuelven
+            # las rutas con la versión publicada del índice
+            color_manifest, color_count = await asyncio.to_thread(
+                get_random_manifest, "color", settings.DATASET_COLOR_PATH, num_images, shard
+            )
+            texture_manifest, texture_count = await asyncio.to_thread(
+                get_random_manifest, "texture", settings.DATASET_TEXTURE_PATH, num_images, shard
+            )
+            size_manifest, size_count = await asyncio.to_thread(
+                get_random_manifest, "size", settings.DATASET_SIZE_PATH, num_images, shard
+            )
+            payload = {
+                "color_manifest": color_manifest,
+                "texture_manifest": texture_manifest,
+                "size_manifest": size_manifest
+            }
+        else:
+            color_images = await asyncio.to_thread(get_random_images, settings.DATASET_COLOR_PATH, num_images, shard)
+            texture_images = await asyncio.to_thread(get_random_images, settings.DATASET_TEXTURE_PATH, num_images, shard)
+            size_images = await asyncio.to_thread(get_random_images, settings.DATASET_SIZE_PATH, num_images, shard)
+            color_count, texture_count, size_count = len(color_images), len(texture_images), len(size_images)
+            
+            # Preparar payload con las 3 listas de imágenes
+            payload = {
+                "color_images": color_images,
+                "texture_images": texture_images,
+                "size_images": size_images
+            }
         
         # Verificar que al menos tenemos imágenes de color
-        if not color_images:
+        if not color_count:
             logger.warning("⚠️  No color images found, skipping task")
-            return
+            return {"status": "no_images"}
         
         logger.info(f"🖼️  Selected images:")
-        logger.info(f"   Color: {len(color_images)} images")
-        logger.info(f"   Texture: {len(texture_images)} images")
-        logger.info(f"   Size: {len(size_images)} images")
+        logger.info(f"   Color: {color_count} images")
+        logger.info(f"   Texture: {texture_count} images")
+        logger.info(f"   Size: {size_count} images")
         
         # Mostrar primeras 3 imágenes de color
-        for i, img in enumerate(color_images[:3], 1):
-            logger.info(f"     {i}. {Path(img).name}")
-        if len(color_images) > 3:
-            logger.info(f"     ... and {len(color_images) - 3} more")
-        
-        # Preparar payload con las 3 listas de imágenes
-        payload = {
-            "color_images": color_images,
-            "texture_images": texture_images,
-            "size_images": size_images
-        }
-        
-        # Llamar al orchestrator
-        url = f"{settings.ORCHESTRATOR_URL}/predict-batch"
-        logger.info(f"📡 Calling orchestrator: {url}")
-        
-        response = requests.post(
-            url,
-            json=payload,
-            timeout=300  # 5 minutos
-        )
+        if not settings.MANIFEST_DIR:
+            for i, img in enumerate(color_images[:3], 1):
+                logger.info(f"     {i}. {Path(img).name}")
+            if len(color_images) > 3:
+                logger.info(f"     ... and {len(color_images) - 3} more")
         
-        response.raise_for_status()
-        result = response.json()
+        # Se espera un poco más que el deadline: el orquestador cierra el job al vencer
+        details, job = await run_job(
+            client, payload, job_deadline,
+            (job_deadline or (adaptive.interval if adaptive else settings.SCHEDULE_INTERVAL)) + 30
+        )
+        if adaptive:
+            if job["status"] == "completed":
+                adaptive.observe(
+                    {"color": color_count, "texture": texture_count, "size": size_count},
+                    (job.get("summary") or {}).get("timings") or {}
+                )
+            else:
+                adaptive.back_off(f"job {job['status']}")
+        return details
         
-        # Log resultado
-        logger.info("")
-        logger.info("✅ PREDICTIONS COMPLETED SUCCESSFULLY")
-        logger.info(f"   📊 Total images processed: {result.get('total_processed', 0)}")
-        logger.info(f"   ✔️  Color: {result.get('color_processed', 0)}")
-        logger.info(f"   ✔️  Texture: {result.get('texture_processed', 0)}")
-        logger.info(f"   ✔️  Size: {result.get('size_processed', 0)}")
-        logger.info(f"   📤 Sent to ThingsBoard: {result.get('success', False)}")
-        
-    except requests.exceptions.Timeout:
-        logger.error("❌ TIMEOUT calling orchestrator (>5min)")
-    except requests.exceptions.ConnectionError as e:
+    except httpx.TimeoutException:
+        logger.error("❌ TIMEOUT talking to orchestrator")
+        raise
+    except httpx.ConnectError as e:
         logger.error(f"❌ CONNECTION ERROR: {e}")
-    except requests.exceptions.HTTPError as e:
+        raise
+    except httpx.HTTPStatusError as e:
         logger.error(f"❌ HTTP ERROR: {e.response.status_code}")
         logger.error(f"   Response: {e.response.text[:200]}")
-    except Exception as e:
-        logger.error(f"❌ UNEXPECTED ERROR: {e}", exc_info=True)
+        # Cola de jobs llena en el orquestador
+        if adaptive and e.response.status_code == 503:
+            adaptive.back_off("orchestrator busy")
+        raise
     
-    logger.info("=" * 70)
-    logger.info("")
+    finally:
+        logger.info("=" * 70)
+        logger.info("")
 
 
-def main():
+def print_history(limit: int):
     """
-    Inicializa el scheduler y mantiene el proceso corriendo.
+    Muestra las últimas ejecuciones registradas.
+    """
+    history = RunHistory(settings.RUN_HISTORY_DB or None)
+    for run in history.recent(limit):
+        scheduled = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run["scheduled_at"]))
+        duration = f"{run['duration']:.1f}s" if run["duration"] is not None else "-"
+        lateness = f"+{run['started_at'] - run['scheduled_at']:.1f}s" if run["started_at"] else "-"
+        print(
+            f"{scheduled}  {run['status']:<10} {duration:>8} {lateness:>8}  "
+            f"{run['images'] or 0:>4} img  {'catch-up ' if run['catch_up'] else ''}"
+            f"{run['job_id'] or ''} {run['error'] or ''}"
+        )
+    history.close()
+
+
+async def run_scheduler():
+    """
+    Inicializa el scheduler y lo mantiene corriendo hasta SIGTERM/SIGINT.
     """
     logger.info("=" * 70)
     logger.info("🚀 SCHEDULER SERVICE STARTING")
@@ -150,8 +408,27 @@ def main():
     logger.info(f"   📁 Color dataset: {settings.DATASET_COLOR_PATH}")
     logger.info(f"   📁 Texture dataset: {settings.DATASET_TEXTURE_PATH}")
     logger.info(f"   📁 Size dataset: {settings.DATASET_SIZE_PATH}")
-    logger.info(f"   ⏱️  Interval: {settings.SCHEDULE_INTERVAL} seconds")
+    logger.info(f"   🎯 Trigger mode: {settings.TRIGGER_MODE}")
+    logger.info(f"   ⏱️  Interval: {settings.SCHEDULE_INTERVAL} seconds (jitter {settings.SCHEDULE_JITTER}s)")
+    logger.info(f"   🔀 Overlap: {settings.OVERLAP_POLICY}, catch-up: {settings.CATCH_UP_POLICY}")
     logger.info(f"   🖼️  Images per batch: {settings.NUM_IMAGES}")
+    if settings.ADAPTIVE_SCHEDULING:
+        logger.info(
+            f"   📐 Adaptive: {settings.TARGET_UTILIZATION:.0%} utilization, "
+            f"{settings.MIN_IMAGES}-{settings.MAX_IMAGES} images, "
+            f"{settings.MIN_INTERVAL:.0f}-{settings.MAX_INTERVAL:.0f}s"
+        )
+    if settings.LEADER_ELECTION != "none":
+        logger.info(
+            f"   🗳️  Leader election: {settings.LEADER_ELECTION} "
+            f"(lease {settings.LEADER_LEASE_TTL:.0f}s, shard images: {settings.SHARD_IMAGES})"
+        )
+        # Un líder caído se sustituye en hasta ttl + ttl/3 segundos
+        if settings.LEADER_LEASE_TTL * 4 / 3 >= settings.SCHEDULE_INTERVAL:
+            logger.warning(
+                f"⚠️  LEADER_LEASE_TTL ({settings.LEADER_LEASE_TTL:.0f}s) is too long for "
+                f"SCHEDULE_INTERVAL ({settings.SCHEDULE_INTERVAL}s): a failover may miss a tick"
+            )
     logger.info("=" * 70)
     logger.info("")
     
@@ -178,34 +455,145 @@ def main():
     
     logger.info("")
     
-    # Crear scheduler
-    scheduler = BlockingScheduler()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
     
-    # Agregar job
-    scheduler.add_job(
-        func=trigger_predictions,
-        trigger=IntervalTrigger(seconds=settings.SCHEDULE_INTERVAL),
-        id='prediction_task',
-        name='Trigger ML predictions',
-        replace_existing=True
-    )
+    # Un único cliente con keep-alive para todas las ejecuciones
+    async with httpx.AsyncClient(
+        base_url=settings.ORCHESTRATOR_URL,
+        timeout=30,
+        limits=httpx.Limits(max_connections=settings.HTTP_MAX_CONNECTIONS)
+    ) as client:
+        history = RunHistory(settings.RUN_HISTORY_DB or None, settings.RUN_HISTORY_SIZE)
+        adaptive = None
+        if settings.ADAPTIVE_SCHEDULING:
+            adaptive = AdaptiveController(
+                settings.NUM_IMAGES,
+                settings.SCHEDULE_INTERVAL,
+                target_utilization=settings.TARGET_UTILIZATION,
+                min_images=settings.MIN_IMAGES,
+                max_images=settings.MAX_IMAGES,
+                min_interval=settings.MIN_INTERVAL,
+                max_interval=settings.MAX_INTERVAL,
+                smoothing=settings.ADAPTIVE_SMOOTHING,
+                max_step=settings.ADAPTIVE_MAX_STEP
+            )
+        
+        # Varias réplicas: solo dispara la líder (o cada una su partición)
+        elector = None
+        if settings.LEADER_ELECTION != "none":
+            elector = LeaderElector(
+                create_backend(settings.LEADER_ELECTION, settings.LEADER_SQLITE_PATH, settings.LEADER_REDIS_URL),
+                name=settings.LEADER_NAME,
+                ttl=settings.LEADER_LEASE_TTL,
+                sharding=settings.SHARD_IMAGES
+            )
+        
+        def can_run() -> bool:
+            if settings.SHARD_IMAGES:
+                return elector.shard is not None
+            return elector.is_leader
+        
+        async def tick():
+            try:
+                shard = elector.shard if elector and settings.SHARD_IMAGES else None
+                return await trigger_predictions(client, adaptive, shard)
+            finally:
+                if adaptive:
+                    scheduler.interval = adaptive.interval
+        
+        def on_skip():
+            # Un tick descartado significa que el anterior no terminó a tiempo
+            if adaptive:
+                adaptive.back_off("tick skipped")
+                scheduler.interval = adaptive.interval
+        
+        scheduler = AsyncScheduler(
+            tick,
+            adaptive.interval if adaptive else settings.SCHEDULE_INTERVAL,
+            history,
+            overlap=settings.OVERLAP_POLICY,
+            max_concurrent=settings.MAX_CONCURRENT_RUNS,
+            max_queued=settings.MAX_QUEUED_RUNS,
+            jitter=settings.SCHEDULE_JITTER,
+            catch_up=settings.CATCH_UP_POLICY,
+            max_catch_up=settings.MAX_CATCH_UP_RUNS,
+            on_skip=on_skip,
+            gate=can_run if elector else None,
+            # Un slot que el líder caído no llegó a ejecutar lo ejecuta quien
+            # toma el relevo (ver LeaderElector)
+            gate_grace=elector.failover_time if elector else 0.0,
+            align=elector is not None
+        )
+        
+        runs = []
+        if settings.TRIGGER_MODE in ("schedule", "both"):
+            runs.append(scheduler.run_forever(stop))
+        
+        # Imágenes nuevas: se envían en cuanto llegan, cada una una sola vez
+        ledger = None
+        if settings.TRIGGER_MODE in ("watch", "both"):
+            ledger = WatchLedger(settings.WATCH_LEDGER_DB or None, settings.WATCH_LEDGER_SIZE)
+            
+            # Un watcher nuevo en cada mandato: retoma los índices que dejó
+            # el líder anterior y lo que quedó pendiente en el ledger
+            def make_watcher() -> DatasetWatcher:
+                return DatasetWatcher(
+                    {
+                        "color": settings.DATASET_COLOR_PATH,
+                        "texture": settings.DATASET_TEXTURE_PATH,
+                        "size": settings.DATASET_SIZE_PATH
+                    },
+                    lambda batch: submit_new_images(client, batch),
+                    lambda job_id: check_new_images_job(client, job_id),
+                    ledger,
+                    backend=settings.WATCH_BACKEND,
+                    index_dir=settings.DATASET_INDEX_DIR,
+                    poll_interval=settings.WATCH_POLL_INTERVAL,
+                    rescan_interval=settings.WATCH_RESCAN_INTERVAL,
+                    debounce=settings.WATCH_DEBOUNCE,
+                    max_delay=settings.WATCH_MAX_DELAY,
+                    max_batch=settings.WATCH_MAX_BATCH,
+                    settle=settings.WATCH_SETTLE,
+                    check_interval=settings.JOB_POLL_INTERVAL,
+                    max_attempts=settings.WATCH_MAX_ATTEMPTS
+                )
+            
+            if elector:
+                # Solo el líder vigila: las imágenes nuevas se envían una vez
+                runs.append(elector.while_leader(lambda term: make_watcher().run(term), stop))
+            else:
+                runs.append(make_watcher().run(stop))
+        
+        if elector:
+            runs.append(elector.run(stop))
+        
+        logger.info(f"✅ Scheduler configured successfully ({settings.TRIGGER_MODE} mode)")
+        logger.info("   Press Ctrl+C to stop")
+        logger.info("")
+        
+        try:
+            await asyncio.gather(*runs)
+        finally:
+            history.close()
+            if ledger is not None:
+                ledger.close()
+            if elector is not None:
+                await elector.backend.close()
     
-    logger.info("✅ Scheduler configured successfully")
-    logger.info(f"⏰ First execution will be in {settings.SCHEDULE_INTERVAL} seconds")
-    logger.info("   Press Ctrl+C to stop")
     logger.info("")
-    
-    # Opcional: ejecutar inmediatamente la primera vez
-    # Descomentar si quieres que corra al inicio
-    # logger.info("🏃 Running first task immediately...")
-    # trigger_predictions()
-    
-    try:
-        scheduler.start()
-    except (KeyboardInterrupt, SystemExit):
-        logger.info("")
-        logger.info("🛑 Scheduler stopped by user")
+    logger.info("🛑 Scheduler stopped")
+
+
+def main():
+    # python scheduler.py --history [N]: últimas ejecuciones registradas
+    if len(sys.argv) > 1 and sys.argv[1] == "--history":
+        print_history(int(sys.argv[2]) if len(sys.argv) > 2 else 20)
+        return
+    asyncio.run(run_scheduler())
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+import pytest
+
+from leader import LeaderElector, LeaseBackend, SQLiteLeaseBackend
+
+TTL = 0.6
+
+
+def make_elector(path, owner: str) -> LeaderElector:
+    return LeaderElector(SQLiteLeaseBackend(str(path)), owner=owner, ttl=TTL)
+
+
+async def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+
+async def no_release(name: str, owner: str):
+    pass
+
+
+def test_lease_backend_is_abstract():
+    with pytest.raises(TypeError):
+        LeaseBackend()
+
+
+def test_single_leader(tmp_path):
+    async def scenario():
+        electors = [make_elector(tmp_path / "leases.sqlite", owner) for owner in ("a", "b")]
+        stop = asyncio.Event()
+        tasks = [asyncio.create_task(elector.run(stop)) for elector in electors]
+
+        await wait_for(lambda: any(elector.is_leader for elector in electors))
+        leaders = set()
+        deadline = time.monotonic() + 3 * TTL
+        while time.monotonic() < deadline:
+            current = [elector.owner for elector in electors if elector.is_leader]
+            assert len(current) <= 1
+            leaders.update(current)
+            await asyncio.sleep(0.01)
+        # Con el líder renovando, el liderazgo no cambia de manos
+        assert len(leaders) == 1
+
+        stop.set()
+        await asyncio.gather(*tasks)
+        for elector in electors:
+            await elector.backend.close()
+
+    asyncio.run(scenario())
+
+
+def test_takeover_after_leader_stops_renewing(tmp_path):
+    async def scenario():
+        path = tmp_path / "leases.sqlite"
+        leader, standby = make_elector(path, "a"), make_elector(path, "b")
+        stop = asyncio.Event()
+        leader_task = asyncio.create_task(leader.run(stop))
+        await wait_for(lambda: leader.is_leader)
+        standby_task = asyncio.create_task(standby.run(stop))
+        await asyncio.sleep(TTL)
+        assert not standby.is_leader
+
+        # Caída del líder: deja de renovar sin soltar el lease
+        leader.backend.release = no_release
+        valid_until = leader._valid_until
+        stopped_at = time.monotonic()
+        leader_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader_task
+
+        await wait_for(lambda: standby.is_leader, timeout=2 * standby.failover_time)
+        took_over_at = time.monotonic()
+        assert took_over_at - stopped_at <= standby.failover_time
+        # El lease del líder caído ya había vencido para él
+        assert took_over_at >= valid_until
+
+        stop.set()
+        await standby_task
+        await leader.backend.close()
+        await standby.backend.close()
+
+    asyncio.run(scenario())
+
+
+def test_graceful_stop_hands_over_at_next_renewal(tmp_path):
+    async def scenario():
+        path = tmp_path / "leases.sqlite"
+        leader, standby = make_elector(path, "a"), make_elector(path, "b")
+        leader_stop, standby_stop = asyncio.Event(), asyncio.Event()
+        leader_task = asyncio.create_task(leader.run(leader_stop))
+        await wait_for(lambda: leader.is_leader)
+        standby_task = asyncio.create_task(standby.run(standby_stop))
+        await asyncio.sleep(0.05)
+
+        # Al parar suelta el lease: no hace falta esperar a que venza
+        stopped_at = time.monotonic()
+        leader_stop.set()
+        await leader_task
+        await wait_for(lambda: standby.is_leader, timeout=2 * standby.failover_time)
+        assert time.monotonic() - stopped_at <= standby.renew_every + 0.2
+
+        standby_stop.set()
+        await standby_task
+        await leader.backend.close()
+        await standby.backend.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,568 @@
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from dataset_index import IMAGE_EXTENSIONS, DatasetIndex
+
+logger = logging.getLogger(__name__)
+
+# Backends de detección
+#   inotify: eventos del kernel (Linux), con un re-listado periódico de respaldo
+#   poll: re-listado cada poll_interval segundos (volúmenes sin inotify)
+#   auto: inotify si está disponible, si no poll
+WATCH_BACKENDS = ("auto", "inotify", "poll")
+
+# Eventos de inotify: archivo cerrado tras escribirse o movido al directorio
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+
+class Inotify:
+    """
+    inotify vía ctypes sobre la libc, sin dependencias. Vigila un directorio
+    por modelo y devuelve las imágenes terminadas de escribir.
+
+    Raises:
+        OSError: Si inotify no está disponible (otro SO, límite de watches)
+    """
+    def __init__(self, directories: Dict[str, str]):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify not available")
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self._watches: Dict[int, tuple] = {}
+        for model, directory in directories.items():
+            wd = libc.inotify_add_watch(self.fd, directory.encode(), IN_CLOSE_WRITE | IN_MOVED_TO)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(errno, f"inotify_add_watch failed for {directory}")
+            self._watches[wd] = (model, directory)
+
+        # Se desbordó la cola del kernel: hay que volver a listar
+        self.overflowed = False
+
+    def read(self) -> Dict[str, List[str]]:
+        """
+        Imágenes nuevas por modelo desde la última lectura.
+        """
+        found: Dict[str, List[str]] = {}
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return found
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0").decode(errors="surrogateescape")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    self.overflowed = True
+                    continue
+                watch = self._watches.get(wd)
+                if watch and name.lower().endswith(IMAGE_EXTENSIONS):
+                    model, directory = watch
+                    found.setdefault(model, []).append(os.path.join(directory, name))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class WatchLedger:
+    """
+    Registro en SQLite (o en memoria con path=None) de las imágenes
+    detectadas y de en qué punto están.
+
+    La ruta es la clave: una imagen detectada dos veces (evento y re-listado,
+    o dos eventos) se registra una vez. Cada imagen está pendiente, enviada
+    (con el id de su job) o terminada; todo sobrevive a un reinicio. Se
+    conservan como mucho max_rows imágenes terminadas.
+
+    Los métodos son bloqueantes; DatasetWatcher los llama con
+    asyncio.to_thread para no frenar el event loop.
+    """
+    def __init__(self, path: Optional[str] = None, max_rows: int = 100000):
+        self.max_rows = max(1, max_rows)
+        # Sin check_same_thread: el lock serializa las llamadas desde hilos
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " detected_at REAL NOT NULL,"
+            " job_id TEXT,"
+            " done_at REAL)"
+        )
+        # Columnas añadidas después: un ledger anterior se amplía al abrirlo
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(files)")}
+        if "attempts" not in columns:
+            self._db.execute("ALTER TABLE files ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        if "failed" not in columns:
+            self._db.execute("ALTER TABLE files ADD COLUMN failed INTEGER NOT NULL DEFAULT 0")
+        self._db.execute("CREATE INDEX IF NOT EXISTS files_pending ON files (done_at, detected_at)")
+        self._db.commit()
+
+    def add(self, model: str, paths: List[str]) -> List[str]:
+        """
+        Registra las imágenes detectadas.
+
+        Returns:
+            Las que no estaban registradas
+        """
+        with self._lock:
+            now = time.time()
+            new = []
+            for path in paths:
+                cursor = self._db.execute(
+                    "INSERT OR IGNORE INTO files (path, model, detected_at) VALUES (?, ?, ?)",
+                    (path, model, now)
+                )
+                if cursor.rowcount:
+                    new.append(path)
+            self._db.commit()
+            return new
+
+    def pending(self, limit: int) -> Dict[str, List[str]]:
+        """
+        Hasta limit imágenes sin enviar por modelo, las más antiguas primero.
+        """
+        with self._lock:
+            batch: Dict[str, List[str]] = {}
+            for path, model in self._db.execute(
+                "SELECT path, model FROM files WHERE done_at IS NULL AND job_id IS NULL"
+                " ORDER BY detected_at LIMIT ?", (limit,)
+            ):
+                batch.setdefault(model, []).append(path)
+            return batch
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM files WHERE done_at IS NULL AND job_id IS NULL"
+            ).fetchone()[0]
+
+    def submitted(self, paths: List[str], job_id: str):
+        """
+        Las imágenes van en job_id: dejan de estar pendientes hasta que se
+        sepa cómo terminó.
+        """
+        with self._lock:
+            self._db.executemany(
+                "UPDATE files SET job_id = ? WHERE path = ?", [(job_id, path) for path in paths]
+            )
+            self._db.commit()
+
+    def in_flight(self) -> Dict[str, List[str]]:
+        """
+        Imágenes enviadas y sin terminar, por id de job.
+        """
+        with self._lock:
+            jobs: Dict[str, List[str]] = {}
+            for path, job_id in self._db.execute(
+                "SELECT path, job_id FROM files WHERE done_at IS NULL AND job_id IS NOT NULL"
+            ):
+                jobs.setdefault(job_id, []).append(path)
+            return jobs
+
+    def retry(self, paths: List[str], max_attempts: int) -> List[str]:
+        """
+        Vuelven a pendientes las imágenes sin predicción; las que ya agotaron
+        max_attempts intentos se dan por terminadas como fallidas.
+
+        Returns:
+            Las que se dieron por fallidas
+        """
+        with self._lock:
+            now = time.time()
+            self._db.executemany(
+                "UPDATE files SET job_id = NULL, attempts = attempts + 1 WHERE path = ?",
+                [(path,) for path in paths]
+            )
+            failed = [
+                path for path in paths
+                if self._db.execute("SELECT attempts FROM files WHERE path = ?", (path,)).fetchone()[0] >= max_attempts
+            ]
+            self._db.executemany(
+                "UPDATE files SET done_at = ?, failed = 1 WHERE path = ?", [(now, path) for path in failed]
+            )
+            self._db.commit()
+            return failed
+
+    def mark_done(self, paths: List[str], job_id: Optional[str]):
+        with self._lock:
+            now = time.time()
+            self._db.executemany(
+                "UPDATE files SET done_at = ?, job_id = ? WHERE path = ?",
+                [(now, job_id, path) for path in paths]
+            )
+            self._db.execute(
+                "DELETE FROM files WHERE done_at IS NOT NULL AND path IN ("
+                " SELECT path FROM files WHERE done_at IS NOT NULL"
+                " ORDER BY done_at DESC LIMIT -1 OFFSET ?)", (self.max_rows,)
+            )
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class JobLost(Exception):
+    """
+    El orquestador ya no conoce el job (se reinició o lo purgó).
+    """
+
+
+# Envía un lote {modelo: rutas} como job y devuelve su id, sin esperarlo
+SubmitBatch = Callable[[Dict[str, List[str]]], Awaitable[str]]
+# Estado de un job: None si sigue en curso; al terminar, las rutas que
+# recibieron predicción. Lanza JobLost si el job ya no existe
+CheckJob = Callable[[str], Awaitable[Optional[Set[str]]]]
+
+
+class DatasetWatcher:
+    """
+    Detecta imágenes nuevas en los datasets y las envía en cuanto llegan.
+
+    Las imágenes detectadas se acumulan hasta que pasan debounce segundos
+    sin novedades (como mucho max_delay desde la primera, o al juntar
+    max_batch) y se envían juntas como un job, sin esperarlo. Cada imagen se
+    registra en el ledger al detectarse y, al enviarse, con el id de su job.
+    Los jobs en curso se consultan cada check_interval segundos (también los
+    que quedaron del proceso anterior): nunca se reenvía una imagen cuyo job
+    sigue en marcha. Al terminar, solo las imágenes con predicción se marcan
+    procesadas; el resto vuelve a pendientes y se reintenta con backoff
+    exponencial, hasta max_attempts veces.
+
+    Al arrancar, las imágenes añadidas mientras el servicio estuvo parado
+    salen del índice persistido (un índice sin estado previo solo fija la
+    línea base). En modo poll, un archivo se envía cuando su mtime tiene al
+    menos settle segundos, para no leerlo a medio escribir.
+    """
+    def __init__(
+        self,
+        directories: Dict[str, str],
+        submit: SubmitBatch,
+        check: CheckJob,
+        ledger: WatchLedger,
+        backend: str = "auto",
+        index_dir: str = "",
+        poll_interval: float = 2.0,
+        rescan_interval: float = 60.0,
+        debounce: float = 1.0,
+        max_delay: float = 5.0,
+        max_batch: int = 500,
+        settle: float = 1.0,
+        check_interval: float = 2.0,
+        max_attempts: int = 5
+    ):
+        if backend not in WATCH_BACKENDS:
+            raise ValueError(f"Unknown watch backend: {backend} (expected one of {WATCH_BACKENDS})")
+
+        self.directories = {model: path for model, path in directories.items() if os.path.isdir(path)}
+        self.submit = submit
+        self.check = check
+        self.ledger = ledger
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self.debounce = debounce
+        self.max_delay = max(debounce, max_delay)
+        self.max_batch = max(1, max_batch)
+        self.settle = settle
+        self.check_interval = check_interval
+        self.max_attempts = max(1, max_attempts)
+
+        self.index_dir = index_dir
+
+        # Índice propio (el muestreo aleatorio refresca el suyo por su cuenta),
+        # cargado en run()
+        self.indexes: Dict[str, DatasetIndex] = {}
+
+        self._inotify: Optional[Inotify] = None
+        self._events: Dict[str, List[str]] = {}
+        self._events_ready = asyncio.Event()
+        self._wake = asyncio.Event()
+        # Los índices y _settling solo los toca un re-listado a la vez
+        self._poll_lock = asyncio.Lock()
+        self._settling: Dict[str, str] = {}
+        self._first_at: Optional[float] = None
+        self._last_at = 0.0
+        self._retry_at = 0.0
+        self._failures = 0
+
+        # Métricas
+        self.detected = 0
+        self.submitted = 0
+        self.batches = 0
+        self.retries = 0
+        self.processed = 0
+        self.failed = 0
+
+    def _open_backend(self) -> str:
+        if self.backend in ("auto", "inotify"):
+            try:
+                self._inotify = Inotify(self.directories)
+                asyncio.get_running_loop().add_reader(self._inotify.fd, self._on_inotify)
+                return "inotify"
+            except OSError as e:
+                if self.backend == "inotify":
+                    raise
+                logger.warning(f"⚠️  inotify unavailable ({e}), polling every {self.poll_interval}s")
+        return "poll"
+
+    def _on_inotify(self):
+        # Solo lee el fd; el registro en el ledger se hace en _inotify_loop
+        for model, paths in self._inotify.read().items():
+            self._events.setdefault(model, []).extend(paths)
+        self._events_ready.set()
+
+    async def _inotify_loop(self):
+        while True:
+            await self._events_ready.wait()
+            self._events_ready.clear()
+            events, self._events = self._events, {}
+            for model, paths in events.items():
+                await self._detected(model, paths)
+            if self._inotify.overflowed:
+                # Se perdieron eventos: el re-listado los recupera
+                self._inotify.overflowed = False
+                logger.warning("⚠️  inotify queue overflowed, rescanning")
+                await self._poll()
+
+    async def _detected(self, model: str, paths: List[str]):
+        new = await asyncio.to_thread(self.ledger.add, model, paths)
+        if not new:
+            return
+        self.detected += len(new)
+        logger.info(f"👀 {len(new)} new {model} images")
+        self._touch()
+
+    def _touch(self):
+        now = time.monotonic()
+        if self._first_at is None:
+            self._first_at = now
+        self._last_at = now
+        self._wake.set()
+
+    def _load_indexes(self):
+        """
+        Carga los índices: fija la línea base, o deja en espera lo añadido
+        mientras el servicio estuvo parado.
+        """
+        for model, path in self.directories.items():
+            index = self.indexes[model] = DatasetIndex(
+                path,
+                os.path.join(self.index_dir, f"{model}.watch.json") if self.index_dir else None
+            )
+            if index.restored:
+                for added in index.poll_added():
+                    self._settling[added] = model
+            else:
+                index.refresh()
+
+    def _collect_added(self) -> Dict[str, List[str]]:
+        """
+        Re-lista los directorios que cambiaron.
+
+        Returns:
+            Las imágenes nuevas cuyo contenido ya es estable, por modelo
+        """
+        for model, index in self.indexes.items():
+            for path in index.poll_added():
+                self._settling[path] = model
+
+        ready: Dict[str, List[str]] = {}
+        cutoff = time.time() - self.settle
+        for path, model in list(self._settling.items()):
+            try:
+                if os.stat(path).st_mtime > cutoff:
+                    continue
+            except FileNotFoundError:
+                pass
+            else:
+                ready.setdefault(model, []).append(path)
+            del self._settling[path]
+        return ready
+
+    async def _poll(self):
+        """
+        Registra las imágenes nuevas de los directorios que cambiaron. El
+        listado y el guardado de los índices van en un hilo: con datasets
+        grandes tardan, y el event loop también renueva el lease del líder.
+        """
+        async with self._poll_lock:
+            ready = await asyncio.to_thread(self._collect_added)
+        for model, paths in ready.items():
+            await self._detected(model, paths)
+
+    async def _poll_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self._poll()
+
+    async def _due_in(self) -> Optional[float]:
+        """
+        Segundos hasta el próximo envío, o None si no hay nada pendiente.
+        """
+        if self._first_at is None:
+            return None
+        due = min(self._last_at + self.debounce, self._first_at + self.max_delay)
+        if await asyncio.to_thread(self.ledger.pending_count) >= self.max_batch:
+            due = time.monotonic()
+        return max(due, self._retry_at) - time.monotonic()
+
+    def _back_off(self, count: int):
+        self.retries += 1
+        self._failures += 1
+        backoff = min(60.0, 2.0 ** self._failures)
+        self._retry_at = time.monotonic() + backoff
+        logger.warning(f"🔁 {count} new images will be retried in {backoff:.0f}s")
+
+    async def _flush(self):
+        batch = await asyncio.to_thread(self.ledger.pending, self.max_batch)
+        paths = [path for model_paths in batch.values() for path in model_paths]
+        if not paths:
+            self._first_at = None
+            return
+
+        self.batches += 1
+        counts = ", ".join(f"{model}: {len(model_paths)}" for model, model_paths in batch.items())
+        logger.info(f"📤 Submitting {len(paths)} new images ({counts})")
+        try:
+            job_id = await self.submit(batch)
+        except Exception as e:
+            logger.error(f"❌ Submitting new images failed: {e}")
+            self._back_off(len(paths))
+            return
+
+        await asyncio.to_thread(self.ledger.submitted, paths, job_id)
+        self.submitted += len(paths)
+        self._retry_at = 0.0
+        # Lo que no cupo en el lote sale en el siguiente
+        self._first_at = time.monotonic() if await asyncio.to_thread(self.ledger.pending_count) else None
+
+    async def _check_jobs(self):
+        """
+        Cierra los jobs terminados: sus imágenes con predicción quedan
+        procesadas y el resto vuelve a pendientes.
+        """
+        jobs = await asyncio.to_thread(self.ledger.in_flight)
+        for job_id, paths in jobs.items():
+            try:
+                predicted = await self.check(job_id)
+            except JobLost:
+                logger.warning(f"⚠️  Job {job_id} is gone, {len(paths)} images back to pending")
+                predicted = set()
+            except Exception as e:
+                logger.warning(f"⚠️  Could not check job {job_id}: {e}")
+                continue
+            if predicted is None:
+                continue
+
+            done = [path for path in paths if path in predicted]
+            missing = [path for path in paths if path not in predicted]
+            if done:
+                await asyncio.to_thread(self.ledger.mark_done, done, job_id)
+                self.processed += len(done)
+            if not missing:
+                self._failures = 0
+                logger.info(f"✅ Job {job_id}: {len(done)} new images processed")
+                continue
+
+            failed = await asyncio.to_thread(self.ledger.retry, missing, self.max_attempts)
+            self.failed += len(failed)
+            if failed:
+                logger.error(f"❌ {len(failed)} new images failed {self.max_attempts} times, giving up")
+            retried = len(missing) - len(failed)
+            logger.warning(f"⚠️  Job {job_id}: {len(done)} processed, {len(missing)} without prediction")
+            if retried:
+                self._back_off(retried)
+                self._touch()
+
+    async def _check_loop(self):
+        while True:
+            await self._check_jobs()
+            await asyncio.sleep(self.check_interval)
+
+    async def run(self, stop: asyncio.Event):
+        """
+        Vigila los datasets hasta que se activa stop.
+        """
+        if not self.directories:
+            logger.warning("⚠️  No dataset directories to watch")
+            return
+
+        backend = self._open_backend()
+        logger.info(f"👀 Watching {', '.join(self.directories.values())} ({backend})")
+
+        # Línea base, o lo añadido mientras el servicio estuvo parado
+        async with self._poll_lock:
+            await asyncio.to_thread(self._load_indexes)
+        await self._poll()
+        # Pendientes de una ejecución anterior
+        if await asyncio.to_thread(self.ledger.pending_count):
+            self._touch()
+
+        inotify_reader = asyncio.create_task(self._inotify_loop()) if self._inotify else None
+        poller = asyncio.create_task(
+            self._poll_loop(self.rescan_interval if backend == "inotify" else self.poll_interval)
+        )
+        # Incluye los jobs que dejó en curso el proceso (o el líder) anterior
+        checker = asyncio.create_task(self._check_loop())
+        stopper = asyncio.create_task(stop.wait())
+        stopper.add_done_callback(lambda _: self._wake.set())
+        try:
+            while not stop.is_set():
+                due_in = await self._due_in()
+                if due_in is not None and due_in <= 0:
+                    await self._flush()
+                    continue
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=due_in)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if inotify_reader is not None:
+                inotify_reader.cancel()
+            poller.cancel()
+            checker.cancel()
+            stopper.cancel()
+            if self._inotify is not None:
+                asyncio.get_running_loop().remove_reader(self._inotify.fd)
+                self._inotify.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "detected": self.detected,
+            "submitted": self.submitted,
+            "batches": self.batches,
+            "retries": self.retries,
+            "processed": self.processed,
+            "failed": self.failed,
+            "pending": self.ledger.pending_count(),
+            "in_flight": sum(len(paths) for paths in self.ledger.in_flight().values()),
+        }
@@ -0,0 +1,107 @@
+"""
+Compara la decodificación reducida con la completa en un dataset.
+
+Carga el predictor del servicio indicado (con la misma configuración por
+variables de entorno que main.py), predice todas las imágenes del dataset con
+DECODE_MODE=full y con DECODE_MODE=reduced, y reporta tiempos y diferencias
+por campo.
+
+Uso:
+    MODEL_PATH=../ml/models/modelo-color/modelo_color.h5 \\
+    python tools/compare_decode.py --service ml-service-color \\
+        --dataset ../ml/datasets/dataset-color
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+
+def run_mode(predictor, mode: str, paths: List[str], chunk: int) -> Tuple[List[Dict], float]:
+    predictor.decode_mode = mode
+    results = []
+    start = time.perf_counter()
+    for i in range(0, len(paths), chunk):
+        results.extend(predictor.predict_batch(paths[i:i + chunk]))
+    return results, time.perf_counter() - start
+
+
+def compare(full: List[Dict], reduced: List[Dict]):
+    numeric: Dict[str, List[float]] = {}
+    labels: Dict[str, List[bool]] = {}
+    mismatched = 0
+
+    for a, b in zip(full, reduced):
+        if ("error" in a) != ("error" in b):
+            mismatched += 1
+            continue
+
+        for key, value in a.items():
+            other = b.get(key)
+            if key in ("image", "error", "message"):
+                continue
+            if value is None or other is None:
+                labels.setdefault(key, []).append(value is other)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                numeric.setdefault(key, []).append(abs(value - other))
+            else:
+                labels.setdefault(key, []).append(value == other)
+
+    return numeric, labels, mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decodificación reducida vs completa")
+    parser.add_argument("--service", required=True, help="Directorio del servicio, p. ej. ml-service-size")
+    parser.add_argument("--dataset", required=True, help="Carpeta con imágenes")
+    parser.add_argument("--limit", type=int, default=0, help="Máximo de imágenes (0 = todas)")
+    parser.add_argument("--chunk", type=int, default=32, help="Imágenes por predict_batch")
+    args = parser.parse_args()
+
+    service_dir = os.path.abspath(args.service)
+    sys.path.insert(0, service_dir)
+    os.chdir(service_dir)
+    import main as service
+
+    if service.predictor is None:
+        raise SystemExit("Model not loaded, check MODEL_PATH and related variables")
+
+    paths = sorted(
+        str(p.absolute()) for p in Path(args.dataset).iterdir()
+        if p.suffix.lower() in IMAGE_EXTENSIONS and p.is_file()
+    )
+    if args.limit:
+        paths = paths[:args.limit]
+    if not paths:
+        raise SystemExit(f"No images found in {args.dataset}")
+
+    # Calentamiento del modelo fuera de la medición
+    service.predictor.predict_batch(paths[:1])
+
+    full, full_t = run_mode(service.predictor, "full", paths, args.chunk)
+    reduced, reduced_t = run_mode(service.predictor, "reduced", paths, args.chunk)
+    numeric, labels, mismatched = compare(full, reduced)
+
+    print("=" * 60)
+    print(f"Images: {len(paths)}")
+    print(f"full:    {full_t:.2f}s ({full_t / len(paths) * 1000:.1f} ms/img)")
+    print(f"reduced: {reduced_t:.2f}s ({reduced_t / len(paths) * 1000:.1f} ms/img)")
+    print(f"speedup: {full_t / reduced_t:.2f}x")
+    print(f"error/success mismatches: {mismatched}")
+    for key, diffs in sorted(numeric.items()):
+        diffs = sorted(diffs)
+        print(
+            f"  {key:<22} mean |diff| {sum(diffs) / len(diffs):.4f}  "
+            f"p95 {diffs[int(0.95 * (len(diffs) - 1))]:.4f}  max {diffs[-1]:.4f}"
+        )
+    for key, same in sorted(labels.items()):
+        print(f"  {key:<22} agreement {sum(same) / len(same) * 100:.1f}%")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Prueba de carga: latencia de /health mientras /predict está saturado.
+
+Mide primero /health en reposo y luego lo vuelve a medir mientras N
+clientes concurrentes llaman a /predict sin pausa. Con la inferencia fuera
+del event loop, ambas distribuciones deben ser parecidas y el exceso de
+carga debe devolver 503 en lugar de acumularse.
+
+Uso:
+    python load_test_health.py --url http://localhost:8101 \\
+        --image /datasets/color/pan_001.jpg --concurrency 32 --duration 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from collections import Counter
+from typing import Dict, List
+
+import httpx
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"n": 0}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "n": len(ordered),
+        "p50_ms": round(pick(0.50) * 1000, 2),
+        "p95_ms": round(pick(0.95) * 1000, 2),
+        "p99_ms": round(pick(0.99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 2),
+    }
+
+
+async def probe_health(client: httpx.AsyncClient, url: str, stop: asyncio.Event,
+                       interval: float) -> List[float]:
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            response = await client.get(f"{url}/health")
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        except httpx.HTTPError as e:
+            print(f"health error: {e}")
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def hammer_predict(client: httpx.AsyncClient, url: str, image: str,
+                         stop: asyncio.Event, statuses: Counter, backoff: float):
+    while not stop.is_set():
+        try:
+            response = await client.post(f"{url}/predict", json={"image_path": image})
+            statuses[response.status_code] += 1
+            if response.status_code == 503:
+                # Un cliente real respetaría Retry-After
+                await asyncio.sleep(backoff)
+        except httpx.HTTPError:
+            statuses["error"] += 1
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency)
+    # Cliente propio para /health, así no compite por conexiones con la carga
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client, \
+            httpx.AsyncClient(timeout=args.timeout) as probe:
+        # 1. /health en reposo
+        stop = asyncio.Event()
+        idle_task = asyncio.create_task(probe_health(probe, args.url, stop, args.interval))
+        await asyncio.sleep(args.idle)
+        stop.set()
+        idle = await idle_task
+
+        # 2. /health con /predict saturado
+        stop = asyncio.Event()
+        statuses: Counter = Counter()
+        workers = [
+            asyncio.create_task(hammer_predict(client, args.url, args.image, stop, statuses, args.backoff))
+            for _ in range(args.concurrency)
+        ]
+        loaded_task = asyncio.create_task(probe_health(probe, args.url, stop, args.interval))
+        await asyncio.sleep(args.duration)
+        stop.set()
+        loaded = await loaded_task
+        await asyncio.gather(*workers)
+
+        stats = (await client.get(f"{args.url}/stats")).json()
+
+    print("=" * 60)
+    print(f"/health idle:        {percentiles(idle)}")
+    print(f"/health under load:  {percentiles(loaded)}")
+    print(f"/predict statuses:   {dict(statuses)}")
+    print(f"/predict throughput: {statuses[200] / args.duration:.1f} req/s")
+    print(f"service stats:       {stats}")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:8101")
+    parser.add_argument("--image", required=True, help="Ruta de imagen visible para el servicio")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="Segundos de carga")
+    parser.add_argument("--idle", type=float, default=5.0, help="Segundos de medición en reposo")
+    parser.add_argument("--interval", type=float, default=0.1, help="Pausa entre sondeos de /health")
+    parser.add_argument("--backoff", type=float, default=0.05, help="Pausa tras un 503")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()